@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+
+def default_socket_path():
+    """
+    守护进程默认的Unix域套接字路径，每个用户一个
+    """
+    return os.path.join(tempfile.gettempdir(), f"analyzer-{os.getuid()}.sock")
+
+
+class AnalyzerClient:
+    """
+    AnalyzerDaemon的客户端，只依赖标准库中启动很快的模块，不导入词法分析器和文法
+    每个请求是一行JSON，应答也是一行JSON，同一个连接可以连续发送多个请求
+    """
+
+    def __init__(self, path=None):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path or default_socket_path())
+        self.file = self.socket.makefile("rwb")
+        self.next_id = 0
+
+    def request(self, op, **arguments):
+        """
+        发送一个请求并等待应答，成功时返回result，失败时抛出RuntimeError
+        """
+        self.next_id += 1
+        arguments.update(id=self.next_id, op=op)
+        self.file.write(json.dumps(arguments, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise RuntimeError("Daemon closed the connection.")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "request failed"))
+        return response["result"]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+def read_source(file_name):
+    if file_name == "-":
+        return sys.stdin.read()
+    with open(file_name, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="向常驻的分析守护进程发送请求")
+    parser.add_argument("--socket", help="守护进程的Unix域套接字路径")
+    commands = parser.add_subparsers(dest="command", required=True)
+    lex = commands.add_parser("lex", help="词法分析，输出单词二元式")
+    lex.add_argument("file", help="C源程序文件，-表示标准输入")
+    parse = commands.add_parser("parse", help="用LL(1)文法分析句子")
+    parse.add_argument("sentences", nargs="+", help="句子")
+    quads = commands.add_parser("quads", help="由C源程序生成四元式")
+    quads.add_argument("file", help="C源程序文件，-表示标准输入")
+    quads.add_argument("-O", "--optimize", action="store_true", help="优化四元式")
+    commands.add_parser("ping", help="检查守护进程是否在运行")
+    commands.add_parser("stats", help="守护进程的请求统计")
+    commands.add_parser("shutdown", help="停止守护进程")
+    commands.add_parser("raw", help="从标准输入逐行读入JSON请求，逐行输出JSON应答")
+    args = parser.parse_args()
+
+    try:
+        client = AnalyzerClient(args.socket)
+    except OSError as e:
+        sys.exit(f"Error: cannot connect to the analyzer daemon: {e}")
+    try:
+        if args.command == "raw":
+            for line in sys.stdin:
+                if line.strip():
+                    client.file.write(line.strip().encode("utf-8") + b"\n")
+                    client.file.flush()
+                    sys.stdout.write(client.file.readline().decode("utf-8"))
+                    sys.stdout.flush()
+        elif args.command == "lex":
+            for category, value, line, column in client.request("lex", source=read_source(args.file)):
+                print(f"({category}, {value})")
+        elif args.command == "parse":
+            for sentence in args.sentences:
+                result = client.request("parse", sentence=sentence)
+                if result["accepted"]:
+                    print(f"{sentence}\tACCEPT")
+                else:
+                    print(
+                        f"{sentence}\tREJECT\t{result['position']}\t{result['found']}\t"
+                        f"{' '.join(result['expected'])}"
+                    )
+        elif args.command == "quads":
+            result = client.request("quads", source=read_source(args.file), optimize=args.optimize)
+            for address, quadruple in enumerate(result["quadruples"], result["base_address"]):
+                print(f"{address} : {tuple(quadruple)}")
+        else:
+            result = client.request(args.command)
+            if result is not None:
+                print(json.dumps(result, ensure_ascii=False, indent=2))
+    except RuntimeError as e:
+        sys.exit(f"Error: {e}")
+    finally:
+        client.close()
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from AnalyzerClient import default_socket_path
+from BatchParser import parse_sentence
+from CQuadrupleGenerator import CQuadrupleGenerator, CSyntaxError
+from GrammarCache import GrammarCache
+from main import new_analyzer
+from PredictiveParser import PredictiveParser
+from QuadrupleOptimizer import QuadrupleOptimizer
+from QuadrupleProducer import base_address
+
+# 当前进程中已经建立好的词法分析器和LL(1)分析器，由init_state()在进程启动时建立一次
+state = None
+
+
+def init_state(grammar_file, split_words, cache_dir):
+    """
+    建立词法分析器(运算符/分隔符的扫描正则表达式预先编译)和LL(1)分析器(文法从GrammarCache读入)
+    守护进程和进程池的每个工作进程各调用一次
+    """
+    global state
+    analyzer = new_analyzer(None)
+    analyzer.build_scanner()
+    grammar, _ = GrammarCache(cache_dir).load(grammar_file, split_words)
+    state = {"analyzer": analyzer, "parser": PredictiveParser(grammar)}
+
+
+def lex(source):
+    """
+    返回[[种别, 值, 行号, 列号], ...]，非法单词的种别为None
+    """
+    return [
+        [token.category, token.value, token.line, token.column]
+        for token in state["analyzer"].tokens(source)
+    ]
+
+
+def parse(sentence):
+    accepted, position, found, expected = parse_sentence(state["parser"], sentence)
+    return {"accepted": accepted, "position": position, "found": found, "expected": expected}
+
+
+def quads(source, optimize=False):
+    generator = CQuadrupleGenerator()
+    quadruples = generator.generate(state["analyzer"].tokens(source))
+    if optimize:
+        quadruples = QuadrupleOptimizer().optimize(quadruples)
+    return {
+        "base_address": base_address,
+        "quadruples": quadruples,
+        "errors": [[token.value, token.line, token.column] for token in generator.errors],
+    }
+
+
+OPERATIONS = {
+    "lex": lambda request: lex(request["source"]),
+    "parse": lambda request: parse(request["sentence"]),
+    "quads": lambda request: quads(request["source"], request.get("optimize", False)),
+}
+
+# 读写守护进程自身状态的请求，无论请求行多长都在事件循环中处理
+CONTROL_OPERATIONS = frozenset({"ping", "stats", "shutdown"})
+
+
+def handle(request):
+    """
+    执行一个请求，返回应答对象；在守护进程中直接调用，或在工作进程中调用
+    """
+    response = {"id": request.get("id")}
+    op = request.get("op")
+    if op not in OPERATIONS:
+        response.update(ok=False, error=f"Unknown op {op!r}")
+        return response
+    try:
+        response["result"] = OPERATIONS[op](request)
+        response["ok"] = True
+    except CSyntaxError as e:
+        response.update(ok=False, error=str(e))
+    except KeyError as e:
+        response.update(ok=False, error=f"Missing field {e}")
+    except Exception as e:
+        response.update(ok=False, error=f"{type(e).__name__}: {e}")
+    return response
+
+
+def encode(response):
+    return json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def decode(line):
+    """
+    解析一行请求，不是JSON对象时抛出ValueError
+    """
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object")
+    return request
+
+
+def handle_line(line):
+    """
+    在工作进程中解析、执行一行请求并编码应答，返回(是否成功, 应答行)
+    大请求的JSON解码和编码也在工作进程中完成，事件循环只转发字节；
+    控制请求(CONTROL_OPERATIONS)不在工作进程中执行，返回(None, 只含id和op的请求)交回事件循环
+    """
+    try:
+        request = decode(line)
+    except ValueError as e:
+        response = {"id": None, "ok": False, "error": f"Invalid request: {e}"}
+        return response["ok"], encode(response)
+    if request.get("op") in CONTROL_OPERATIONS:
+        return None, {"id": request.get("id"), "op": request["op"]}
+    response = handle(request)
+    return response["ok"], encode(response)
+
+
+class AnalyzerDaemon:
+    """
+    常驻的分析守护进程，用asyncio在Unix域套接字上并发地服务多个连接，协议为每行一个JSON请求、每行一个JSON应答
+    请求：{"id": 任意值, "op": "lex"|"parse"|"quads"|"ping"|"stats"|"shutdown", ...}，
+    lex和quads带"source"(C源程序文本，quads还可以带"optimize")，parse带"sentence"；
+    应答：{"id": 请求的id, "ok": true, "result": ...}或{"id": ..., "ok": false, "error": "..."}。
+    不超过offload_bytes字节的请求行直接在事件循环中执行，没有进程间通信，延迟在亚毫秒级；
+    更长的请求行连同JSON的解码和编码一起交给进程池，不阻塞其他连接；其中的ping、stats、shutdown解码后交回事件循环处理。同一个连接上的请求并发执行，应答按完成的顺序返回，由id对应。
+    """
+
+    def __init__(self, path, grammar_file="grammar.txt", split_words=False, cache_dir=None, workers=None, offload_bytes=4096):
+        self.path = path
+        self.offload_bytes = offload_bytes
+        self.initargs = (grammar_file, split_words, cache_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+        self.server = None
+        self.stopping = None
+        self.started = time.time()
+        self.stats = {"connections": 0, "requests": 0, "inline": 0, "offloaded": 0, "errors": 0}
+
+    def dispatch(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return {"id": request.get("id"), "ok": True, "result": "pong"}
+        if op == "stats":
+            result = dict(self.stats, uptime=time.time() - self.started, workers=self.workers)
+            return {"id": request.get("id"), "ok": True, "result": result}
+        if op == "shutdown":
+            self.stopping.set()
+            return {"id": request.get("id"), "ok": True, "result": None}
+        return handle(request)
+
+    async def respond(self, line, writer):
+        self.stats["requests"] += 1
+        if len(line) > self.offload_bytes:
+            self.stats["offloaded"] += 1
+            loop = asyncio.get_running_loop()
+            ok, data = await loop.run_in_executor(self.executor, handle_line, line)
+            if ok is None:
+                response = self.dispatch(data)
+                ok, data = response["ok"], encode(response)
+        else:
+            self.stats["inline"] += 1
+            try:
+                response = self.dispatch(decode(line))
+            except ValueError as e:
+                response = {"id": None, "ok": False, "error": f"Invalid request: {e}"}
+            ok, data = response["ok"], encode(response)
+        if not ok:
+            self.stats["errors"] += 1
+        writer.write(data)
+        await writer.drain()
+
+    async def connection(self, reader, writer):
+        self.stats["connections"] += 1
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self.respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, asyncio.CancelledError):
+            # 客户端断开，或守护进程停止时取消了仍在等待请求的连接
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        init_state(*self.initargs)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=init_state, initargs=self.initargs
+        )
+        # 进程池在第一次提交任务时才创建工作进程，开始监听前先提交一个空任务，使第一个大请求不必等待fork和初始化
+        await asyncio.get_running_loop().run_in_executor(self.executor, int)
+        self.stopping = asyncio.Event()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        # 请求行可能包含整个源程序，放宽StreamReader的行长度限制
+        self.server = await asyncio.start_unix_server(self.connection, self.path, limit=1 << 30)
+        print(f"Analyzer daemon listening on {self.path}", file=sys.stderr)
+        try:
+            async with self.server:
+                await self.stopping.wait()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="常驻的词法分析/LL(1)/四元式生成守护进程")
+    parser.add_argument("--socket", default=default_socket_path(), help="Unix域套接字路径")
+    parser.add_argument("-g", "--grammar", default="grammar.txt", help="文法文件")
+    parser.add_argument(
+        "--split-words", action="store_true", help="产生式右部和句子中的终结符以空白分隔"
+    )
+    parser.add_argument("--cache-dir", help="已分析文法的缓存目录")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="处理大请求的工作进程数，默认为CPU核数")
+    parser.add_argument(
+        "--offload-bytes", type=int, default=4096, help="超过这个字节数的请求行交给工作进程"
+    )
+    args = parser.parse_args()
+
+    daemon = AnalyzerDaemon(
+        args.socket, args.grammar, args.split_words, args.cache_dir, args.workers, args.offload_bytes
+    )
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        pass
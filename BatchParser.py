@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from GrammarCache import GrammarCache
+from PredictiveParser import ParseError, PredictiveParser
+
+# 工作进程中的分析器，由init_worker()在进程启动时建立一次
+worker_parser = None
+
+# 一块句子分析完毕时放入事件队列的标记
+DONE = object()
+
+
+def read_sentences(file_names):
+    """
+    依次读取各输入文件(-表示标准输入)，每个非空行是一个句子，生成(文件名, 行号, 句子)
+    按行读取，不整体读入文件，标准输入可以是持续写入的管道
+    """
+    for file_name in file_names:
+        file = sys.stdin if file_name == "-" else open(file_name, "r", encoding="utf-8")
+        try:
+            for number, line in enumerate(file, 1):
+                line = line.strip()
+                if line:
+                    yield file_name, number, line
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def init_worker(grammar):
+    """
+    工作进程的初始化函数，文法只在每个进程启动时传入一次，之后的各块句子都使用同一个分析器
+    """
+    global worker_parser
+    worker_parser = PredictiveParser(grammar)
+
+
+def parse_sentence(parser, text):
+    """
+    分析一个句子，返回(是否接受, 出错单词下标, 出错单词, 期望的终结符列表)，接受时后三项为None
+    split_words的文法以空白分隔终结符，否则每个非空白字符是一个终结符
+    """
+    symbols = text.split() if parser.grammar.split_words else "".join(text.split())
+    try:
+        parser.recognize(parser.encode(symbols))
+    except ParseError as e:
+        return False, e.position, e.found, sorted(e.expected)
+    return True, None, None, None
+
+
+def parse_chunk(chunk):
+    """
+    在工作进程中分析一块句子，返回(文件名, 行号, 是否接受, 出错单词下标, 出错单词, 期望的终结符列表)的列表
+    """
+    return [
+        (file_name, number, *parse_sentence(worker_parser, text))
+        for file_name, number, text in chunk
+    ]
+
+
+def parse_batch(grammar, sentences, workers=None, chunk_size=1000):
+    """
+    批量分析函数，文法只分析一次，句子按chunk_size个一块分给进程池，workers为工作进程数(默认为CPU核数)
+    按输入顺序逐个生成每个句子的结果；同时在途的块数有上限，输入可以是无限的流，内存占用不随输入增长
+    输入在单独的线程中读取，读入的块和分析完毕的通知放入同一个事件队列，
+    因此输入暂时没有新句子时(比如等待管道的另一端)，已经分析完的结果也会立即生成出来
+    """
+    if workers == 1:
+        init_worker(grammar)
+        for chunk in chunked(sentences, chunk_size):
+            yield from parse_chunk(chunk)
+        return
+    workers = workers or os.cpu_count() or 1
+    events = queue.Queue()
+    # 读入但结果尚未生成的块数不超过workers * 2
+    slots = threading.Semaphore(workers * 2)
+
+    def read():
+        try:
+            chunks = chunked(sentences, chunk_size)
+            while True:
+                slots.acquire()
+                chunk = next(chunks, None)
+                events.put(chunk)
+                if chunk is None:
+                    return
+        except BaseException as e:
+            events.put(e)
+
+    def notify(future):
+        events.put(DONE)
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(grammar,)
+    ) as executor:
+        # 进程池在第一次提交任务时才fork工作进程，必须在读入线程开始读标准输入之前完成：
+        # 否则fork时读入线程持有标准输入的锁，工作进程启动时关闭标准输入会一直等待这个锁
+        executor.submit(int).result()
+        threading.Thread(target=read, daemon=True).start()
+        pending = deque()
+        finished = False
+        while pending or not finished:
+            event = events.get()
+            if event is None:
+                finished = True
+            elif isinstance(event, BaseException):
+                raise event
+            elif event is not DONE:
+                future = executor.submit(parse_chunk, event)
+                future.add_done_callback(notify)
+                pending.append(future)
+            while pending and pending[0].done():
+                yield from pending.popleft().result()
+                slots.release()
+
+
+def write_results(results, file, output_format="text", flush=False):
+    """
+    逐个写出分析结果并返回(接受数, 拒绝数)，text格式每行为"文件名:行号<TAB>ACCEPT"或
+    "文件名:行号<TAB>REJECT<TAB>出错单词下标<TAB>出错单词<TAB>期望的终结符"，jsonl格式每行一个JSON对象
+    flush为True时每个结果写出后立即刷新，供另一端逐行等待结果的管道使用
+    """
+    accepted = rejected = 0
+    for file_name, number, ok, position, found, expected in results:
+        if ok:
+            accepted += 1
+        else:
+            rejected += 1
+        if output_format == "jsonl":
+            record = {"file": file_name, "line": number, "accepted": ok}
+            if not ok:
+                record.update(position=position, found=found, expected=expected)
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        elif ok:
+            file.write(f"{file_name}:{number}\tACCEPT\n")
+        else:
+            file.write(f"{file_name}:{number}\tREJECT\t{position}\t{found}\t{' '.join(expected)}\n")
+        if flush:
+            file.flush()
+    return accepted, rejected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用同一个LL(1)文法批量分析句子")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="输入文件，每行一个句子，-表示标准输入")
+    parser.add_argument("-g", "--grammar", default="grammar.txt", help="文法文件")
+    parser.add_argument(
+        "--split-words", action="store_true", help="产生式右部和句子中的终结符以空白分隔"
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="工作进程数，默认为CPU核数"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=1000, help="每块分给工作进程的句子数，交互使用时可设为1"
+    )
+    parser.add_argument("-o", "--output", help="输出文件，默认为标准输出")
+    parser.add_argument(
+        "-f", "--format", choices=["text", "jsonl"], default="text", help="输出格式"
+    )
+    parser.add_argument("--cache-dir", help="已分析文法的缓存目录")
+    args = parser.parse_args()
+
+    grammar, _ = GrammarCache(args.cache_dir).load(args.grammar, args.split_words)
+    results = parse_batch(
+        grammar, read_sentences(args.inputs), args.workers, args.chunk_size
+    )
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        accepted, rejected = write_results(
+            results, output, args.format, flush=args.chunk_size == 1
+        )
+    finally:
+        if args.output:
+            output.close()
+    print(f"{accepted} accepted, {rejected} rejected.", file=sys.stderr)
@@ -0,0 +1,508 @@
+import argparse
+import sys
+
+from main import WordCategory, new_analyzer
+from QuadrupleProducer import QuadrupleEmitter, QuadrupleWriter, base_address, compile_file
+
+# 类型说明符，以它们开头的语句是声明或函数定义
+TYPE_WORDS = {
+    "int",
+    "double",
+    "float",
+    "char",
+    "long",
+    "short",
+    "signed",
+    "unsigned",
+    "void",
+    "const",
+    "static",
+    "register",
+    "auto",
+    "volatile",
+}
+
+# 种别值提前取出，避免每个单词都访问一次枚举
+IDENTIFIER = WordCategory.IDENTIFIER.value
+UNSIGNED_INTEGER = WordCategory.UNSIGNED_INTEGER.value
+UNSIGNED_FLOAT = WordCategory.UNSIGNED_FLOAT.value
+RESERVED_WORD = WordCategory.RESERVED_WORD.value
+
+RELATIONS = {"<": "j<", ">": "j>", "<=": "j<=", ">=": "j>=", "==": "j==", "!=": "j!="}
+
+
+class CSyntaxError(Exception):
+    def __init__(self, token, message):
+        self.token = token
+        if token is None:
+            super().__init__(f"Syntax error at end of input: {message}")
+        else:
+            super().__init__(
+                f"Syntax error at line {token.line}, column {token.column}: "
+                f"{message}, found {token.value!r}"
+            )
+
+
+class CQuadrupleGenerator(QuadrupleEmitter):
+    """
+    C语言子集的四元式生成器，直接读取LexicalAnalyzer.tokens()生成的单词流，递归下降地边分析边生成四元式，
+    不经过源程序文本或完整的语法树，只需向前看两个单词。支持声明(含初值)、赋值、算术表达式、关系与逻辑运算、
+    ++/--、if/else、while、do/while、for和复合语句，scanf(x, ...)生成("read", "_", "_", x)；
+    void main() { ... }这样的函数定义只翻译函数体。
+    表达式的分析结果是值(变量名、常量或临时变量)或(真出口链, 假出口链)两种形式之一，按使用的位置相互转换：
+    条件转移需要的是出口链，赋值需要的是值(关系/逻辑表达式的值为1或0)。
+    非法单词(种别为None)跳过并记录在self.errors中，语法错误抛出CSyntaxError。
+    """
+
+    def __init__(self, sink=None, instrumentation=None, base_address=base_address, reuse_temps=False):
+        super().__init__(sink, instrumentation, base_address, reuse_temps)
+        self.tokens = iter(())
+        self.lookahead = []
+        self.errors = []
+
+    # 单词流
+
+    def peek(self, index=0):
+        """
+        返回向前看的第index个单词，输入结束时为None
+        """
+        lookahead = self.lookahead
+        if index < len(lookahead):
+            return lookahead[index]
+        while len(lookahead) <= index:
+            token = next(self.tokens, None)
+            while token is not None and token.category is None:
+                self.errors.append(token)
+                token = next(self.tokens, None)
+            lookahead.append(token)
+        return lookahead[index]
+
+    def advance(self):
+        token = self.peek()
+        if token is not None:
+            self.lookahead.pop(0)
+        return token
+
+    def check(self, value, index=0):
+        token = self.peek(index)
+        return token is not None and token.value == value and token.category != IDENTIFIER
+
+    def accept(self, value):
+        if self.check(value):
+            return self.advance()
+        return None
+
+    def expect(self, value):
+        if not self.check(value):
+            raise CSyntaxError(self.peek(), f"expected {value!r}")
+        return self.advance()
+
+    def is_category(self, category, index=0):
+        token = self.peek(index)
+        return token is not None and token.category == category
+
+    # 值与出口链的转换
+
+    def value(self, result):
+        """
+        将表达式的分析结果转换为值，出口链形式的结果存入临时变量(真为1，假为0)
+        """
+        if isinstance(result, str):
+            return result
+        truelist, falselist = result
+        temp = self.new_temp_var()
+        self.backpatch(truelist, self.next_position)
+        self.emit("=", "1", "_", temp)
+        end = self.emit_jump("j")
+        self.backpatch(falselist, self.next_position)
+        self.emit("=", "0", "_", temp)
+        self.backpatch(end, self.next_position)
+        return temp
+
+    def jumps(self, result):
+        """
+        将表达式的分析结果转换为(真出口链, 假出口链)，值不为0时为真
+        """
+        if not isinstance(result, str):
+            return result
+        truelist = self.emit_jump("jnz", result)
+        self.release(result)
+        return truelist, self.emit_jump("j")
+
+    # 语句
+
+    def generate(self, tokens):
+        """
+        为单词流生成四元式，tokens为Token的可迭代对象(如LexicalAnalyzer.tokens())，可以多次调用，编号依次延续
+        返回self.quadruples(sink为None时为生成的全部四元式)
+        """
+        self.tokens = iter(tokens)
+        self.lookahead = []
+        temps = self.temps_created
+        with self.instrumentation.phase("generate"):
+            nextlist = None
+            while self.peek() is not None:
+                self.backpatch(nextlist, self.next_position)
+                nextlist = self.external_declaration()
+            self.backpatch(nextlist, self.next_position)
+        self.flush()
+        self.instrumentation.count("temps_created", self.temps_created - temps)
+        return self.quadruples
+
+    def external_declaration(self):
+        """
+        类型 名字 ( ... ) { ... }是函数定义，只翻译函数体；其他按语句处理
+        """
+        index = 0
+        while self.peek(index) is not None and self.peek(index).value in TYPE_WORDS:
+            index += 1
+        name = self.peek(index)
+        if index and name is not None and name.category in (
+            IDENTIFIER,
+            RESERVED_WORD,
+        ) and self.check("(", index + 1):
+            for _ in range(index + 2):
+                self.advance()
+            depth = 1
+            while depth:
+                token = self.advance()
+                if token is None:
+                    raise CSyntaxError(None, "expected ')'")
+                if token.value == "(":
+                    depth += 1
+                elif token.value == ")":
+                    depth -= 1
+            return self.compound_statement()
+        return self.statement()
+
+    def statement_list(self, end):
+        nextlist = None
+        while not self.check(end):
+            if self.peek() is None:
+                raise CSyntaxError(None, f"expected {end!r}")
+            self.backpatch(nextlist, self.next_position)
+            nextlist = self.statement()
+        return nextlist
+
+    def compound_statement(self):
+        self.expect("{")
+        nextlist = self.statement_list("}")
+        self.expect("}")
+        return nextlist
+
+    def statement(self):
+        """
+        翻译一条语句，返回其后继链
+        """
+        token = self.peek()
+        if token is None:
+            raise CSyntaxError(None, "expected a statement")
+        if token.category == RESERVED_WORD:
+            word = token.value
+            if word in TYPE_WORDS:
+                return self.declaration()
+            if word == "if":
+                return self.if_statement()
+            if word == "while":
+                return self.while_statement()
+            if word == "do":
+                return self.do_statement()
+            if word == "for":
+                return self.for_statement()
+            if word == "scanf":
+                return self.scanf_statement()
+        if self.check("{"):
+            return self.compound_statement()
+        if self.accept(";"):
+            return None
+        self.expression_list()
+        self.expect(";")
+        return None
+
+    def declaration(self):
+        while self.peek() is not None and self.peek().value in TYPE_WORDS:
+            self.advance()
+        while True:
+            name = self.identifier()
+            if self.accept("="):
+                value = self.value(self.assignment())
+                self.emit("=", value, "_", name)
+                self.release(value)
+            if not self.accept(","):
+                break
+        self.expect(";")
+        return None
+
+    def if_statement(self):
+        self.advance()
+        self.expect("(")
+        truelist, falselist = self.jumps(self.expression())
+        self.expect(")")
+        self.backpatch(truelist, self.next_position)
+        nextlist = self.statement()
+        if not self.accept("else"):
+            return self.merge(nextlist, falselist)
+        nextlist = self.merge(nextlist, self.emit_jump("j"))
+        self.backpatch(falselist, self.next_position)
+        return self.merge(nextlist, self.statement())
+
+    def while_statement(self):
+        self.advance()
+        start_position = self.next_position
+        self.expect("(")
+        truelist, falselist = self.jumps(self.expression())
+        self.expect(")")
+        self.backpatch(truelist, self.next_position)
+        self.backpatch(self.statement(), start_position)
+        self.emit("j", "_", "_", start_position + self.base_address)
+        return falselist
+
+    def do_statement(self):
+        self.advance()
+        start_position = self.next_position
+        nextlist = self.statement()
+        self.expect("while")
+        self.backpatch(nextlist, self.next_position)
+        self.expect("(")
+        truelist, falselist = self.jumps(self.expression())
+        self.expect(")")
+        self.expect(";")
+        self.backpatch(truelist, start_position)
+        return falselist
+
+    def for_statement(self):
+        """
+        for (初值; 条件; 步进) 循环体，按单词顺序生成：初值，条件(假出口为后继)，步进并转回条件，循环体并转到步进
+        步进在循环体之前生成，不需要缓存步进表达式的单词
+        """
+        self.advance()
+        self.expect("(")
+        if not self.check(";"):
+            self.expression_list()
+        self.expect(";")
+        condition_position = self.next_position
+        if self.check(";"):
+            truelist, falselist = self.emit_jump("j"), None
+        else:
+            truelist, falselist = self.jumps(self.expression())
+        self.expect(";")
+        step_position = self.next_position
+        if not self.check(")"):
+            self.expression_list()
+        self.emit("j", "_", "_", condition_position + self.base_address)
+        self.expect(")")
+        self.backpatch(truelist, self.next_position)
+        self.backpatch(self.statement(), step_position)
+        self.emit("j", "_", "_", step_position + self.base_address)
+        return falselist
+
+    def scanf_statement(self):
+        self.advance()
+        self.expect("(")
+        while True:
+            self.accept("&")
+            self.emit("read", "_", "_", self.identifier())
+            if not self.accept(","):
+                break
+        self.expect(")")
+        self.expect(";")
+        return None
+
+    # 表达式
+
+    def identifier(self):
+        if not self.is_category(IDENTIFIER):
+            raise CSyntaxError(self.peek(), "expected an identifier")
+        return self.advance().value
+
+    def expression_list(self):
+        """
+        逗号分隔、只为副作用求值的表达式(表达式语句、for的初值和步进)，i++和i--不需要保存原值
+        """
+        while True:
+            if (
+                self.is_category(IDENTIFIER)
+                and (self.check("++", 1) or self.check("--", 1))
+                and (self.check(";", 2) or self.check(",", 2) or self.check(")", 2))
+            ):
+                name = self.advance().value
+                op = self.advance().value[0]
+                self.emit(op, name, "1", name)
+            else:
+                result = self.expression()
+                if isinstance(result, str):
+                    self.release(result)
+                else:
+                    truelist, falselist = result
+                    self.backpatch(self.merge(truelist, falselist), self.next_position)
+            if not self.accept(","):
+                break
+
+    def expression(self):
+        return self.assignment()
+
+    def assignment(self):
+        if self.is_category(IDENTIFIER) and self.check("=", 1):
+            name = self.advance().value
+            self.advance()
+            value = self.value(self.assignment())
+            self.emit("=", value, "_", name)
+            self.release(value)
+            return name
+        return self.logical_or()
+
+    def logical_or(self):
+        result = self.logical_and()
+        while self.accept("||"):
+            truelist, falselist = self.jumps(result)
+            self.backpatch(falselist, self.next_position)
+            right_true, right_false = self.jumps(self.logical_and())
+            result = self.merge(truelist, right_true), right_false
+        return result
+
+    def logical_and(self):
+        result = self.equality()
+        while self.accept("&&"):
+            truelist, falselist = self.jumps(result)
+            self.backpatch(truelist, self.next_position)
+            right_true, right_false = self.jumps(self.equality())
+            result = right_true, self.merge(falselist, right_false)
+        return result
+
+    def compare(self, left, op, right):
+        left = self.value(left)
+        right = self.value(right)
+        truelist = self.emit_jump(RELATIONS[op], left, right)
+        self.release(left)
+        self.release(right)
+        return truelist, self.emit_jump("j")
+
+    def equality(self):
+        result = self.relational()
+        while self.check("==") or self.check("!="):
+            op = self.advance().value
+            # 左运算对象先求值，否则它的出口链会跳过右运算对象的四元式
+            result = self.value(result)
+            result = self.compare(result, op, self.relational())
+        return result
+
+    def relational(self):
+        result = self.additive()
+        while self.check("<") or self.check(">") or self.check("<=") or self.check(">="):
+            op = self.advance().value
+            result = self.value(result)
+            result = self.compare(result, op, self.additive())
+        return result
+
+    def binary(self, op, left, right):
+        left = self.value(left)
+        right = self.value(right)
+        self.release(left)
+        self.release(right)
+        result = self.new_temp_var()
+        self.emit(op, left, right, result)
+        return result
+
+    def additive(self):
+        result = self.multiplicative()
+        while self.check("+") or self.check("-"):
+            op = self.advance().value
+            result = self.value(result)
+            result = self.binary(op, result, self.multiplicative())
+        return result
+
+    def multiplicative(self):
+        result = self.unary()
+        while self.check("*") or self.check("/"):
+            op = self.advance().value
+            result = self.value(result)
+            result = self.binary(op, result, self.unary())
+        return result
+
+    def unary(self):
+        if self.accept("!"):
+            truelist, falselist = self.jumps(self.unary())
+            return falselist, truelist
+        if self.accept("-"):
+            return self.binary("-", "0", self.unary())
+        if self.accept("+"):
+            return self.unary()
+        if self.check("++") or self.check("--"):
+            op = self.advance().value[0]
+            name = self.identifier()
+            self.emit(op, name, "1", name)
+            return name
+        return self.postfix()
+
+    def postfix(self):
+        if self.is_category(IDENTIFIER) and (self.check("++", 1) or self.check("--", 1)):
+            name = self.advance().value
+            op = self.advance().value[0]
+            temp = self.new_temp_var()
+            self.emit("=", name, "_", temp)
+            self.emit(op, name, "1", name)
+            return temp
+        return self.primary()
+
+    def primary(self):
+        token = self.peek()
+        if token is None:
+            raise CSyntaxError(None, "expected an expression")
+        if token.category in (
+            IDENTIFIER,
+            UNSIGNED_INTEGER,
+            UNSIGNED_FLOAT,
+        ):
+            return self.advance().value
+        if self.accept("("):
+            result = self.expression()
+            self.expect(")")
+            return result
+        raise CSyntaxError(token, "expected an expression")
+
+
+def compile_c_file(file_name, sink, instrumentation=None, base_address=base_address, reuse_temps=False):
+    """
+    对C源文件做流式词法分析并直接生成四元式，四元式依次交给sink，返回生成器(flushed为生成的四元式个数，errors为跳过的非法单词)
+    """
+    generator = CQuadrupleGenerator(sink, instrumentation, base_address, reuse_temps)
+    generator.generate(new_analyzer(file_name, instrumentation).tokens())
+    return generator
+
+
+def compile_source_file(file_name, sink, instrumentation=None, base_address=base_address, reuse_temps=False):
+    """
+    按扩展名选择前端：.c文件由C单词流生成，其他文件按Python语法的程序生成
+    """
+    compile = compile_c_file if file_name.endswith(".c") else compile_file
+    return compile(file_name, sink, instrumentation, base_address, reuse_temps)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="由C源程序的单词流直接生成四元式")
+    parser.add_argument("inputs", nargs="*", default=["test.c"], help="C源程序文件")
+    parser.add_argument("-o", "--output", help="输出文件，默认为标准输出")
+    parser.add_argument("--reuse-temps", action="store_true", help="回收不再使用的临时变量名")
+    args = parser.parse_args()
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for file_name in args.inputs:
+            if len(args.inputs) > 1:
+                output.write(f"# {file_name}\n")
+            try:
+                generator = compile_c_file(
+                    file_name, QuadrupleWriter(output), reuse_temps=args.reuse_temps
+                )
+            except CSyntaxError as e:
+                print(f"Error: {file_name}: {e}", file=sys.stderr)
+                continue
+            for token in generator.errors:
+                print(
+                    f"Error: {file_name}: illegal token {token.value!r} at line {token.line}, "
+                    f"column {token.column}, skipped",
+                    file=sys.stderr,
+                )
+    finally:
+        if args.output:
+            output.close()
@@ -0,0 +1,193 @@
+import argparse
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# 字节的字符类
+LEGAL, ILLEGAL = 0, 1
+
+
+class IllegalCharacter:
+    """
+    非法字符的出错信息，offset为字符首字节在源程序中的字节偏移，line和column从1开始计数，列号与Token相同按字节计算
+    """
+
+    __slots__ = ("character", "offset", "line", "column")
+
+    def __init__(self, character, offset, line, column):
+        self.character = character
+        self.offset = offset
+        self.line = line
+        self.column = column
+
+    def __eq__(self, other):
+        if not isinstance(other, IllegalCharacter):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self) -> str:
+        return (
+            f"IllegalCharacter({self.character!r}, offset={self.offset}, "
+            f"line={self.line}, column={self.column})"
+        )
+
+    def __str__(self) -> str:
+        return f"illegal character {self.character!r} at line {self.line}, column {self.column}"
+
+
+class CharacterValidator:
+    """
+    非法字符检查器，由合法字符表建立256项的字节字符类表，整块地对源程序分类，不在Python中逐字符循环
+    没有非法字符时(最常见的情况)只需对每块做一次bytes.translate删除所有合法字节，结果为空即可；
+    有非法字符时用字符类表把整块翻译为字符类序列再查找ILLEGAL的位置，安装了NumPy时改用查表和flatnonzero一次取出所有位置。
+    合法字符都是ASCII字符，UTF-8多字节字符的后续字节(0x80~0xBF)归为LEGAL，每个非ASCII字符只在首字节处报告一次。
+    """
+
+    def __init__(self, legal_characters, chunk_size=1 << 20):
+        self.chunk_size = chunk_size
+        legal = bytearray(legal_characters.encode("ascii"))
+        legal.extend(range(0x80, 0xC0))
+        self.legal_bytes = bytes(legal)
+        table = bytearray([ILLEGAL]) * 256
+        for byte in self.legal_bytes:
+            table[byte] = LEGAL
+        self.table = bytes(table)
+        self.lookup = (
+            numpy.frombuffer(self.table, dtype=numpy.uint8).astype(bool) if numpy is not None else None
+        )
+
+    def positions(self, chunk):
+        """
+        返回chunk中所有非法字节的下标
+        """
+        if not chunk.translate(None, self.legal_bytes):
+            return []
+        if self.lookup is not None:
+            return numpy.flatnonzero(self.lookup[numpy.frombuffer(chunk, dtype=numpy.uint8)]).tolist()
+        classes = chunk.translate(self.table)
+        positions = []
+        position = classes.find(ILLEGAL)
+        while position >= 0:
+            positions.append(position)
+            position = classes.find(ILLEGAL, position + 1)
+        return positions
+
+    def chunks(self, source):
+        """
+        将str、bytes或mmap分成不超过chunk_size字节的bytes块
+        """
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        for start in range(0, len(source), self.chunk_size):
+            yield bytes(source[start : start + self.chunk_size])
+
+    def validate(self, source):
+        """
+        检查整个源程序(str、bytes或mmap)，返回按位置排列的IllegalCharacter列表
+        """
+        return self.validate_chunks(self.chunks(source))
+
+    def validate_file(self, file_name):
+        """
+        按块读取并检查文件，内存占用只与块大小有关
+        """
+        with open(file_name, "rb") as file:
+            return self.validate_chunks(iter(lambda: file.read(self.chunk_size), b""))
+
+    def validate_chunks(self, chunks):
+        errors = []
+        base = 0  # chunk[0]在源程序中的字节偏移
+        line = 1  # chunk[0]所在的行号
+        line_start = 0  # chunk[0]所在行的行首字节偏移
+        carry = b""  # 上一块末尾不完整的UTF-8字符，并入下一块
+        for chunk in chunks:
+            if carry:
+                chunk = carry + chunk
+            cut = self.complete_length(chunk)
+            chunk, carry = chunk[:cut], chunk[cut:]
+            line_at = line
+            counted = 0  # 已统计到chunk[counted]之前的换行
+            last_newline = chunk.rfind(b"\n")
+            start = line_start  # 当前非法字符所在行的行首字节偏移
+            for position in self.positions(chunk):
+                # 只在上一个非法字符之后查找换行，行号和行首都向前推进，每个字节至多扫描两次
+                newline = chunk.rfind(b"\n", counted, position)
+                if newline >= 0:
+                    line_at += chunk.count(b"\n", counted, newline + 1)
+                    start = base + newline + 1
+                counted = position
+                errors.append(
+                    IllegalCharacter(
+                        self.character(chunk, position),
+                        base + position,
+                        line_at,
+                        base + position - start + 1,
+                    )
+                )
+            line += chunk.count(b"\n")
+            if last_newline >= 0:
+                line_start = base + last_newline + 1
+            base += len(chunk)
+        if carry:
+            errors.append(IllegalCharacter(self.character(carry, 0), base, line, base - line_start + 1))
+        return errors
+
+    @staticmethod
+    def sequence_length(byte):
+        """
+        UTF-8首字节对应的字符字节数
+        """
+        if byte >= 0xF0:
+            return 4
+        if byte >= 0xE0:
+            return 3
+        if byte >= 0xC0:
+            return 2
+        return 1
+
+    @classmethod
+    def complete_length(cls, chunk):
+        """
+        返回chunk去掉末尾不完整的UTF-8字符后的长度
+        """
+        length = len(chunk)
+        for back in range(1, min(3, length) + 1):
+            byte = chunk[length - back]
+            if byte < 0x80:
+                break
+            if byte >= 0xC0:
+                if cls.sequence_length(byte) > back:
+                    return length - back
+                break
+        return length
+
+    @classmethod
+    def character(cls, chunk, position):
+        """
+        解码从position开始的一个字符，非ASCII字符按UTF-8首字节确定长度，不合法的字节解码为U+FFFD
+        """
+        length = cls.sequence_length(chunk[position])
+        return chunk[position : position + length].decode("utf-8", "replace")[:1]
+
+
+if __name__ == "__main__":
+    from main import legal_characters
+
+    parser = argparse.ArgumentParser(description="检查C源程序中的非法字符")
+    parser.add_argument("inputs", nargs="*", default=["test.c"], help="C源程序文件")
+    args = parser.parse_args()
+
+    validator = CharacterValidator(legal_characters)
+    found = False
+    for file_name in args.inputs:
+        try:
+            errors = validator.validate_file(file_name)
+        except OSError as e:
+            sys.exit(f"Error: {e}")
+        for error in errors:
+            print(f"Error: {file_name}: {error}")
+        found = found or bool(errors)
+    sys.exit(1 if found else 0)
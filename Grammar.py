@@ -0,0 +1,301 @@
+from array import array
+from collections import deque
+
+
+class Grammar:
+    """
+    整数编码的文法，产生式在读入时只拆分一次，之后的分析都在整数上进行
+    非终结符编号为0..N-1，终结符编号为N..N+T-1，终结符t对应位集中的第t-N位，结束符#总是最后一个终结符；
+    ε产生式的右部为空元组，ε本身不作为符号编号。
+    split_words为False时产生式右部每个字符是一个符号(原grammar.txt的写法，大写字母为非终结符)，
+    为True时右部的符号以空白分隔，可以是多个字符的名字(如Expr → Term ExprTail)，出现在左部的名字为非终结符，其余为终结符。
+    nullable、FIRST和FOLLOW用依赖图上的工作表算法计算，每个集合是一个以整数表示的位集，
+    只有集合发生变化的符号才会把依赖它的符号重新加入工作表，不需要反复遍历全部产生式和比较整个字典。
+    """
+
+    ARROW = "→"
+    EPSILON = "ε"
+    END = "#"
+
+    def __init__(self, productions, split_words=False):
+        """
+        productions为(左部, 右部符号名列表, 右部文本)的列表，第一个产生式的左部为开始符号
+        """
+        self.split_words = split_words
+        names = []
+        nonterminals = {}
+        for left, _, _ in productions:
+            if left not in nonterminals:
+                nonterminals[left] = len(names)
+                names.append(left)
+        if not split_words:
+            # 原写法中大写字母总是非终结符，即使它没有出现在左部
+            for _, right, _ in productions:
+                for symbol in right:
+                    if symbol.isupper() and symbol not in nonterminals:
+                        nonterminals[symbol] = len(names)
+                        names.append(symbol)
+        self.nonterminal_count = len(names)
+
+        terminals = {}
+        for _, right, _ in productions:
+            for symbol in right:
+                if symbol not in nonterminals and symbol not in terminals:
+                    terminals[symbol] = len(terminals)
+        terminals.pop(self.END, None)
+        terminal_names = list(terminals)
+        terminal_names.append(self.END)
+
+        self.names = names + terminal_names
+        self.ids = {name: symbol for symbol, name in enumerate(self.names)}
+        self.terminal_count = len(terminal_names)
+        self.end = self.ids[self.END]
+        self.lefts = [self.ids[left] for left, _, _ in productions]
+        self.rights = [tuple(self.ids[symbol] for symbol in right) for _, right, _ in productions]
+        self.texts = [text for _, _, text in productions]
+        self.start = self.lefts[0] if productions else None
+        # 每个非终结符的产生式编号
+        self.alternatives = [[] for _ in range(self.nonterminal_count)]
+        for production, left in enumerate(self.lefts):
+            self.alternatives[left].append(production)
+
+        self.nullable = None
+        self.first = None
+        self.follow = None
+        self.production_first = None
+        self.production_nullable = None
+        self.table = None
+        self.conflicts = []
+        self.first_steps = 0
+        self.follow_steps = 0
+
+    @classmethod
+    def parse(cls, lines, split_words=False):
+        """
+        解析文法文本，第一行可以带有"G[E]："这样的文法名，"|"分隔的候选式拆成多个产生式
+        """
+        productions = []
+        for number, line in enumerate(lines):
+            if number == 0 and "：" in line:
+                _, line = line.split("：", 1)
+            if cls.ARROW not in line:
+                if line.strip():
+                    raise ValueError(f"Missing '{cls.ARROW}' in grammar line {number + 1}: {line.strip()}")
+                continue
+            left, rights = line.split(cls.ARROW, 1)
+            left = left.strip()
+            for right in rights.split("|"):
+                if split_words:
+                    symbols = right.split()
+                    text = " ".join(symbols)
+                else:
+                    text = "".join(right.split())
+                    symbols = list(text)
+                symbols = [symbol for symbol in symbols if symbol != cls.EPSILON]
+                productions.append((left, symbols, text or cls.EPSILON))
+        return cls(productions, split_words)
+
+    @classmethod
+    def from_file(cls, file_name, split_words=False):
+        with open(file_name, "r", encoding="utf-8") as f:
+            return cls.parse(f.readlines(), split_words)
+
+    def is_terminal(self, symbol):
+        return symbol >= self.nonterminal_count
+
+    def bit(self, terminal):
+        return 1 << (terminal - self.nonterminal_count)
+
+    def terminals_of(self, bits):
+        """
+        将位集展开为终结符编号的列表
+        """
+        terminals = []
+        while bits:
+            low = bits & -bits
+            terminals.append(low.bit_length() - 1 + self.nonterminal_count)
+            bits ^= low
+        return terminals
+
+    def names_of(self, bits):
+        names = self.names
+        return {names[terminal] for terminal in self.terminals_of(bits)}
+
+    def production_string(self, production):
+        return f"{self.names[self.lefts[production]]}{self.ARROW}{self.texts[production]}"
+
+    def compute_nullable(self):
+        """
+        计算可以推出ε的非终结符：每个产生式记录右部中还未确定可空的非终结符个数，降为0时左部可空
+        """
+        nullable = [False] * self.nonterminal_count
+        remaining = []
+        occurrences = [[] for _ in range(self.nonterminal_count)]
+        worklist = deque()
+        for production, right in enumerate(self.rights):
+            if any(self.is_terminal(symbol) for symbol in right):
+                # 含终结符的产生式不可能推出ε
+                remaining.append(-1)
+                continue
+            remaining.append(len(right))
+            for symbol in right:
+                occurrences[symbol].append(production)
+            if not right and not nullable[self.lefts[production]]:
+                nullable[self.lefts[production]] = True
+                worklist.append(self.lefts[production])
+        while worklist:
+            symbol = worklist.popleft()
+            for production in occurrences[symbol]:
+                remaining[production] -= 1
+                left = self.lefts[production]
+                if remaining[production] == 0 and not nullable[left]:
+                    nullable[left] = True
+                    worklist.append(left)
+        self.nullable = nullable
+        return nullable
+
+    def propagate(self, sets, edges):
+        """
+        沿依赖边传播位集直到不再变化，edges[a]为集合需要包含sets[a]的符号，返回处理的工作表项数
+        """
+        pending = [bool(bits) for bits in sets]
+        worklist = deque(symbol for symbol, bits in enumerate(sets) if bits)
+        steps = 0
+        while worklist:
+            symbol = worklist.popleft()
+            pending[symbol] = False
+            steps += 1
+            bits = sets[symbol]
+            for target in edges[symbol]:
+                merged = sets[target] | bits
+                if merged != sets[target]:
+                    sets[target] = merged
+                    if not pending[target]:
+                        pending[target] = True
+                        worklist.append(target)
+        return steps
+
+    def compute_first(self):
+        """
+        计算FIRST集：A→αXβ中α可空时FIRST(A)包含FIRST(X)，X为终结符时直接加入，为非终结符时加一条X到A的依赖边
+        同时计算每个产生式右部的FIRST集和是否可空，供构造分析表使用
+        """
+        if self.nullable is None:
+            self.compute_nullable()
+        nullable = self.nullable
+        first = [0] * self.nonterminal_count
+        edges = [set() for _ in range(self.nonterminal_count)]
+        for left, right in zip(self.lefts, self.rights):
+            for symbol in right:
+                if self.is_terminal(symbol):
+                    first[left] |= self.bit(symbol)
+                    break
+                if symbol != left:
+                    edges[symbol].add(left)
+                if not nullable[symbol]:
+                    break
+        self.first_steps = self.propagate(first, edges)
+        self.first = first
+
+        self.production_first = []
+        self.production_nullable = []
+        for right in self.rights:
+            bits, empty = self.sequence_first(right)
+            self.production_first.append(bits)
+            self.production_nullable.append(empty)
+        return first
+
+    def sequence_first(self, symbols):
+        """
+        返回符号串的FIRST位集(不含ε)以及符号串是否可空
+        """
+        bits = 0
+        for symbol in symbols:
+            if self.is_terminal(symbol):
+                return bits | self.bit(symbol), False
+            bits |= self.first[symbol]
+            if not self.nullable[symbol]:
+                return bits, False
+        return bits, True
+
+    def compute_follow(self):
+        """
+        计算FOLLOW集：从右向左扫描每个产生式A→αBβ，FOLLOW(B)包含FIRST(β)，β可空时加一条A到B的依赖边
+        """
+        if self.first is None:
+            self.compute_first()
+        follow = [0] * self.nonterminal_count
+        edges = [set() for _ in range(self.nonterminal_count)]
+        if self.start is not None:
+            follow[self.start] = self.bit(self.end)
+        for left, right in zip(self.lefts, self.rights):
+            trailer = 0
+            trailer_nullable = True
+            for symbol in reversed(right):
+                if self.is_terminal(symbol):
+                    trailer = self.bit(symbol)
+                    trailer_nullable = False
+                    continue
+                follow[symbol] |= trailer
+                if trailer_nullable and symbol != left:
+                    edges[left].add(symbol)
+                if self.nullable[symbol]:
+                    trailer |= self.first[symbol]
+                else:
+                    trailer = self.first[symbol]
+                    trailer_nullable = False
+        self.follow_steps = self.propagate(follow, edges)
+        self.follow = follow
+        return follow
+
+    def table_rows(self):
+        """
+        按行计算LL(1)分析表的非空表项：A→α填入FIRST(α)中各终结符对应的位置，α可空时还填入FOLLOW(A)中各终结符对应的位置
+        返回每个非终结符一行的{终结符列号: 产生式编号}(列号为终结符编号减N)以及冲突列表，不分配整个矩阵；
+        有冲突时后面的产生式覆盖前面的，冲突以(非终结符, 终结符, 原产生式, 新产生式)的形式记录
+        """
+        if self.follow is None:
+            self.compute_follow()
+        rows = [{} for _ in range(self.nonterminal_count)]
+        conflicts = []
+        for production, left in enumerate(self.lefts):
+            bits = self.production_first[production]
+            if self.production_nullable[production]:
+                bits |= self.follow[left]
+            row = rows[left]
+            for terminal in self.terminals_of(bits):
+                column = terminal - self.nonterminal_count
+                if column in row:
+                    conflicts.append((left, terminal, row[column], production))
+                row[column] = production
+        return rows, conflicts
+
+    def compute_table(self):
+        """
+        构造LL(1)分析表，表为按"非终结符编号×(终结符个数+1)"下标的一维整数数组，表项为产生式编号，空白为-1，
+        每行最后一列留给不认识的单词；冲突记录在conflicts中
+        """
+        rows, conflicts = self.table_rows()
+        width = self.terminal_count + 1
+        table = array("i", [-1]) * (self.nonterminal_count * width)
+        for nt, row in enumerate(rows):
+            base = nt * width
+            for column, production in row.items():
+                table[base + column] = production
+        self.table = table
+        self.conflicts = conflicts
+        return table
+
+    def analyze(self):
+        """
+        计算nullable、FIRST、FOLLOW和分析表，已经计算过(包括从缓存读入)的部分不再重复计算
+        """
+        if self.nullable is None:
+            self.compute_nullable()
+        if self.first is None:
+            self.compute_first()
+        if self.follow is None:
+            self.compute_follow()
+        if self.table is None:
+            self.compute_table()
+        return self
@@ -0,0 +1,235 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from Grammar import Grammar
+
+
+class GrammarCache:
+    """
+    已分析文法的磁盘缓存，保存符号表、产生式、nullable、FIRST、FOLLOW和分析表，下次运行时直接读入，不再解析文法和计算各集合
+    缓存文件以"文法文件内容+split_words+格式版本"的SHA-256命名，文法改变后散列随之改变，旧缓存自然失效；directory默认为文法文件所在目录下的__ll1cache__。
+    文件格式(小端序)：
+      文件头：MAGIC、2字节版本号、1字节split_words、32字节散列，以及非终结符数N、终结符数T、产生式数P、右部符号总数R、位集字节数B各4字节
+      names：N+T个4字节长度，之后为拼接的UTF-8名字；texts：P个4字节长度，之后为拼接的UTF-8右部文本
+      lefts：P个4字节；right_offsets：P+1个4字节；rights：R个4字节
+      nullable：N字节；production_nullable：P字节
+      first、follow：各N个B字节的位集；production_first：P个B字节的位集
+      table：N*(T+1)个4字节的产生式编号；conflicts：4字节个数C，之后C个(非终结符, 终结符, 原产生式, 新产生式)，每项4个4字节
+    读入时将文件映射到内存，各整数数组按切片直接构造，不逐项解析。
+    """
+
+    MAGIC = b"LL1C"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHB32s5I")
+
+    def __init__(self, directory=None):
+        self.directory = directory
+
+    @classmethod
+    def digest(cls, content, split_words):
+        hasher = hashlib.sha256(content)
+        hasher.update(struct.pack("<BH", split_words, cls.VERSION))
+        return hasher.digest()
+
+    def path(self, grammar_file, digest):
+        directory = self.directory
+        if directory is None:
+            directory = os.path.join(os.path.dirname(os.path.abspath(grammar_file)), "__ll1cache__")
+        return os.path.join(directory, digest.hex() + ".ll1")
+
+    def load(self, grammar_file, split_words=False):
+        """
+        返回文法文件对应的已分析Grammar，命中缓存时直接读入，否则解析并分析文法后写入缓存
+        第二个返回值表示是否命中缓存
+        """
+        with open(grammar_file, "rb") as f:
+            content = f.read()
+        digest = self.digest(content, split_words)
+        path = self.path(grammar_file, digest)
+        try:
+            return self.read(path, digest), True
+        except (OSError, ValueError):
+            pass
+        grammar = Grammar.parse(content.decode("utf-8").splitlines(), split_words).analyze()
+        try:
+            self.write(path, digest, grammar)
+        except OSError:
+            # 缓存目录不可写时只是不缓存
+            pass
+        return grammar, False
+
+    @staticmethod
+    def int_column(values):
+        column = array("i", values)
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column.tobytes()
+
+    def encode(self, digest, grammar):
+        """
+        返回已分析的文法按缓存文件格式编码的bytes
+        """
+        if grammar.table is None:
+            grammar.analyze()
+        bit_bytes = (grammar.terminal_count + 7) // 8
+        names = [name.encode("utf-8") for name in grammar.names]
+        texts = [text.encode("utf-8") for text in grammar.texts]
+        offsets = [0]
+        for right in grammar.rights:
+            offsets.append(offsets[-1] + len(right))
+
+        def bitsets(sets):
+            return b"".join(bits.to_bytes(bit_bytes, "little") for bits in sets)
+
+        parts = [
+            self.HEADER.pack(
+                self.MAGIC,
+                self.VERSION,
+                grammar.split_words,
+                digest,
+                grammar.nonterminal_count,
+                grammar.terminal_count,
+                len(grammar.lefts),
+                offsets[-1],
+                bit_bytes,
+            ),
+            self.int_column(map(len, names)),
+            b"".join(names),
+            self.int_column(map(len, texts)),
+            b"".join(texts),
+            self.int_column(grammar.lefts),
+            self.int_column(offsets),
+            self.int_column(symbol for right in grammar.rights for symbol in right),
+            bytes(grammar.nullable),
+            bytes(grammar.production_nullable),
+            bitsets(grammar.first),
+            bitsets(grammar.follow),
+            bitsets(grammar.production_first),
+            self.int_column(grammar.table),
+            struct.pack("<I", len(grammar.conflicts)),
+            self.int_column(value for conflict in grammar.conflicts for value in conflict),
+        ]
+        return b"".join(parts)
+
+    def write(self, path, digest, grammar):
+        """
+        将已分析的文法写入path，先写临时文件再改名，其他进程不会读到写了一半的缓存
+        """
+        data = self.encode(digest, grammar)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def read(self, path, digest):
+        """
+        从path读入已分析的文法，文件不存在时抛出OSError，格式或散列不符时抛出ValueError
+        """
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as data:
+                    return self.decode(data, digest)
+
+    def decode(self, data, digest):
+        header = self.HEADER
+        if len(data) < header.size:
+            raise ValueError("Truncated grammar cache.")
+        (
+            magic,
+            version,
+            split_words,
+            stored_digest,
+            nonterminal_count,
+            terminal_count,
+            production_count,
+            symbol_count,
+            bit_bytes,
+        ) = header.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION or stored_digest != digest:
+            raise ValueError("Stale or foreign grammar cache.")
+        position = header.size
+
+        def take(size):
+            nonlocal position
+            if position + size > len(data):
+                raise ValueError("Truncated grammar cache.")
+            chunk = data[position : position + size]
+            position += size
+            return chunk
+
+        def ints(count):
+            column = array("i")
+            column.frombytes(take(4 * count))
+            if sys.byteorder == "big":
+                column.byteswap()
+            return column
+
+        def strings(count):
+            lengths = ints(count)
+            blob = bytes(take(sum(lengths)))
+            result = []
+            start = 0
+            for length in lengths:
+                result.append(blob[start : start + length].decode("utf-8"))
+                start += length
+            return result
+
+        def bitsets(count):
+            blob = bytes(take(count * bit_bytes))
+            return [
+                int.from_bytes(blob[i : i + bit_bytes], "little")
+                for i in range(0, count * bit_bytes, bit_bytes)
+            ]
+
+        symbol_total = nonterminal_count + terminal_count
+        names = strings(symbol_total)
+        texts = strings(production_count)
+        lefts = ints(production_count).tolist()
+        offsets = ints(production_count + 1)
+        symbols = ints(symbol_count).tolist()
+        nullable = [bool(flag) for flag in take(nonterminal_count)]
+        production_nullable = [bool(flag) for flag in take(production_count)]
+        first = bitsets(nonterminal_count)
+        follow = bitsets(nonterminal_count)
+        production_first = bitsets(production_count)
+        table = ints(nonterminal_count * (terminal_count + 1))
+        conflict_count = struct.unpack("<I", take(4))[0]
+        conflicts = ints(4 * conflict_count).tolist()
+
+        grammar = Grammar.__new__(Grammar)
+        grammar.split_words = bool(split_words)
+        grammar.names = names
+        grammar.ids = {name: symbol for symbol, name in enumerate(names)}
+        grammar.nonterminal_count = nonterminal_count
+        grammar.terminal_count = terminal_count
+        grammar.end = grammar.ids[Grammar.END]
+        grammar.lefts = lefts
+        grammar.rights = [
+            tuple(symbols[offsets[i] : offsets[i + 1]]) for i in range(production_count)
+        ]
+        grammar.texts = texts
+        grammar.start = lefts[0] if lefts else None
+        grammar.alternatives = [[] for _ in range(nonterminal_count)]
+        for production, left in enumerate(lefts):
+            grammar.alternatives[left].append(production)
+        grammar.nullable = nullable
+        grammar.first = first
+        grammar.follow = follow
+        grammar.production_first = production_first
+        grammar.production_nullable = production_nullable
+        grammar.table = table
+        grammar.conflicts = [tuple(conflicts[i : i + 4]) for i in range(0, len(conflicts), 4)]
+        grammar.first_steps = 0
+        grammar.follow_steps = 0
+        return grammar
@@ -0,0 +1,191 @@
+from array import array
+
+from Token import Token
+from TokenBuffer import TokenBuffer
+
+
+class IncrementalLexer:
+    """
+    增量词法分析器，用于编辑器中每次按键后的重新分析
+    以上一次的单词流(TokenBuffer)为基础，每次编辑只从编辑位置之前最近的安全重启点开始重新扫描，直到新识别出的单词与原单词流重新对齐为止。
+    单词偏移采用间隙(gap)表示：下标小于split的单词保存绝对偏移，其余单词保存相对于源程序末尾的偏移(偏移减去源程序长度)，
+    编辑之后的单词到源程序末尾的距离不变，因此不需要逐个平移，只有split移动经过的单词需要换算，连续在相近位置编辑时代价很小。
+    同时维护每个符号表项被多少个单词引用，引用数降为0的表项仍然保留，以保证符号id不变。
+    """
+
+    def __init__(self, analyzer, buffer):
+        self.analyzer = analyzer
+        # 源程序保存在bytearray中，编辑时原地修改，避免每次复制整个文件
+        self.source = bytearray(buffer.source)
+        self.categories = array("i", buffer.categories)
+        self.offsets = array("i", buffer.offsets)
+        self.lengths = array("i", buffer.lengths)
+        self.symbols = array("i", buffer.symbols)
+        self.split = len(self.offsets)
+
+        word_categories = analyzer.word_categories
+        self.tables = {
+            word_categories.IDENTIFIER.value: analyzer.idlist,
+            word_categories.UNSIGNED_INTEGER.value: analyzer.uintlist,
+            word_categories.UNSIGNED_FLOAT.value: analyzer.ufdlist,
+        }
+        self.references = {category: array("i") for category in self.tables}
+        for category, symbol in zip(self.categories, self.symbols):
+            if symbol != TokenBuffer.NO_SYMBOL:
+                self.reference(category, symbol, 1)
+
+    def reference(self, category, symbol, count):
+        references = self.references[category]
+        if symbol >= len(references):
+            references.extend([0] * (len(self.tables[category]) - len(references)))
+        references[symbol] += count
+
+    def references_of(self, category, symbol):
+        """
+        返回种别为category、符号id为symbol的表项当前被多少个单词引用
+        """
+        references = self.references[category]
+        return references[symbol] if symbol < len(references) else 0
+
+    def offset(self, index):
+        if index < self.split:
+            return self.offsets[index]
+        return self.offsets[index] + len(self.source)
+
+    def move_split(self, index):
+        """
+        将间隙移动到下标index处，只换算两个位置之间的单词偏移
+        """
+        length = len(self.source)
+        offsets = self.offsets
+        for i in range(index, self.split):
+            offsets[i] -= length
+        for i in range(self.split, index):
+            offsets[i] += length
+        self.split = index
+
+    def find(self, offset):
+        """
+        折半查找最后一个首字节偏移小于offset的单词，没有这样的单词时返回-1
+        """
+        low, high = 0, len(self.offsets)
+        while low < high:
+            middle = (low + high) // 2
+            if self.offset(middle) < offset:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    def restart_index(self, offset):
+        """
+        返回编辑位置offset之前的安全重启点，即起点在offset之前、且与前一个单词之间隔有空白的最后一个单词的下标，没有时返回-1
+        编辑可能与前面紧接着的若干个单词合并成更长的匹配(比如"2.5E+x"中的x改为3后，非法单词"2.5E"、"+"和"3"合并为浮点数"2.5E+3")，
+        而任何单词都不跨越空白，空白之前的单词不受编辑影响
+        """
+        index = self.find(offset)
+        while index > 0 and self.offset(index - 1) + self.lengths[index - 1] == self.offset(index):
+            index -= 1
+        return index
+
+    def edit(self, offset, deleted, inserted):
+        """
+        编辑函数，将源程序中从offset开始的deleted个字节替换为inserted，并增量地更新单词流
+        重新扫描从restart_index()给出的单词开始，
+        当新单词位于插入内容之后，且与原单词流中平移后的单词位置、长度、种别都相同时，后面的单词必然不变，扫描到此为止。
+        返回(第一个被替换的单词下标, 删除的单词数, 新增的单词数)
+        """
+        if isinstance(inserted, str):
+            inserted = inserted.encode("utf-8")
+        index = self.restart_index(offset)
+        first = max(index, 0)
+        self.move_split(first)
+        old_length = len(self.source)
+        restart = self.offsets[index] + old_length if index >= 0 else 0
+        self.source[offset : offset + deleted] = inserted
+        new_length = len(self.source)
+        inserted_end = offset + len(inserted)
+
+        new_categories = array("i")
+        new_offsets = array("i")
+        new_lengths = array("i")
+        new_symbols = array("i")
+        categories, offsets, lengths = self.categories, self.offsets, self.lengths
+        count = len(offsets)
+        old = first
+        # 扫描结束后必须释放对bytearray的引用，否则下一次编辑时无法改变其长度
+        view = memoryview(self.source)
+        tail = view[restart:]
+        scanner = self.analyzer.lexemes(tail, keep_tables=True)
+        for category, _, symbol, start, end, _, _ in scanner:
+            start += restart
+            length = end + restart - start
+            category = TokenBuffer.ERROR if category is None else category
+            # 平移后起点在新单词之前的原单词都被替换
+            while old < count and offsets[old] + new_length < start:
+                old += 1
+            if (
+                start >= inserted_end
+                and old < count
+                and offsets[old] + new_length == start
+                and lengths[old] == length
+                and categories[old] == category
+            ):
+                # 与原单词流重新对齐
+                break
+            new_categories.append(category)
+            new_offsets.append(start - new_length)
+            new_lengths.append(length)
+            new_symbols.append(TokenBuffer.NO_SYMBOL if symbol is None else symbol)
+        else:
+            old = count
+        scanner.close()
+        tail.release()
+        view.release()
+
+        for i in range(first, old):
+            if self.symbols[i] != TokenBuffer.NO_SYMBOL:
+                self.reference(categories[i], self.symbols[i], -1)
+        for category, symbol in zip(new_categories, new_symbols):
+            if symbol != TokenBuffer.NO_SYMBOL:
+                self.reference(category, symbol, 1)
+
+        categories[first:old] = new_categories
+        offsets[first:old] = new_offsets
+        lengths[first:old] = new_lengths
+        self.symbols[first:old] = new_symbols
+        return first, old - first, len(new_categories)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        category = self.categories[index]
+        symbol = self.symbols[index]
+        offset = self.offset(index)
+        line = self.source.count(b"\n", 0, offset) + 1
+        column = offset - (self.source.rfind(b"\n", 0, offset) + 1) + 1
+        return Token(
+            None if category == TokenBuffer.ERROR else category,
+            bytes(self.source[offset : offset + self.lengths[index]]).decode(
+                "utf-8", "replace"
+            ),
+            None if symbol == TokenBuffer.NO_SYMBOL else symbol,
+            offset,
+            line,
+            column,
+        )
+
+    def to_buffer(self):
+        """
+        将当前单词流转换为普通的TokenBuffer，偏移全部换算为绝对偏移
+        """
+        buffer = TokenBuffer(bytes(self.source))
+        buffer.categories = array("i", self.categories)
+        buffer.offsets = array("i", (self.offset(i) for i in range(len(self))))
+        buffer.lengths = array("i", self.lengths)
+        buffer.symbols = array("i", self.symbols)
+        return buffer
+
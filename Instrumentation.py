@@ -0,0 +1,105 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class Instrumentation:
+    """
+    计时与计数工具，供词法分析器、LL(1)分析器和四元式生成器记录各阶段的耗时和计数
+    phase(name)记录一个阶段的墙钟时间、CPU时间和调用次数，count(name, n)累加计数器，
+    profile为True时在每个阶段内打开cProfile，结果可以通过report()以字典形式取得，或通过dump()保存为JSON。
+    """
+
+    enabled = True
+
+    def __init__(self, profile=False):
+        self.timers = {}
+        self.counters = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self.profiling = 0
+
+    @contextmanager
+    def phase(self, name):
+        if self.profiler is not None:
+            # 嵌套的阶段只在最外层开关profiler
+            if self.profiling == 0:
+                self.profiler.enable()
+            self.profiling += 1
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if self.profiler is not None:
+                self.profiling -= 1
+                if self.profiling == 0:
+                    self.profiler.disable()
+            timer = self.timers.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+            timer["wall"] += wall
+            timer["cpu"] += cpu
+            timer["calls"] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, report):
+        """
+        合并另一个Instrumentation的report()结果，用于汇总多个工作进程的统计
+        """
+        for name, timer in report["timers"].items():
+            mine = self.timers.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+            for key in mine:
+                mine[key] += timer[key]
+        for name, value in report["counters"].items():
+            self.count(name, value)
+
+    def profile_stats(self, limit=20):
+        """
+        返回cProfile按累计时间排序的前limit项，没有打开profile时返回空字符串
+        """
+        if self.profiler is None:
+            return ""
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+    def report(self):
+        return {"timers": self.timers, "counters": self.counters}
+
+    def dump(self, file_name):
+        with open(file_name, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def dump_profile(self, file_name):
+        if self.profiler is not None:
+            self.profiler.dump_stats(file_name)
+
+
+class NullInstrumentation:
+    """
+    静默模式，所有操作都直接返回，不记录任何数据
+    调用者可以先判断enabled，跳过只为统计而做的额外计算
+    """
+
+    enabled = False
+    null_phase = nullcontext()
+
+    def phase(self, name):
+        return self.null_phase
+
+    def count(self, name, n=1):
+        pass
+
+    def merge(self, report):
+        pass
+
+    def report(self):
+        return {"timers": {}, "counters": {}}
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
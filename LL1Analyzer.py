@@ -1,124 +1,118 @@
+import argparse
+import io
+import sys
+
 from tabulate import tabulate
 
+from Grammar import Grammar
+from GrammarCache import GrammarCache
+from Instrumentation import NULL_INSTRUMENTATION
+from ParserGenerator import ParserGenerator
+from PredictiveParser import PredictiveParser
+from SparseTable import SparseTable
+
 
 class LL1Analyzer:
-    def __init__(self, grammar_file):
+    def __init__(
+        self, grammar_file, instrumentation=None, split_words=False, cache=None, sparse=False
+    ):
         self.grammar_file = grammar_file
-        self.grammar = self.read_grammar()
-        self.non_terminals = set()
-        self.terminals = set()
-        self.terminals_without_epsilon = set()
+        # 为True时产生式右部的符号以空白分隔，可以是多个字符的名字
+        self.split_words = split_words
+        # 为True时分析表使用行位移压缩的SparseTable，LL1_table中只保存非空表项，输出时只列出非空表项和冲突
+        self.sparse = sparse
+        self.sparse_table = None
+        # 计时与计数，默认为静默模式
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        with self.instrumentation.phase("read_grammar"):
+            if cache is None:
+                self.engine = Grammar.from_file(grammar_file, split_words)
+            else:
+                # 从GrammarCache读入已分析的文法，FIRST、FOLLOW和分析表不再重新计算
+                self.engine, hit = cache.load(grammar_file, split_words)
+                if hit:
+                    self.instrumentation.count("grammar_cache_hits")
+                else:
+                    self.instrumentation.count("grammar_cache_misses")
+                    self.instrumentation.count("first_set_worklist_steps", self.engine.first_steps)
+                    self.instrumentation.count("follow_set_worklist_steps", self.engine.follow_steps)
+            self.grammar = self.read_grammar()
+        self.instrumentation.count("productions", len(self.grammar))
         self.first_sets = {}
         self.follow_sets = {}
         self.LL1_table = {}
-        for line in self.grammar:
-            left, right = line.split("→")
-            self.non_terminals.add(left.strip())
-            for symbol in right:
-                if symbol.islower() or symbol in ["(", "ε", ")", "*", "+"]:
-                    self.terminals.add(symbol)
-                if symbol.isupper():
-                    self.non_terminals.add(symbol)
+        engine = self.engine
+        self.non_terminals = set(engine.names[: engine.nonterminal_count])
+        self.terminals = set(engine.names[engine.nonterminal_count : engine.end])
+        if any(not right for right in engine.rights):
+            self.terminals.add(Grammar.EPSILON)
 
         self.terminals_without_epsilon = self.terminals - {"ε"} | {"#"}
 
 
     def read_grammar(self):
-        with open(self.grammar_file, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        _, lines[0] = lines[0].split("：")
-        lines = [line.replace(" ", "").strip() for line in lines]
-        new_lines = []
-        for line in lines:
-            if "|" in line:
-                left, rights = line.split("→")
-                rights = rights.split("|")
-                for right in rights:
-                    new_lines.append(f"{left}→{right}")
-            else:
-                new_lines.append(line)
-        return new_lines
+        """
+        返回拆分"|"后的产生式列表，每项形如"A→+TA"，文法只在构造Grammar时解析一次
+        """
+        return [
+            self.engine.production_string(production)
+            for production in range(len(self.engine.lefts))
+        ]
 
     def compute_first_sets(self):
-        self.first_sets = {nt: set() for nt in self.non_terminals}
-
-        # 初始化 FIRST 集
-        for line in self.grammar:
-            left, right = line.split("→")
-            if right[0] in self.terminals:
-                self.first_sets[left].add(right[0])
-
-        # 不断迭代直到 FIRST 集不再变化
-        while True:
-            old_first_sets = {nt: set(self.first_sets[nt]) for nt in self.non_terminals}
-            for line in self.grammar:
-                left, right = line.split("→")
-                for symbol in right:
-                    if symbol in self.terminals:
-                        self.first_sets[left].add(symbol)
-                        break
-                    else:
-                        self.first_sets[left] = self.first_sets[left].union(
-                            self.first_sets[symbol] - {"ε"}
-                        )
-                        if "ε" not in self.first_sets[symbol]:
-                            break
-                else:
-                    self.first_sets[left].add("ε")
-            if old_first_sets == self.first_sets:
-                break
+        engine = self.engine
+        if engine.first is None:
+            engine.compute_first()
+            self.instrumentation.count("first_set_worklist_steps", engine.first_steps)
+        self.first_sets = {}
+        for nt in range(engine.nonterminal_count):
+            first_set = engine.names_of(engine.first[nt])
+            if engine.nullable[nt]:
+                first_set.add("ε")
+            self.first_sets[engine.names[nt]] = first_set
 
     def compute_follow_sets(self):
-        self.follow_sets = {nt: set() for nt in self.non_terminals}
-        self.follow_sets[self.grammar[0].split("→")[0]].add(
-            "#"
-        )  # 添加结束符到开始符号的 FOLLOW 集
-
-        # 不断迭代直到 FOLLOW 集不再变化
-        while True:
-            old_follow_sets = {
-                nt: set(self.follow_sets[nt]) for nt in self.non_terminals
-            }
-            for line in self.grammar:
-                left, right = line.split("→")
-                for i in range(len(right)):
-                    if right[i] in self.non_terminals:
-                        if i + 1 < len(right):
-                            if right[i + 1] in self.non_terminals:
-                                self.follow_sets[right[i]] = self.follow_sets[
-                                    right[i]
-                                ].union(
-                                    self.first_sets.get(right[i + 1], set()) - {"ε"}
-                                )
-                            else:
-                                self.follow_sets[right[i]].add(right[i + 1])
-                        if i + 1 == len(right) or "ε" in self.first_sets.get(
-                            right[i + 1], set()
-                        ):
-                            self.follow_sets[right[i]] = self.follow_sets[
-                                right[i]
-                            ].union(self.follow_sets[left])
-            if old_follow_sets == self.follow_sets:
-                break
+        engine = self.engine
+        if engine.follow is None:
+            engine.compute_follow()
+            self.instrumentation.count("follow_set_worklist_steps", engine.follow_steps)
+        self.follow_sets = {
+            engine.names[nt]: engine.names_of(engine.follow[nt])
+            for nt in range(engine.nonterminal_count)
+        }
 
     def compute_LL1_table(self):
+        """
+        由Grammar的整数分析表展开为{非终结符: {终结符: "→右部"}}的形式
+        sparse模式下由压缩表展开，每行只有非空表项，不分配整个矩阵
+        """
+        engine = self.engine
+        names = engine.names
+        if self.sparse:
+            self.sparse_table = SparseTable(engine)
+            self.LL1_table = {nt: {} for nt in self.non_terminals}
+            for nt, column, production in self.sparse_table.entries():
+                self.LL1_table[names[nt]][names[column + engine.nonterminal_count]] = (
+                    "→" + engine.texts[production]
+                )
+            return
+
+        if engine.table is None:
+            engine.compute_table()
         self.LL1_table = {
             nt: {t: "" for t in self.terminals_without_epsilon}
             for nt in self.non_terminals
         }
 
-        for line in self.grammar:
-            left, right = line.split("→")
-            symbol = right[0]
-            if symbol in self.terminals and symbol != "ε":
-                self.LL1_table[left][symbol] = "→" + right
-            else:
-                if "ε" in self.first_sets[left] and symbol == "ε":
-                    for token in self.follow_sets[left]:
-                        self.LL1_table[left][token] = "→" + right
-                else:
-                    for token in self.first_sets[left]:
-                        self.LL1_table[left][token] = "→" + right
+        width = engine.terminal_count + 1
+        for nt in range(engine.nonterminal_count):
+            row = self.LL1_table[names[nt]]
+            for terminal in range(engine.terminal_count):
+                production = engine.table[nt * width + terminal]
+                if production >= 0:
+                    row[names[terminal + engine.nonterminal_count]] = (
+                        "→" + engine.texts[production]
+                    )
 
     def __str__(self) -> str:
         result = ""
@@ -128,6 +122,11 @@ class LL1Analyzer:
         for nt in self.non_terminals:
             result += f"FOLLOW({nt}) = {{{', '.join(self.follow_sets[nt])}}}\n"
         result += "\n"
+        if self.sparse:
+            # 只列出非空表项和冲突
+            table = io.StringIO()
+            self.sparse_table.dump(table)
+            return result + table.getvalue()
         table = tabulate(
             [
                 [nt] + [self.LL1_table[nt][t] for t in self.terminals_without_epsilon]
@@ -139,21 +138,69 @@ class LL1Analyzer:
         result += table
         return result
 
+    def memory_report(self):
+        """
+        比较分析表各种表示占用的内存(字节)：稠密整数表、压缩表，以及LL1_table字典本身(不含共享的字符串)
+        """
+        report = (self.sparse_table or SparseTable(self.engine)).memory_report()
+        report["LL1_table_dict_bytes"] = sys.getsizeof(self.LL1_table) + sum(
+            sys.getsizeof(row) for row in self.LL1_table.values()
+        )
+        return report
+
     def dump(self, file_name):
         with open(file_name, "w", encoding="utf-8") as f:
             f.write(str(self))
 
+    def parser(self, category_terminals=None):
+        """
+        返回按本文法分析单词流的PredictiveParser，category_terminals将单词种别映射为终结符名，如{1: "i"}
+        """
+        return PredictiveParser(self.engine, category_terminals)
+
+    def generate_parser(self, file_name):
+        """
+        为本文法生成独立的递归下降分析器模块并写入file_name，生成的模块不依赖tabulate和本分析器
+        """
+        ParserGenerator(self.engine).write(file_name)
+
     def analyze(self):
         # 计算 FIRST 集
-        self.compute_first_sets()
+        with self.instrumentation.phase("first_sets"):
+            self.compute_first_sets()
         # 计算 FOLLOW 集
-        self.compute_follow_sets()
+        with self.instrumentation.phase("follow_sets"):
+            self.compute_follow_sets()
         # 计算 LL(1) 分析表
-        self.compute_LL1_table()
+        with self.instrumentation.phase("LL1_table"):
+            self.compute_LL1_table()
 
 
 if __name__ == "__main__":
-    ll1Analyzer = LL1Analyzer("grammar.txt")
+    parser = argparse.ArgumentParser(description="LL(1)文法分析器")
+    parser.add_argument("grammar", nargs="?", default="grammar.txt", help="文法文件")
+    parser.add_argument(
+        "--split-words", action="store_true", help="产生式右部的符号以空白分隔"
+    )
+    parser.add_argument(
+        "--sparse", action="store_true", help="使用压缩的分析表，只输出非空表项和冲突"
+    )
+    parser.add_argument(
+        "--memory", action="store_true", help="输出稠密表与压缩表的内存比较"
+    )
+    parser.add_argument("-o", "--output", default="output1.txt", help="输出文件")
+    args = parser.parse_args()
+
+    # 缓存文件中保存稠密分析表，--sparse时不经过GrammarCache，只计算FIRST、FOLLOW和压缩表
+    ll1Analyzer = LL1Analyzer(
+        args.grammar,
+        split_words=args.split_words,
+        cache=None if args.sparse else GrammarCache(),
+        sparse=args.sparse,
+    )
     ll1Analyzer.analyze()
     print(ll1Analyzer)
-    ll1Analyzer.dump("output1.txt")
+    ll1Analyzer.dump(args.output)
+    if args.memory:
+        for key, value in ll1Analyzer.memory_report().items():
+            print(f"{key}: {value}")
@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from main import new_analyzer, operators, reslist
+
+# 与main.py中的分析流程对应的各个阶段，legacy阶段为原先逐类扫描的识别函数
+LEGACY_PHASES = [
+    "identify_identifiers",
+    "identify_unsigned_integers",
+    "identify_unsigned_floats",
+    "identify_reserved_words",
+    "identify_operators",
+    "identify_delimiters",
+    "generate_lexical_tuples",
+]
+
+UNARY_OPERATORS = {"++", "--", "!", "~"}
+
+
+def parse_size(text):
+    """
+    解析形如16K、4M、1G的大小
+    """
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def generate_statements(seed=0):
+    """
+    无限生成合成的C语言语句，混合标识符、无符号整数和浮点数(包括2.5E3这样的指数形式)、
+    reslist中的所有保留字以及main.py中的所有运算符和分隔符
+    """
+    rng = random.Random(seed)
+    binary_operators = [op for op in operators if op not in UNARY_OPERATORS]
+    keywords = [word for word in reslist if word not in ("if", "for", "while")]
+    keyword_index = 0
+
+    def identifier():
+        return rng.choice("abcdefghijklmnopqrstuvwxyz_") + str(rng.randrange(4096))
+
+    def number():
+        kind = rng.randrange(4)
+        if kind == 0:
+            return str(rng.randrange(100000))
+        if kind == 1:
+            return f"{rng.randrange(1000)}.{rng.randrange(10000):04d}"
+        if kind == 2:
+            return f"{rng.randrange(10)}.{rng.randrange(10)}E{rng.randrange(10)}"
+        return identifier()
+
+    def expression(depth=0):
+        if depth > 2 or rng.random() < 0.3:
+            operand = number()
+            if rng.random() < 0.1:
+                operand = rng.choice(["!", "~"]) + operand
+            return operand
+        return f"{expression(depth + 1)} {rng.choice(binary_operators)} {expression(depth + 1)}"
+
+    # 第一段语句保证每个运算符、分隔符和保留字至少出现一次
+    for op in binary_operators:
+        yield f"{identifier()} = {identifier()} {op} {number()};\n"
+    yield f"{identifier()}++; {identifier()}--; {identifier()} = !{identifier()} + ~{identifier()};\n"
+    yield f"{identifier()}: {identifier()}[{number()}] = {number()};\n"
+    for word in reslist:
+        yield f"{word} {identifier()};\n"
+
+    while True:
+        kind = rng.randrange(6)
+        if kind == 0:
+            yield f"if ({expression()}) {{ {identifier()} = {expression()}; }}\n"
+        elif kind == 1:
+            yield f"while ({identifier()} < {number()}) {{ {identifier()}++; }}\n"
+        elif kind == 2:
+            i = identifier()
+            yield f"for ({i} = 0; {i} <= {number()}; {i}++) {{ {identifier()}[{i}] = {expression()}; }}\n"
+        elif kind == 3:
+            word = keywords[keyword_index % len(keywords)]
+            keyword_index += 1
+            yield f"{word} {identifier()}, {identifier()} = {number()};\n"
+        else:
+            yield f"{identifier()} = {expression()};\n"
+
+
+def write_source(file_name, size, seed=0):
+    """
+    向file_name写入约size字节的合成源程序，边生成边写入，不在内存中保存整个文件
+    """
+    written = 0
+    with open(file_name, "w", encoding="utf-8") as file:
+        for statement in generate_statements(seed):
+            file.write(statement)
+            written += len(statement)
+            if written >= size:
+                break
+    return written
+
+
+def peak_rss():
+    """
+    返回当前进程的峰值常驻内存(字节)，Linux下ru_maxrss的单位为KB，macOS下为字节
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(file_name, legacy_phases=True):
+    """
+    对一个输入文件测量analyze()的总时间、每秒单词数和峰值常驻内存，以及各个legacy识别函数的时间
+    在独立的进程中运行，峰值内存不受其他规模的测量影响
+    """
+    la = new_analyzer(file_name)
+    start = time.perf_counter()
+    lexical_tuples = la.analyze()[0]
+    elapsed = time.perf_counter() - start
+    result = {
+        "bytes": os.path.getsize(file_name),
+        "tokens": len(lexical_tuples),
+        "seconds": elapsed,
+        "tokens_per_second": len(lexical_tuples) / elapsed if elapsed else 0.0,
+        "peak_rss": peak_rss(),
+        "phases": {},
+    }
+    if legacy_phases:
+        la = new_analyzer(file_name)
+        la.data
+        for phase in LEGACY_PHASES:
+            start = time.perf_counter()
+            getattr(la, phase)()
+            result["phases"][phase] = time.perf_counter() - start
+    return result
+
+
+def run_benchmark(sizes, seed=0, legacy_phases=True, directory=None):
+    """
+    依次为每个规模生成合成源程序并测量，返回以规模为键的结果
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(dir=directory) as temp:
+        for size in sizes:
+            file_name = os.path.join(temp, f"bench_{size}.c")
+            write_source(file_name, size, seed)
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+                results[str(size)] = executor.submit(
+                    measure, file_name, legacy_phases
+                ).result()
+            os.remove(file_name)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    与保存的基线比较每秒单词数，低于基线(1 - tolerance)倍的规模视为性能回退
+    """
+    regressions = []
+    for size, result in results.items():
+        if size not in baseline:
+            continue
+        old = baseline[size]["tokens_per_second"]
+        new = result["tokens_per_second"]
+        if old and new < old * (1 - tolerance):
+            regressions.append((size, old, new))
+    return regressions
+
+
+def format_results(results):
+    lines = []
+    for size, result in results.items():
+        lines.append(
+            f"{int(size):>12} B  {result['tokens']:>10} tokens  "
+            f"{result['seconds']:8.3f} s  {result['tokens_per_second']:>12.0f} tokens/s  "
+            f"peak RSS {result['peak_rss'] / (1 << 20):8.1f} MB"
+        )
+        for phase, seconds in result["phases"].items():
+            lines.append(f"{'':>16}{phase:<28}{seconds:8.3f} s")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="词法分析器的性能测试")
+    parser.add_argument(
+        "--sizes", nargs="+", default=["16K", "1M", "16M"], help="合成源程序的大小，如16K 1M 100M"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="合成源程序的随机种子")
+    parser.add_argument(
+        "--no-phases", action="store_true", help="不测量各个legacy识别函数的时间"
+    )
+    parser.add_argument("--save", help="将结果保存为JSON基线文件")
+    parser.add_argument("--compare", help="与JSON基线文件比较，出现回退时返回非零状态")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="允许的每秒单词数下降比例"
+    )
+    parser.add_argument("--tmpdir", help="存放合成源程序的目录")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        [parse_size(size) for size in args.sizes],
+        args.seed,
+        not args.no_phases,
+        args.tmpdir,
+    )
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {args.save}.")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for size, old, new in regressions:
+            print(f"Regression at {size} B: {old:.0f} -> {new:.0f} tokens/s")
+        if regressions:
+            sys.exit(1)
@@ -1,6 +1,13 @@
+import mmap
 import re
 from enum import Enum
 
+from CharacterValidator import CharacterValidator
+from Instrumentation import NULL_INSTRUMENTATION
+from SymbolTable import SymbolTable
+from Token import Token
+from TokenBuffer import TokenBuffer
+
 
 class LexicalAnalyzer:
     def __init__(
@@ -11,23 +18,47 @@ class LexicalAnalyzer:
         delimiters: list[str],
         legal_characters: str = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_+-*/%()[]{}=<>!&|^~,:;.# \n\t'\"\\",
         file_name="test.c",
+        sorted_symbols=False,
+        instrumentation=None,
+        validate_characters=True,
     ):
         self.word_categories = category
         self.reserved_words = reslist
         self.operators = operators
         self.delimiters = delimiters
         self.legal_characters = legal_characters
+        # 为True时符号表按ASCII码排序并使用折半查找，否则按出现顺序排列并使用散列查找
+        self.sorted_symbols = sorted_symbols
+        self.file_name = file_name
+        self._data = None
+        # 计时与计数，默认为静默模式
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        self.scanner_key = None
+        # 为True时analyze()在扫描前检查非法字符，结果保存在illegal_characters中
+        self.validate_characters = validate_characters
+        self.illegal_characters = []
+        self.validator = None
+        self.validator_key = None
+
+    @property
+    def data(self):
         """
         读取输入文件的函数，从input文件中读取C语言源程序语句
+        文件在第一次访问data时才整体读入，tokens()按块读取文件，不需要整体读入
         """
-        try:
-            with open(file_name, "r", encoding="utf-8") as file:
-                self.data = file.read()
-                print(f"Successfully read input file named {file_name}.")
-        except FileNotFoundError:
-            print("Error: input file not found.")
-        except Exception as e:
-            print(f"Error: {e}")
+        if self._data is None:
+            try:
+                with open(self.file_name, "r", encoding="utf-8") as file:
+                    self._data = file.read()
+            except FileNotFoundError:
+                print("Error: input file not found.")
+            except Exception as e:
+                print(f"Error: {e}")
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
 
     def identify_identifiers(self) -> list[dict]:
         """
@@ -37,25 +68,14 @@ class LexicalAnalyzer:
         源程序中若某个用户标识符(比如变量x)出现多次则对应着多个单词，即每次出现都对应一个单词二元式，但其在用户标识符表中只对应1项。
         源程序中的单词二元式必须按出现顺序排列，而用户标识符表中的标识符由于需要查重故可以按ASCII码排序也可以按出现顺序排列{分别对应折半查找和顺序查找}。
         """
-        self.identified_identifiers = []
+        self.idlist = SymbolTable("name", self.sorted_symbols)
+        reserved_words = set(self.reserved_words)
         pattern = r"\b[a-zA-Z_][a-zA-Z0-9_]*\b"
-        identifiers = re.findall(pattern, self.data)
-        for identifier in identifiers:
-            # 检查这个标识符是否是关键字
-            if identifier not in self.reserved_words:
-                # 创建一个字典来存储标识符名称、类型和存储长度
-                identifier_info = {
-                    "name": identifier,
-                    "type": None,
-                    "storage_length": None,
-                }
-                # 检查这个标识符是否已经在idlist中
-                if not any(
-                    d["name"] == identifier for d in self.identified_identifiers
-                ):
-                    self.identified_identifiers.append(identifier_info)
-        # 按照标识符在源代码中出现的顺序对idlist进行排序
-        self.identified_identifiers.sort(key=lambda x: identifiers.index(x["name"]))
+        for identifier in re.findall(pattern, self.data):
+            # 检查这个标识符是否是关键字，符号表负责查重
+            if identifier not in reserved_words:
+                self.idlist.insert(identifier)
+        self.identified_identifiers = self.idlist.to_list()
         return self.identified_identifiers
 
     def identify_unsigned_integers(self):
@@ -64,22 +84,11 @@ class LexicalAnalyzer:
         uintlist包含数值、类型、存储长度等字段。
         词法分析器运行过程中将用户源程序中出现的无符号整数填入数值字段，而类型、存储长度等字段为空，这些字段在编译过程的后续阶段填入。
         """
-        self.identified_unsigned_integers = []
+        self.uintlist = SymbolTable("value", self.sorted_symbols)
         pattern = r"(?<!\.)\b[0-9]+\b(?!\.)"
-        unsigned_integers = re.findall(pattern, self.data)
-        for unsigned_integer in unsigned_integers:
-            # 创建一个字典来存储数值、类型和存储长度
-            integer_info = {
-                "value": unsigned_integer,
-                "type": None,
-                "storage_length": None,
-            }
-            # 检查这个整数是否已经在uintlist中
-            if not any(
-                d["value"] == unsigned_integer
-                for d in self.identified_unsigned_integers
-            ):
-                self.identified_unsigned_integers.append(integer_info)
+        for unsigned_integer in re.findall(pattern, self.data):
+            self.uintlist.insert(unsigned_integer)
+        self.identified_unsigned_integers = self.uintlist.to_list()
         return self.identified_unsigned_integers
 
     def identify_unsigned_floats(self):
@@ -88,18 +97,11 @@ class LexicalAnalyzer:
         ufdlist包含数值、类型、存储长度等字段。
         词法分析器运行过程中将用户源程序中出现的无符号浮点数填入数值字段，而类型、存储长度等字段为空，这些字段在编译过程的后续阶段填入。
         """
-        self.identified_unsigned_floats = []
+        self.ufdlist = SymbolTable("value", self.sorted_symbols)
         pattern = r"\b[0-9]*\.[0-9]+(?:[Ee][+-]?[0-9]+)?\b"
-        unsigned_floats = re.findall(pattern, self.data)
-        for unsigned_float in unsigned_floats:
-            # 创建一个字典来存储数值、类型和存储长度
-            float_info = {"value": unsigned_float, "type": None, "storage_length": None}
-            # 检查这个浮点数是否已经在ufdlist中
-            if not any(
-                d["value"] == unsigned_float for d in self.identified_unsigned_floats
-            ):
-
-                self.identified_unsigned_floats.append(float_info)
+        for unsigned_float in re.findall(pattern, self.data):
+            self.ufdlist.insert(unsigned_float)
+        self.identified_unsigned_floats = self.ufdlist.to_list()
         return self.identified_unsigned_floats
 
     def identify_reserved_words(self):
@@ -133,18 +135,22 @@ class LexicalAnalyzer:
                 self.identified_delimiters.append(delimiter)
         return self.identified_delimiters
 
-    def handle_illegal_characters(self):
+    def handle_illegal_characters(self, source=None):
         """
-        错误处理函数，识别非法字符并报错
+        错误处理函数，识别非法字符，返回按位置排列的IllegalCharacter列表(带字节偏移、行号和列号)，同时保存在illegal_characters中
+        由CharacterValidator按块对整个源程序做字符分类，不逐字符循环；source为None时检查已读入的data，未读入时按块读取输入文件
+        合法字符表不变时直接使用上次建立的字符类表
         """
-        errors = []
-        for character in self.data:
-            if character not in self.legal_characters:
-                errors.append(character)
-        if errors:
-            print("Error: Illegal characters found - ", set(errors))
+        if self.legal_characters != self.validator_key:
+            self.validator = CharacterValidator(self.legal_characters)
+            self.validator_key = self.legal_characters
+        if source is None:
+            source = self._data
+        if source is None:
+            self.illegal_characters = self.validator.validate_file(self.file_name)
         else:
-            print("No illegal characters found.")
+            self.illegal_characters = self.validator.validate(source)
+        return self.illegal_characters
 
     def generate_lexical_tuples(self):
         """
@@ -172,17 +178,11 @@ class LexicalAnalyzer:
             lexical_tuple = {"category": None, "value": word}
 
             # 判断单词的种别，并将种别和值存储在词法二元式中
-            if any(word == id_dict["name"] for id_dict in self.identified_identifiers):
+            if word in self.idlist:
                 lexical_tuple["category"] = self.word_categories.IDENTIFIER.value
-            elif any(
-                word == uint_dict["value"]
-                for uint_dict in self.identified_unsigned_integers
-            ):
+            elif word in self.uintlist:
                 lexical_tuple["category"] = self.word_categories.UNSIGNED_INTEGER.value
-            elif any(
-                word == ufd_dict["value"]
-                for ufd_dict in self.identified_unsigned_floats
-            ):
+            elif word in self.ufdlist:
                 lexical_tuple["category"] = self.word_categories.UNSIGNED_FLOAT.value
                 # lexical_tuple["value"] = format(float(word), '.15g')
             elif word in self.identified_reserved_words:
@@ -196,47 +196,237 @@ class LexicalAnalyzer:
             self.lexical_tuples.append(lexical_tuple)
         return self.lexical_tuples
 
-    def analyze(self):
+    def build_scanner(self):
         """
-        主函数，用于调用其他函数完成词法分析器的功能
+        构造单遍扫描所用的总正则表达式，将浮点数、整数、单词、运算符/分隔符、空白和非法单词合并为一个带命名分组的多选结构
+        运算符和分隔符按长度从长到短排列，保证"++"、"<="等优先于"+"、"<"匹配；
+        数字和单词后面必须紧跟空白或运算符/分隔符字符，否则整段按非法单词处理，与原先按空白和运算符切分单词的结果一致；
+        单词前的空格和制表符在同一次匹配中跳过，只有换行单独匹配，用于统计行号
+        扫描在源文件的字节上进行，因此同时编译一个bytes版本byte_scanner；运算符和分隔符表不变时直接使用上次构造的结果
+        """
+        key = (tuple(self.operators), tuple(self.delimiters))
+        if key == self.scanner_key:
+            return self.scanner
+        symbols = sorted(self.operators + self.delimiters, key=len, reverse=True)
+        symbol_characters = re.escape("".join(sorted(set("".join(symbols)))))
+        boundary = r"(?![^\s" + symbol_characters + r"])"
+        pattern = (
+            r"[ \t\r\f\v]*(?:(?P<NEWLINE>\n\s*)"
+            + r"|(?P<UNSIGNED_FLOAT>[0-9]*\.[0-9]+(?:[Ee][+-]?[0-9]+)?)" + boundary
+            + r"|(?P<UNSIGNED_INTEGER>[0-9]+)" + boundary
+            + r"|(?P<WORD>[a-zA-Z_][a-zA-Z0-9_]*)" + boundary
+            + r"|(?P<SYMBOL>" + "|".join(map(re.escape, symbols)) + r")"
+            + r"|(?P<ERROR>[^\s" + symbol_characters + r"]+))"
+        )
+        self.scanner = re.compile(pattern)
+        self.byte_scanner = re.compile(pattern.encode("utf-8"))
+        self.symbol_categories = {
+            delimiter: self.word_categories.DELIMITER.value
+            for delimiter in self.delimiters
+        }
+        self.symbol_categories.update(
+            (operator, self.word_categories.OPERATOR.value)
+            for operator in self.operators
+        )
+        self.scanner_key = key
+        return self.scanner
+
+    def read_chunks(self, chunk_size):
+        """
+        按块读取输入文件的函数，每次返回不超过chunk_size字节的内容
+        """
+        with open(self.file_name, "rb") as file:
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def lexemes(self, source=None, chunk_size=1 << 16, use_mmap=False, keep_tables=False):
+        """
+        单遍扫描的核心函数，从左到右扫描源程序，每识别出一个单词就生成一个(种别, 值, 符号表id, 首字节偏移, 尾字节偏移, 行号, 列号)元组，
+        并在同一遍中填写idlist、uintlist、ufdlist。tokens()和tokenize()都建立在这个函数之上。
+        source为None时从输入文件按chunk_size字节分块读取，use_mmap为True时将文件映射到内存后直接扫描；也可以直接传入str或bytes。
+        一个块末尾的单词可能被截断(比如"+"后面紧跟下一块开头的"+")，因此与块末尾相接的匹配推迟到读入下一块后重新识别。
+        keep_tables为True时在已有的符号表上继续填写，供增量分析只重新扫描一段源程序时使用。
         """
-        # 处理错误，识别非法字符并报错
-        # print("Handling errors...")
-        # if self.handle_illegal_characters():
-        #     return
+        self.build_scanner()
+        scanner = self.byte_scanner
+        # 循环中用到的种别值提前取出，避免每个单词都访问一次枚举
+        identifier = self.word_categories.IDENTIFIER.value
+        unsigned_integer = self.word_categories.UNSIGNED_INTEGER.value
+        unsigned_float = self.word_categories.UNSIGNED_FLOAT.value
+        reserved_word = self.word_categories.RESERVED_WORD.value
+        symbol_categories = self.symbol_categories
+        reserved_words = set(self.reserved_words)
 
-        # 识别用户标识符并添加到用户标识符表idlist中
-        print("Identifying identifiers...")
-        self.identify_identifiers()
+        if not keep_tables:
+            self.idlist = SymbolTable("name", self.sorted_symbols)
+            self.uintlist = SymbolTable("value", self.sorted_symbols)
+            self.ufdlist = SymbolTable("value", self.sorted_symbols)
+            self.seen_reserved_words = set()
+            self.seen_symbols = set()
+
+        mapped = None
+        if source is not None:
+            if isinstance(source, str):
+                source = source.encode("utf-8")
+            chunks = [source]
+        elif use_mmap:
+            with open(self.file_name, "rb") as file:
+                try:
+                    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                    chunks = [mapped]
+                except ValueError:
+                    # 空文件不能被映射
+                    chunks = []
+        else:
+            chunks = self.read_chunks(chunk_size)
+
+        base = 0  # buffer[0]在源文件中的字节偏移
+        line = 1
+        line_start = 0  # 当前行首的字节偏移
+        buffer = b""
+        chunks = iter(chunks)
+        try:
+            chunk = next(chunks, None)
+            while chunk is not None:
+                buffer = buffer + chunk if buffer else chunk
+                chunk = next(chunks, None)
+                at_end = chunk is None
+                buffer_length = len(buffer)
+                position = buffer_length
+                for match in scanner.finditer(buffer):
+                    end = match.end()
+                    if end == buffer_length and not at_end:
+                        # 与块末尾相接的单词可能不完整，留到下一块
+                        position = match.start()
+                        break
+                    kind = match.lastgroup
+                    lexeme = match.group(match.lastindex)
+                    start = end - len(lexeme)
+                    if kind == "NEWLINE":
+                        line += lexeme.count(b"\n")
+                        line_start = base + start + lexeme.rindex(b"\n") + 1
+                        continue
+                    word = lexeme.decode("utf-8", "replace")
+                    symbol_id = None
+                    if kind == "WORD":
+                        if word in reserved_words:
+                            self.seen_reserved_words.add(word)
+                            category = reserved_word
+                        else:
+                            # 标识符在idlist中只对应1项，由符号表查重
+                            symbol_id = self.idlist.insert(word)
+                            category = identifier
+                    elif kind == "SYMBOL":
+                        self.seen_symbols.add(word)
+                        category = symbol_categories[word]
+                    elif kind == "UNSIGNED_INTEGER":
+                        symbol_id = self.uintlist.insert(word)
+                        category = unsigned_integer
+                    elif kind == "UNSIGNED_FLOAT":
+                        symbol_id = self.ufdlist.insert(word)
+                        category = unsigned_float
+                    else:
+                        category = None
+                    offset = base + start
+                    yield (
+                        category,
+                        word,
+                        symbol_id,
+                        offset,
+                        base + end,
+                        line,
+                        offset - line_start + 1,
+                    )
+                base += position
+                buffer = buffer[position:]
+            self.instrumentation.count("bytes_scanned", base)
+        finally:
+            if mapped is not None:
+                mapped.close()
 
-        # 识别无符号整数并添加到常数表uintlist中
-        print("Identifying unsigned integers...")
-        self.identify_unsigned_integers()
+    def tokens(self, source=None, chunk_size=1 << 16, use_mmap=False):
+        """
+        流式词法分析函数，每识别出一个单词就生成一个带位置信息的Token，参数含义与lexemes()相同
+        内存占用只与块大小有关，与文件大小无关，调用者可以在整个文件读完之前开始处理单词。
+        """
+        for category, word, symbol_id, offset, _, line, column in self.lexemes(
+            source, chunk_size, use_mmap
+        ):
+            yield Token(category, word, symbol_id, offset, line, column)
 
-        # 识别无符号浮点数并添加到常数表ufdlist中
-        print("Identifying unsigned floats...")
-        self.identify_unsigned_floats()
+    def tokenize(self, source=None, use_mmap=False):
+        """
+        生成紧凑单词缓冲区TokenBuffer的函数，缓冲区只保存种别、偏移、长度和符号表id，单词的值通过源程序切片取得
+        source为None时读入整个输入文件(use_mmap为True时改为内存映射)，缓冲区持有源程序的引用
+        """
+        if source is None:
+            if use_mmap:
+                with open(self.file_name, "rb") as file:
+                    try:
+                        source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                    except ValueError:
+                        # 空文件不能被映射
+                        source = b""
+            else:
+                with open(self.file_name, "rb") as file:
+                    source = file.read()
+        elif isinstance(source, str):
+            source = source.encode("utf-8")
 
-        # 识别保留字并将其存入保留字表reslist中
-        print("Identifying reserved words...")
-        self.identify_reserved_words()
+        instrumentation = self.instrumentation
+        buffer = TokenBuffer(source)
+        append = buffer.append
+        with instrumentation.phase("lex"):
+            for category, _, symbol_id, offset, end, _, _ in self.lexemes(source):
+                append(category, offset, end - offset, symbol_id)
 
-        # 识别算术运算符、逻辑运算符和关系运算符
-        print("Identifying operators...")
-        self.identify_operators()
+        if instrumentation.enabled:
+            # 各种别的单词数在扫描结束后从数组中统计，不增加扫描循环的开销
+            instrumentation.count("tokens", len(buffer))
+            instrumentation.count(
+                "tokens.ERROR", buffer.categories.count(TokenBuffer.ERROR)
+            )
+            for member in self.word_categories:
+                instrumentation.count(
+                    f"tokens.{member.name}", buffer.categories.count(member.value)
+                )
+            instrumentation.count("symbols.idlist", len(self.idlist))
+            instrumentation.count("symbols.uintlist", len(self.uintlist))
+            instrumentation.count("symbols.ufdlist", len(self.ufdlist))
+        return buffer
 
-        # 识别分隔符
-        print("Identifying delimiters...")
-        self.identify_delimiters()
+    def scan(self):
+        """
+        单遍扫描函数，从左到右只扫描一遍源程序，边识别单词边判断种别，并在同一遍中填写idlist、uintlist、ufdlist等各表
+        返回结果与analyze()相同，其中单词二元式为TokenBuffer，扫描时间与源程序长度成线性关系
+        """
+        self.lexical_tuples = self.tokenize(self._data)
+        return (self.lexical_tuples, *self.collect_tables())
 
-        # 调用 generate_lexical_tuples 函数
-        print("Generating lexical tuples...")
-        self.generate_lexical_tuples()
+    def collect_tables(self):
+        """
+        扫描结束后整理各表的函数，返回idlist、uintlist、ufdlist以及识别出的保留字、运算符和分隔符
+        tokens()流式扫描完毕后也可以调用，取得与analyze()相同的各表
+        """
+        self.identified_identifiers = self.idlist.to_list()
+        self.identified_unsigned_integers = self.uintlist.to_list()
+        self.identified_unsigned_floats = self.ufdlist.to_list()
 
-        print("Lexical analysis completed.")
+        # 保留字、运算符和分隔符按各自表中的顺序输出
+        self.identified_reserved_words = [
+            word for word in self.reserved_words if word in self.seen_reserved_words
+        ]
+        self.identified_operators = [
+            operator for operator in self.operators if operator in self.seen_symbols
+        ]
+        self.identified_delimiters = [
+            delimiter for delimiter in self.delimiters if delimiter in self.seen_symbols
+        ]
 
         return (
-            self.lexical_tuples,
             self.identified_identifiers,
             self.identified_unsigned_integers,
             self.identified_unsigned_floats,
@@ -244,3 +434,18 @@ class LexicalAnalyzer:
             self.identified_operators,
             self.identified_delimiters,
         )
+
+    def analyze(self):
+        """
+        主函数，用于调用其他函数完成词法分析器的功能
+        各识别步骤合并在scan()的单遍扫描中完成，原先的identify_*函数仍然保留，可单独调用
+        """
+        # 处理错误，识别非法字符，出错信息保存在illegal_characters中，非法字符仍作为ERROR单词输出
+        if self.validate_characters:
+            with self.instrumentation.phase("validate"):
+                self.handle_illegal_characters()
+            self.instrumentation.count("illegal_characters", len(self.illegal_characters))
+
+        # 单遍扫描源程序，同时识别各类单词并填写idlist、uintlist、ufdlist
+        with self.instrumentation.phase("analyze"):
+            return self.scan()
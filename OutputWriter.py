@@ -0,0 +1,348 @@
+import csv
+import json
+import struct
+import sys
+from abc import ABC, abstractmethod
+from array import array
+
+from tabulate import tabulate
+
+from Token import Token
+
+
+class OutputWriter(ABC):
+    """
+    词法分析结果的输出基类，按单词种别表、单词流、符号表的顺序逐步写入已打开的文件
+    write_tokens()接收Token的可迭代对象(TokenBuffer或tokens()生成器)，边读取边写入，不在内存中拼接整个输出；
+    多文件分析时每个文件调用一次write_tokens()，file_name为该文件的名字。
+    子类必须实现write_tokens()和write_tables()，write_categories()和close()默认什么也不写。
+    """
+
+    binary = False
+
+    def __init__(self, file, categories):
+        self.file = file
+        self.categories = categories
+        self.category_names = {member.value: member.name for member in categories}
+
+    def category_name(self, category):
+        return "ERROR" if category is None else self.category_names[category]
+
+    def write_categories(self):
+        pass
+
+    @abstractmethod
+    def write_tokens(self, tokens, file_name=None):
+        pass
+
+    @abstractmethod
+    def write_tables(self, idlist, uintlist, ufdlist, reslist, op_list, delimiters_list):
+        pass
+
+    def close(self):
+        pass
+
+
+class TextWriter(OutputWriter):
+    """
+    原先output.txt的文本格式
+    """
+
+    def write_categories(self):
+        self.file.write("Lexical Categories:\n")
+        self.file.write(
+            "\n".join(f"{member.name}: {member.value}" for member in self.categories)
+            + "\n\n"
+        )
+
+    def write_tokens(self, tokens, file_name=None):
+        self.file.write(
+            "Lexical Tuples:\n" if file_name is None else f"Lexical Tuples ({file_name}):\n"
+        )
+        self.file.writelines(
+            "ERROR()\n"
+            if token.category is None
+            else f"({self.category_names[token.category]}, {token.value})\n"
+            for token in tokens
+        )
+        self.file.write("\n")
+
+    def write_tables(self, idlist, uintlist, ufdlist, reslist, op_list, delimiters_list):
+        file = self.file
+        file.write("Identifiers:\n")
+        file.write(tabulate([[id['name'], id['type'], id['storage_length']] for id in idlist], tablefmt='plain', headers=["Name", "Type", "Storage Length"]) + "\n\n")
+
+        file.write("Unsigned Integers:\n")
+        file.write(tabulate([[uint['value'], uint['type'], uint['storage_length']] for uint in uintlist], tablefmt='plain', headers=["Value", "Type", "Storage Length"], numalign="left", stralign="left") + "\n\n")
+
+        file.write("Unsigned Floats:\n")
+        file.write("Value\tType\tStorage Length\n")
+        file.write("\n".join(f"{float(ufd['value']):.4f}\t\t" for ufd in ufdlist) + "\n\n")
+
+        file.write("Reserved Words: " + ", ".join(reslist) + "\n\n")
+        file.write("Operators: " + ", ".join(op_list) + "\n\n")
+        file.write("Delimiters: " + ", ".join(delimiters_list) + "\n\n")
+
+
+class JsonLinesWriter(OutputWriter):
+    """
+    JSON Lines格式，每行一个JSON对象，record字段为记录类型：
+    category(单词种别)、token(单词，含符号表id和位置)、idlist/uintlist/ufdlist(符号表项)、reslist/operators/delimiters(识别出的单词)
+    """
+
+    def write_record(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def write_categories(self):
+        for member in self.categories:
+            self.write_record({"record": "category", "name": member.name, "value": member.value})
+
+    def write_tokens(self, tokens, file_name=None):
+        dumps = json.dumps
+        self.file.writelines(
+            dumps(
+                {
+                    "record": "token",
+                    "file": file_name,
+                    "category": self.category_name(token.category),
+                    "value": token.value,
+                    "symbol": token.symbol,
+                    "offset": token.offset,
+                    "line": token.line,
+                    "column": token.column,
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+            for token in tokens
+        )
+
+    def write_tables(self, idlist, uintlist, ufdlist, reslist, op_list, delimiters_list):
+        for name, table in (("idlist", idlist), ("uintlist", uintlist), ("ufdlist", ufdlist)):
+            for entry in table:
+                self.write_record({"record": name, **entry})
+        for name, words in (("reslist", reslist), ("operators", op_list), ("delimiters", delimiters_list)):
+            for word in words:
+                self.write_record({"record": name, "value": word})
+
+
+class CsvWriter(OutputWriter):
+    """
+    CSV格式，所有记录共用一个表头，record列为记录类型(与JSON Lines相同)，不适用的列留空
+    符号表项的value列为名字或数值，symbol列为其在表中的序号
+    """
+
+    fields = ["record", "file", "category", "value", "symbol", "offset", "line", "column"]
+
+    def __init__(self, file, categories):
+        super().__init__(file, categories)
+        self.writer = csv.writer(file, lineterminator="\n")
+        self.writer.writerow(self.fields)
+
+    def write_categories(self):
+        for member in self.categories:
+            self.writer.writerow(["category", "", member.name, member.value, "", "", "", ""])
+
+    def write_tokens(self, tokens, file_name=None):
+        self.writer.writerows(
+            [
+                "token",
+                file_name or "",
+                self.category_name(token.category),
+                token.value,
+                "" if token.symbol is None else token.symbol,
+                token.offset,
+                token.line,
+                token.column,
+            ]
+            for token in tokens
+        )
+
+    def write_tables(self, idlist, uintlist, ufdlist, reslist, op_list, delimiters_list):
+        for name, table in (("idlist", idlist), ("uintlist", uintlist), ("ufdlist", ufdlist)):
+            key = "name" if name == "idlist" else "value"
+            self.writer.writerows(
+                [name, "", "", entry[key], index, "", "", ""]
+                for index, entry in enumerate(table)
+            )
+        for name, words in (("reslist", reslist), ("operators", op_list), ("delimiters", delimiters_list)):
+            self.writer.writerows([name, "", "", word, "", "", "", ""] for word in words)
+
+
+class BinaryWriter(OutputWriter):
+    """
+    紧凑的二进制列存格式，所有整数均为小端序：
+    文件头为MAGIC和2字节版本号，之后是一串以1字节标记开头的记录，字符串为4字节长度加UTF-8内容
+      C: 单词种别表，4字节个数n，之后n个(1字节种别值, 字符串名字)
+      F: 一个源文件的单词流开始，字符串为文件名(单文件时为空串)
+      T: 一块单词，4字节个数n，之后依次为n个1字节种别(0为非法单词)和n个4字节的符号表id(-1为无)、首字节偏移、行号、列号、值长度，最后是所有值拼接的UTF-8内容
+      S: 一张表，字符串为表名(idlist、uintlist、ufdlist、reslist、operators、delimiters)，4字节个数n，之后n个4字节长度和拼接的UTF-8内容
+      E: 文件结束
+    单词按block_size个一块分块写入，写入时只需缓存一块。
+    """
+
+    MAGIC = b"LEXB"
+    VERSION = 1
+    binary = True
+
+    def __init__(self, file, categories, block_size=4096):
+        super().__init__(file, categories)
+        self.block_size = block_size
+        file.write(self.MAGIC + struct.pack("<H", self.VERSION))
+
+    def write_string(self, text):
+        data = text.encode("utf-8")
+        self.file.write(struct.pack("<I", len(data)) + data)
+
+    @staticmethod
+    def column(typecode, values):
+        column = array(typecode, values)
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column.tobytes()
+
+    def write_strings(self, strings):
+        data = [text.encode("utf-8") for text in strings]
+        self.file.write(struct.pack("<I", len(data)))
+        self.file.write(self.column("i", map(len, data)))
+        self.file.write(b"".join(data))
+
+    def write_categories(self):
+        members = list(self.categories)
+        self.file.write(b"C" + struct.pack("<I", len(members)))
+        for member in members:
+            self.file.write(struct.pack("<B", member.value))
+            self.write_string(member.name)
+
+    def write_block(self, block):
+        column = self.column
+        values = [token.value.encode("utf-8") for token in block]
+        self.file.write(b"T" + struct.pack("<I", len(block)))
+        self.file.write(column("b", (token.category or 0 for token in block)))
+        self.file.write(
+            column("i", (-1 if token.symbol is None else token.symbol for token in block))
+        )
+        self.file.write(column("i", (token.offset for token in block)))
+        self.file.write(column("i", (token.line for token in block)))
+        self.file.write(column("i", (token.column for token in block)))
+        self.file.write(column("i", map(len, values)))
+        self.file.write(b"".join(values))
+
+    def write_tokens(self, tokens, file_name=None):
+        self.file.write(b"F")
+        self.write_string(file_name or "")
+        block = []
+        for token in tokens:
+            block.append(token)
+            if len(block) == self.block_size:
+                self.write_block(block)
+                block = []
+        if block:
+            self.write_block(block)
+
+    def write_tables(self, idlist, uintlist, ufdlist, reslist, op_list, delimiters_list):
+        for name, strings in (
+            ("idlist", (entry["name"] for entry in idlist)),
+            ("uintlist", (entry["value"] for entry in uintlist)),
+            ("ufdlist", (entry["value"] for entry in ufdlist)),
+            ("reslist", reslist),
+            ("operators", op_list),
+            ("delimiters", delimiters_list),
+        ):
+            self.file.write(b"S")
+            self.write_string(name)
+            self.write_strings(strings)
+
+    def close(self):
+        self.file.write(b"E")
+
+
+def read_binary(file):
+    """
+    读取BinaryWriter写出的文件，按顺序生成记录：
+    ("categories", {种别值: 名字})、("file", 文件名)、("tokens", [Token, ...])、("table", 表名, [字符串, ...])
+    """
+
+    def read(size):
+        data = file.read(size)
+        if len(data) != size:
+            raise ValueError("Truncated binary lexer output.")
+        return data
+
+    def read_int():
+        return struct.unpack("<I", read(4))[0]
+
+    def read_string():
+        return read(read_int()).decode("utf-8")
+
+    def read_column(typecode, n):
+        column = array(typecode)
+        column.frombytes(read(column.itemsize * n))
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column
+
+    def read_strings(lengths):
+        data = read(sum(lengths))
+        strings = []
+        position = 0
+        for length in lengths:
+            strings.append(data[position : position + length].decode("utf-8"))
+            position += length
+        return strings
+
+    if read(4) != BinaryWriter.MAGIC:
+        raise ValueError("Not a binary lexer output file.")
+    version = struct.unpack("<H", read(2))[0]
+    if version != BinaryWriter.VERSION:
+        raise ValueError(f"Unsupported binary lexer output version {version}.")
+
+    while True:
+        tag = read(1)
+        if tag == b"E":
+            return
+        if tag == b"C":
+            categories = {}
+            for _ in range(read_int()):
+                value = read(1)[0]
+                categories[value] = read_string()
+            yield ("categories", categories)
+        elif tag == b"F":
+            yield ("file", read_string() or None)
+        elif tag == b"T":
+            n = read_int()
+            categories = read_column("b", n)
+            symbols = read_column("i", n)
+            offsets = read_column("i", n)
+            lines = read_column("i", n)
+            columns = read_column("i", n)
+            values = read_strings(read_column("i", n))
+            yield (
+                "tokens",
+                [
+                    Token(
+                        category or None,
+                        value,
+                        None if symbol == -1 else symbol,
+                        offset,
+                        line,
+                        column,
+                    )
+                    for category, symbol, offset, line, column, value in zip(
+                        categories, symbols, offsets, lines, columns, values
+                    )
+                ],
+            )
+        elif tag == b"S":
+            name = read_string()
+            yield ("table", name, read_strings(read_column("i", read_int())))
+        else:
+            raise ValueError(f"Unknown record {tag!r} in binary lexer output.")
+
+
+WRITERS = {
+    "text": TextWriter,
+    "jsonl": JsonLinesWriter,
+    "csv": CsvWriter,
+    "binary": BinaryWriter,
+}
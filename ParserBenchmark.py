@@ -0,0 +1,143 @@
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+
+from Grammar import Grammar
+from ParserGenerator import ParserGenerator
+from PredictiveParser import PredictiveParser
+
+
+def minimal_costs(grammar):
+    """
+    计算每个非终结符能推出的最短终结符串的长度，用于在生成句子时尽快结束推导
+    """
+    infinity = float("inf")
+    costs = [infinity] * grammar.nonterminal_count
+
+    def cost(symbol):
+        return 1 if grammar.is_terminal(symbol) else costs[symbol]
+
+    changed = True
+    while changed:
+        changed = False
+        for left, right in zip(grammar.lefts, grammar.rights):
+            total = sum(cost(symbol) for symbol in right)
+            if total < costs[left]:
+                costs[left] = total
+                changed = True
+    return costs
+
+
+def generate_sentence(grammar, length, seed=0, max_depth=32):
+    """
+    按最左推导随机生成一个约length个终结符的句子，返回终结符编号(不含结束符)的列表
+    长度未到且嵌套深度未超过max_depth时偏向选择不是最短的候选式使句子继续增长，否则选择能最快结束的候选式；
+    以本非终结符结尾的候选式(如A→+TA)展开时末尾的非终结符不增加深度，句子可以沿尾递归一直增长
+    """
+    rng = random.Random(seed)
+    costs = minimal_costs(grammar)
+
+    def production_cost(production):
+        return sum(
+            1 if grammar.is_terminal(symbol) else costs[symbol]
+            for symbol in grammar.rights[production]
+        )
+
+    shortest = [
+        min(alternatives, key=production_cost) if alternatives else None
+        for alternatives in grammar.alternatives
+    ]
+    growing = [
+        [production for production in alternatives if production != shortest[nt]] or alternatives
+        for nt, alternatives in enumerate(grammar.alternatives)
+    ]
+    sentence = []
+    stack = [(grammar.start, 0)]
+    while stack:
+        symbol, depth = stack.pop()
+        if grammar.is_terminal(symbol):
+            sentence.append(symbol - grammar.nonterminal_count)
+            continue
+        if len(sentence) < length and depth < max_depth:
+            if rng.random() < 0.5:
+                production = rng.choice(grammar.alternatives[symbol])
+            else:
+                production = rng.choice(growing[symbol])
+        else:
+            production = shortest[symbol]
+        right = grammar.rights[production]
+        for index in range(len(right) - 1, -1, -1):
+            child = right[index]
+            tail = index == len(right) - 1 and child == symbol
+            stack.append((child, depth if tail else depth + 1))
+    return sentence
+
+
+def load_generated(grammar, directory):
+    """
+    为grammar生成递归下降分析器模块并导入
+    """
+    file_name = os.path.join(directory, "generated_parser.py")
+    ParserGenerator(grammar).write(file_name)
+    spec = importlib.util.spec_from_file_location("generated_parser", file_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def best_time(function, codes, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(codes)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(grammar, length, seed=0, repeat=3):
+    """
+    在同一个句子上分别测量表驱动分析器和生成的递归下降分析器，返回两者的时间和每秒单词数
+    """
+    parser = PredictiveParser(grammar)
+    codes = array("i", generate_sentence(grammar, length, seed))
+    codes.append(parser.end)
+    with tempfile.TemporaryDirectory() as temp:
+        generated = load_generated(grammar, temp)
+    results = {}
+    for name, function in (("table", parser.recognize), ("generated", generated.parse)):
+        seconds = best_time(function, codes, repeat)
+        results[name] = {
+            "tokens": len(codes),
+            "seconds": seconds,
+            "tokens_per_second": len(codes) / seconds if seconds else 0.0,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="表驱动分析器与生成的递归下降分析器的性能比较")
+    parser.add_argument("grammar", nargs="?", default="grammar.txt", help="文法文件")
+    parser.add_argument(
+        "--split-words", action="store_true", help="产生式右部的符号以空白分隔"
+    )
+    parser.add_argument("--tokens", type=int, default=1000000, help="句子的单词数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=3, help="每种分析器的重复次数，取最短时间")
+    args = parser.parse_args()
+
+    # 括号嵌套较深时生成的分析器递归较深
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    grammar = Grammar.from_file(args.grammar, args.split_words).analyze()
+    if grammar.conflicts:
+        sys.exit(f"Error: grammar is not LL(1), {len(grammar.conflicts)} table conflicts.")
+    results = run_benchmark(grammar, args.tokens, args.seed, args.repeat)
+    for name, result in results.items():
+        print(
+            f"{name:<10}{result['tokens']:>10} tokens  {result['seconds']:8.3f} s  "
+            f"{result['tokens_per_second']:>12.0f} tokens/s"
+        )
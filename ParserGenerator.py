@@ -0,0 +1,165 @@
+class ParserGenerator:
+    """
+    递归下降分析器的代码生成器，由已分析的Grammar生成一个独立的Python模块，每个非终结符对应一个函数
+    函数按LL(1)分析表中该非终结符一行的内容直接比较向前看终结符选择候选式，不查表、不使用显式栈；
+    以本非终结符结尾的候选式(如A→+TA)是尾递归，生成的函数用while循环代替这次调用，长表达式不会使递归加深。
+    生成的模块只依赖标准库，输入与PredictiveParser.encode()的结果相同(终结符编号的序列，以结束符#结尾)，
+    模块中的TERMINALS为终结符名到编号的映射，encode()可以把终结符名的序列编码为输入，parse()接受时返回True，出错时抛出模块中的ParseError。
+    """
+
+    def __init__(self, grammar):
+        if grammar.table is None:
+            grammar.analyze()
+        self.grammar = grammar
+        self.width = grammar.terminal_count + 1
+        self.function_names = []
+        used = set()
+        for nt in range(grammar.nonterminal_count):
+            name = grammar.names[nt]
+            function_name = f"parse_{name}" if name.isidentifier() else f"parse_nonterminal_{nt}"
+            while function_name in used:
+                function_name += "_"
+            used.add(function_name)
+            self.function_names.append(function_name)
+
+    def terminal_code(self, terminal):
+        return terminal - self.grammar.nonterminal_count
+
+    def lookaheads(self, nt):
+        """
+        返回{产生式编号: [终结符编号, ...]}，按产生式编号排列
+        """
+        row = self.grammar.table[nt * self.width : (nt + 1) * self.width]
+        lookaheads = {}
+        for code, production in enumerate(row):
+            if production >= 0:
+                lookaheads.setdefault(production, []).append(code)
+        return dict(sorted(lookaheads.items()))
+
+    def is_tail(self, nt, production):
+        """
+        候选式是否以本非终结符结尾且前面还有其他符号(A→A这样的左递归不算)
+        """
+        right = self.grammar.rights[production]
+        return len(right) > 1 and right[-1] == nt
+
+    def condition(self, codes):
+        if len(codes) == 1:
+            return f"lookahead == {codes[0]}"
+        return f"lookahead in {set(codes)!r}"
+
+    def body(self, nt, production, codes, indent, loop):
+        """
+        生成一个候选式的语句，loop为True时右部末尾对本非终结符的调用改为continue
+        右部以终结符开头且分支条件就是这个终结符时，该终结符已经比较过，直接跳过
+        """
+        grammar = self.grammar
+        right = grammar.rights[production]
+        tail = loop and self.is_tail(nt, production)
+        symbols = right[:-1] if tail else right
+        lines = []
+        for index, symbol in enumerate(symbols):
+            if index == 0 and grammar.is_terminal(symbol) and codes == [self.terminal_code(symbol)]:
+                lines.append(f"{indent}position += 1")
+            elif grammar.is_terminal(symbol):
+                code = self.terminal_code(symbol)
+                lines.append(f"{indent}if codes[position] != {code}:")
+                lines.append(f"{indent}    raise error(codes, position, ({code},))")
+                lines.append(f"{indent}position += 1")
+            else:
+                lines.append(f"{indent}position = {self.function_names[symbol]}(codes, position)")
+        if tail:
+            lines.append(f"{indent}continue")
+        else:
+            lines.append(f"{indent}return position")
+        return lines
+
+    def function(self, nt):
+        grammar = self.grammar
+        lookaheads = self.lookaheads(nt)
+        loop = any(self.is_tail(nt, production) for production in lookaheads)
+        expected = tuple(sorted(code for codes in lookaheads.values() for code in codes))
+        indent = "        " if loop else "    "
+        lines = [
+            f"def {self.function_names[nt]}(codes, position):",
+            f"    # {grammar.names[nt]}",
+        ]
+        if loop:
+            lines.append("    while True:")
+        lines.append(f"{indent}lookahead = codes[position]")
+        for production, codes in lookaheads.items():
+            lines.append(f"{indent}# {grammar.production_string(production)}")
+            lines.append(f"{indent}if {self.condition(codes)}:")
+            lines.extend(self.body(nt, production, codes, indent + "    ", loop))
+        lines.append(f"{indent}raise error(codes, position, {expected!r})")
+        return lines
+
+    def generate(self):
+        """
+        返回生成的模块源代码
+        """
+        grammar = self.grammar
+        terminals = {
+            grammar.names[terminal]: self.terminal_code(terminal)
+            for terminal in range(grammar.nonterminal_count, len(grammar.names))
+        }
+        end = self.terminal_code(grammar.end)
+        lines = [
+            "# 由ParserGenerator根据LL(1)文法自动生成的递归下降分析器，请勿手工修改",
+            "#",
+            *(f"# {grammar.production_string(production)}" for production in range(len(grammar.lefts))),
+            "",
+            f"TERMINALS = {terminals!r}",
+            f"NAMES = {dict((code, name) for name, code in terminals.items())!r}",
+            f"END = {end}",
+            f"UNKNOWN = {grammar.terminal_count}",
+            "",
+            "",
+            "class ParseError(Exception):",
+            "    def __init__(self, position, found, expected):",
+            "        self.position = position",
+            "        self.found = found",
+            "        self.expected = expected",
+            "        super().__init__(",
+            '            f"Syntax error at token {position}: found {found!r}, expected one of {sorted(expected)}"',
+            "        )",
+            "",
+            "",
+            "def error(codes, position, expected):",
+            '    found = NAMES.get(codes[position], "?")',
+            "    return ParseError(position, found, {NAMES[code] for code in expected})",
+            "",
+            "",
+            "def encode(symbols):",
+            '    """',
+            "    将终结符名的序列(如字符串\"i+i*i\")编码为parse()的输入，不认识的符号编码为UNKNOWN",
+            '    """',
+            "    codes = [TERMINALS.get(symbol, UNKNOWN) for symbol in symbols]",
+            "    codes.append(END)",
+            "    return codes",
+            "",
+            "",
+        ]
+        for nt in range(grammar.nonterminal_count):
+            lines.extend(self.function(nt))
+            lines.extend(["", ""])
+        lines.extend(
+            [
+                "def parse(codes):",
+                '    """',
+                "    分析以END结尾的终结符编号序列，接受时返回True，出错时抛出ParseError",
+                '    """',
+                f"    position = {self.function_names[grammar.start]}(codes, 0)",
+                "    if codes[position] != END:",
+                "        raise error(codes, position, (END,))",
+                "    if position != len(codes) - 1:",
+                "        raise ParseError(position + 1, NAMES.get(codes[position + 1], \"?\"), set())",
+                "    return True",
+                "",
+            ]
+        )
+        return "\n".join(lines)
+
+    def write(self, file_name):
+        with open(file_name, "w", encoding="utf-8") as f:
+            f.write(self.generate())
@@ -0,0 +1,353 @@
+import argparse
+import hashlib
+import marshal
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from CQuadrupleGenerator import CQuadrupleGenerator, CSyntaxError
+from Grammar import Grammar
+from GrammarCache import GrammarCache
+from main import WordCategory, delimiters, legal_characters, new_analyzer, operators, reslist
+from QuadrupleOptimizer import QuadrupleOptimizer
+from QuadrupleProducer import QuadrupleWriter, base_address
+from SparseTable import SparseTable
+from TokenBuffer import TokenBuffer
+
+# 各阶段输出格式或算法改变时增加版本号，旧的缓存项随之失效
+LEX_VERSION = 1
+QUAD_VERSION = 1
+
+# 默认的文法文件与本模块在同一目录下，不依赖当前工作目录
+default_grammar_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+
+def content_digest(*parts):
+    """
+    对若干个值的repr计算SHA-256，用作阶段配置的散列
+    """
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """
+    按内容寻址的阶段缓存，每个缓存项是directory下以键命名的一个文件，键为"阶段名+输入散列+配置散列"的SHA-256
+    输入或配置(保留字表、运算符表、文法、生成选项等)任何一项改变，键随之改变，不需要显式地使旧缓存失效。
+    命中时更新文件的修改时间，第一次访问时以及写入后缓存总大小超过max_bytes时按修改时间从旧到新删除(LRU)到max_bytes的90%，
+    留出余量使每次删除后能再写入一批缓存项才需要再次扫描目录；多个进程共用一个目录也是安全的。
+    stats记录每个阶段的命中和未命中次数。
+    """
+
+    SUFFIX = ".stage"
+
+    def __init__(self, directory="__pipelinecache__", max_bytes=256 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {}
+        self.evictions = 0
+        self.total_bytes = None
+
+    def key(self, stage, input_digest, config_digest):
+        return hashlib.sha256(f"{stage}\0{input_digest}\0{config_digest}".encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def record(self, stage, hit):
+        counts = self.stats.setdefault(stage, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+    def check_size(self):
+        """
+        第一次访问缓存时统计目录的总大小，超过max_bytes时立即淘汰，只读取缓存的运行也受大小上限约束
+        """
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for _, size, _ in self.entries())
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def get(self, stage, key):
+        """
+        返回缓存的bytes，未命中时返回None
+        """
+        self.check_size()
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.record(stage, False)
+            return None
+        self.record(stage, True)
+        return data
+
+    def put(self, key, data):
+        """
+        写入一个缓存项，先写临时文件再改名；缓存目录不可写时只是不缓存
+        """
+        path = self.path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self.check_size()
+            try:
+                self.total_bytes -= os.path.getsize(path)
+            except OSError:
+                pass
+            fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp, path)
+            except BaseException:
+                os.unlink(temp)
+                raise
+        except OSError:
+            return
+        self.total_bytes += len(data)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """
+        返回[(修改时间, 大小, 路径), ...]
+        """
+        entries = []
+        try:
+            scanner = os.scandir(self.directory)
+        except OSError:
+            return entries
+        with scanner:
+            for entry in scanner:
+                if entry.name.endswith(self.SUFFIX):
+                    try:
+                        status = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((status.st_mtime, status.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """
+        按修改时间从旧到新删除缓存项，直到总大小不超过max_bytes的90%
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        limit = self.max_bytes * 9 // 10
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self.total_bytes = total
+
+    def report(self):
+        return {
+            "stages": self.stats,
+            "evictions": self.evictions,
+            "bytes": self.total_bytes
+            if self.total_bytes is not None
+            else sum(size for _, size, _ in self.entries()),
+        }
+
+
+class Pipeline:
+    """
+    词法分析 → 四元式生成的流水线，各阶段的结果都保存在StageCache中
+    C源程序的四元式由递归下降的CQuadrupleGenerator生成，LL(1)文法不参与四元式生成；ll1阶段只在需要分析表时由grammar()单独执行。
+    ll1阶段：文法文件的内容与split_words为键，缓存GrammarCache格式的已分析文法；
+    lex阶段：源文件内容与词法分析器配置(保留字表、运算符表、分隔符表、合法字符、种别)为键，缓存TokenBuffer的四个数组；
+    quads阶段：源文件内容与词法分析器配置、四元式生成选项为键，缓存四元式列表。
+    四元式命中时不再做词法分析，只有内容改变了的文件才重新分析和生成。
+    """
+
+    def __init__(
+        self,
+        cache,
+        grammar_file=default_grammar_file,
+        split_words=False,
+        optimize=False,
+        reuse_temps=False,
+        instrumentation=None,
+    ):
+        self.cache = cache
+        self.grammar_file = grammar_file
+        self.split_words = split_words
+        self.optimize = optimize
+        self.reuse_temps = reuse_temps
+        self.instrumentation = instrumentation
+        # grammar()得到的文法，再次调用时直接返回，不再访问缓存
+        self.analyzed = None
+        self.lex_config = content_digest(
+            LEX_VERSION,
+            reslist,
+            operators,
+            delimiters,
+            legal_characters,
+            [(category.name, category.value) for category in WordCategory],
+        )
+        self.quad_config = content_digest(
+            QUAD_VERSION, self.lex_config, optimize, reuse_temps, base_address
+        )
+
+    def grammar(self):
+        """
+        ll1阶段，返回已分析的Grammar；同一个Pipeline只访问一次缓存
+        """
+        if self.analyzed is not None:
+            return self.analyzed
+        with open(self.grammar_file, "rb") as f:
+            content = f.read()
+        grammar_cache = GrammarCache()
+        digest = grammar_cache.digest(content, self.split_words)
+        key = self.cache.key("ll1", digest.hex(), "")
+        data = self.cache.get("ll1", key)
+        if data is not None:
+            try:
+                self.analyzed = grammar_cache.decode(memoryview(data), digest)
+                return self.analyzed
+            except ValueError:
+                pass
+        grammar = Grammar.parse(content.decode("utf-8").splitlines(), self.split_words).analyze()
+        self.cache.put(key, grammar_cache.encode(digest, grammar))
+        self.analyzed = grammar
+        return grammar
+
+    def tokens(self, file_name, source, digest):
+        """
+        lex阶段，返回源程序的TokenBuffer
+        缓存格式(小端序)：4字节单词数n，之后为种别、偏移、长度、符号表id四个n项的4字节整数数组
+        """
+        key = self.cache.key("lex", digest, self.lex_config)
+        data = self.cache.get("lex", key)
+        if data is not None:
+            count = struct.unpack_from("<I", data)[0]
+            if len(data) == 4 + 16 * count:
+                buffer = TokenBuffer(source)
+                for index, column in enumerate(
+                    (buffer.categories, buffer.offsets, buffer.lengths, buffer.symbols)
+                ):
+                    column.frombytes(data[4 + 4 * count * index : 4 + 4 * count * (index + 1)])
+                    if sys.byteorder == "big":
+                        column.byteswap()
+                return buffer
+        buffer = new_analyzer(file_name, self.instrumentation).tokenize(source)
+        parts = [struct.pack("<I", len(buffer))]
+        for column in (buffer.categories, buffer.offsets, buffer.lengths, buffer.symbols):
+            column = array("i", column)
+            if sys.byteorder == "big":
+                column.byteswap()
+            parts.append(column.tobytes())
+        self.cache.put(key, b"".join(parts))
+        return buffer
+
+    def quadruples(self, file_name):
+        """
+        quads阶段，返回源文件的四元式列表和跳过的非法单词列表
+        """
+        with open(file_name, "rb") as f:
+            source = f.read()
+        digest = hashlib.sha256(source).hexdigest()
+        key = self.cache.key("quads", digest, self.quad_config)
+        data = self.cache.get("quads", key)
+        if data is not None:
+            try:
+                return marshal.loads(data)
+            except (EOFError, ValueError, TypeError):
+                pass
+        tokens = self.tokens(file_name, source, digest)
+        generator = CQuadrupleGenerator(
+            instrumentation=self.instrumentation, reuse_temps=self.reuse_temps
+        )
+        quadruples = generator.generate(tokens)
+        if self.optimize:
+            optimizer = QuadrupleOptimizer(instrumentation=self.instrumentation)
+            quadruples = optimizer.optimize(quadruples)
+            if self.reuse_temps:
+                quadruples = optimizer.reuse_temps(quadruples)
+        errors = [(token.value, token.line, token.column) for token in generator.errors]
+        result = (quadruples, errors)
+        self.cache.put(key, marshal.dumps(result))
+        return result
+
+    def run(self, file_names):
+        """
+        依次处理各源文件，生成(文件名, 四元式列表, 非法单词列表)；语法错误的文件四元式列表为None，错误信息在非法单词列表中
+        不读入文法文件，ll1阶段由需要分析表的调用者通过grammar()执行
+        """
+        for file_name in file_names:
+            try:
+                quadruples, errors = self.quadruples(file_name)
+            except CSyntaxError as e:
+                yield file_name, None, [str(e)]
+                continue
+            yield file_name, quadruples, errors
+
+
+def parse_size(text):
+    """
+    将"64M"、"512K"、"1G"或字节数转换为字节数
+    """
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper()
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="词法分析 → 四元式的流水线，各阶段结果按内容缓存；LL(1)文法不参与四元式生成，只在给出--table时读入")
+    parser.add_argument("inputs", nargs="*", default=["test.c"], help="C源程序文件")
+    parser.add_argument("-g", "--grammar", default=default_grammar_file, help="文法文件，只用于--table")
+    parser.add_argument(
+        "--split-words", action="store_true", help="产生式右部的符号以空白分隔"
+    )
+    parser.add_argument("-O", "--optimize", action="store_true", help="优化四元式")
+    parser.add_argument("--reuse-temps", action="store_true", help="回收不再使用的临时变量名")
+    parser.add_argument("-o", "--output", help="四元式输出文件，默认为标准输出")
+    parser.add_argument("--table", help="LL(1)分析表的输出文件，给出时才执行ll1阶段")
+    parser.add_argument("--cache-dir", default="__pipelinecache__", help="阶段缓存目录")
+    parser.add_argument("--cache-size", default="256M", help="阶段缓存的大小上限，如64M")
+    parser.add_argument("--stats", action="store_true", help="报告各阶段缓存的命中与未命中次数")
+    args = parser.parse_args()
+
+    cache = StageCache(args.cache_dir, parse_size(args.cache_size))
+    pipeline = Pipeline(
+        cache, args.grammar, args.split_words, args.optimize, args.reuse_temps
+    )
+    try:
+        output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for file_name, quadruples, errors in pipeline.run(args.inputs):
+                if quadruples is None:
+                    print(f"Error: {file_name}: {errors[0]}", file=sys.stderr)
+                    continue
+                for value, line, column in errors:
+                    print(
+                        f"Error: {file_name}: illegal token {value!r} at line {line}, column {column}, skipped",
+                        file=sys.stderr,
+                    )
+                if len(args.inputs) > 1:
+                    output.write(f"# {file_name}\n")
+                write = QuadrupleWriter(output)
+                for quadruple in quadruples:
+                    write(quadruple)
+        finally:
+            if args.output:
+                output.close()
+        if args.table:
+            with open(args.table, "w", encoding="utf-8") as f:
+                SparseTable(pipeline.grammar()).dump(f)
+    except OSError as e:
+        sys.exit(f"Error: {e}")
+    if args.stats:
+        report = cache.report()
+        for stage, counts in report["stages"].items():
+            print(f"{stage:<6}{counts['hits']:>8} hits{counts['misses']:>8} misses", file=sys.stderr)
+        print(f"{report['evictions']} evictions, {report['bytes']} bytes cached", file=sys.stderr)
@@ -0,0 +1,238 @@
+from array import array
+
+from TokenBuffer import TokenBuffer
+
+
+class ParseError(Exception):
+    """
+    语法错误，position为出错单词在输入中的下标，found为该单词对应的终结符名，expected为此处可以接受的终结符名集合
+    """
+
+    def __init__(self, position, found, expected):
+        self.position = position
+        self.found = found
+        self.expected = expected
+        super().__init__(
+            f"Syntax error at token {position}: found {found!r}, expected one of {sorted(expected)}"
+        )
+
+
+class ParseNode:
+    """
+    语法树结点，symbol为文法符号名，非终结符结点的production为所用产生式的编号，终结符结点的position为对应单词的下标
+    """
+
+    __slots__ = ("symbol", "children", "production", "position")
+
+    def __init__(self, symbol, production=None, position=None):
+        self.symbol = symbol
+        self.children = []
+        self.production = production
+        self.position = position
+
+    def __repr__(self) -> str:
+        if not self.children:
+            return self.symbol
+        return f"{self.symbol}({', '.join(map(repr, self.children))})"
+
+
+class PredictiveParser:
+    """
+    表驱动的预测分析器，用显式栈按LL(1)分析表分析单词流
+    分析表在构造时编译为按"非终结符编号×终结符编号"下标的一维列表，表项直接是该产生式右部逆序后的元组，
+    栈中的非终结符预先乘以行宽存为行首下标，终结符存为-1-编号，分析循环中只有整数运算和列表下标，不拆分字符串、不查字典。
+    输入单词先编码为终结符编号的数组，category_terminals将单词种别映射为终结符名(如{1: "i"}表示标识符对应终结符i)，
+    不在其中的单词按其值查找同名终结符，都找不到的单词编码为一个不在表中的列，分析到它时报错。
+    表中有冲突时与LL1Analyzer.LL1_table一致，后面的产生式覆盖前面的，冲突记录在conflicts中。
+    """
+
+    def __init__(self, grammar, category_terminals=None):
+        if grammar.table is None:
+            grammar.analyze()
+        self.grammar = grammar
+        nonterminal_count = grammar.nonterminal_count
+        # 最后一列留给不认识的单词，整列为空
+        self.width = width = grammar.terminal_count + 1
+        self.unknown = grammar.terminal_count
+        self.end = grammar.end - nonterminal_count
+        self.terminal_ids = {
+            grammar.names[symbol]: symbol - nonterminal_count
+            for symbol in range(nonterminal_count, len(grammar.names))
+        }
+        self.category_terminals = {
+            category: self.terminal_ids.get(name, self.unknown)
+            for category, name in (category_terminals or {}).items()
+        }
+
+        def encode_symbol(symbol):
+            if grammar.is_terminal(symbol):
+                return -1 - (symbol - nonterminal_count)
+            return symbol * width
+
+        self.pushes = [
+            tuple(encode_symbol(symbol) for symbol in reversed(right))
+            for right in grammar.rights
+        ]
+        self.productions = grammar.table
+        self.table = [
+            None if production < 0 else self.pushes[production]
+            for production in grammar.table
+        ]
+        self.conflicts = [
+            (grammar.names[left], grammar.names[terminal], old, new)
+            for left, terminal, old, new in grammar.conflicts
+        ]
+        self.start = grammar.start * width
+
+    def encode(self, tokens):
+        """
+        将输入编码为终结符编号的数组并在末尾加上结束符#
+        tokens可以是TokenBuffer、Token的可迭代对象，或终结符名的可迭代对象(如字符串"i+i*i")
+        """
+        terminal_ids = self.terminal_ids
+        category_terminals = self.category_terminals
+        unknown = self.unknown
+        codes = array("i")
+        append = codes.append
+        if isinstance(tokens, TokenBuffer):
+            # 只读memoryview的切片可以直接与bytes比较和散列，按字节查表，不解码单词
+            terminal_bytes = {name.encode("utf-8"): code for name, code in terminal_ids.items()}
+            source = tokens.source
+            for category, offset, length in zip(tokens.categories, tokens.offsets, tokens.lengths):
+                code = category_terminals.get(category)
+                if code is None:
+                    code = terminal_bytes.get(source[offset : offset + length], unknown)
+                append(code)
+        else:
+            for token in tokens:
+                if isinstance(token, str):
+                    append(terminal_ids.get(token, unknown))
+                    continue
+                code = category_terminals.get(token.category)
+                if code is None:
+                    code = terminal_ids.get(token.value, unknown)
+                append(code)
+        append(self.end)
+        return codes
+
+    def terminal_name(self, code):
+        if code == self.unknown:
+            return "?"
+        return self.grammar.names[code + self.grammar.nonterminal_count]
+
+    def error(self, codes, position, top):
+        """
+        构造出错时的ParseError，top为出错时的栈顶(编码后的形式)
+        """
+        if top < 0:
+            expected = {self.terminal_name(-1 - top)}
+        else:
+            row = self.table[top : top + self.width]
+            expected = {self.terminal_name(code) for code, entry in enumerate(row) if entry is not None}
+        return ParseError(position, self.terminal_name(codes[position]), expected)
+
+    def trailing(self, codes, position):
+        """
+        结束符#匹配后检查输入是否已经读完，输入中间出现#时其后的单词为多余的输入
+        """
+        if position != len(codes) - 1:
+            raise ParseError(position + 1, self.terminal_name(codes[position + 1]), set())
+
+    def recognize(self, codes):
+        """
+        只判断是否接受，不建立语法树，出错时抛出ParseError，codes为encode()的结果
+        """
+        table = self.table
+        end = -1 - self.end
+        stack = [end, self.start]
+        pop = stack.pop
+        extend = stack.extend
+        position = 0
+        lookahead = codes[0]
+        while True:
+            top = pop()
+            if top < 0:
+                if -1 - top != lookahead:
+                    raise self.error(codes, position, top)
+                if top == end:
+                    break
+                position += 1
+                lookahead = codes[position]
+                continue
+            push = table[top + lookahead]
+            if push is None:
+                raise self.error(codes, position, top)
+            extend(push)
+        self.trailing(codes, position)
+        return True
+
+    def derive(self, codes):
+        """
+        返回最左推导所用的产生式编号序列
+        """
+        table = self.productions
+        pushes = self.pushes
+        end = -1 - self.end
+        derivation = []
+        stack = [end, self.start]
+        position = 0
+        while True:
+            top = stack.pop()
+            lookahead = codes[position]
+            if top < 0:
+                if -1 - top != lookahead:
+                    raise self.error(codes, position, top)
+                if top == end:
+                    break
+                position += 1
+                continue
+            production = table[top + lookahead]
+            if production < 0:
+                raise self.error(codes, position, top)
+            derivation.append(production)
+            stack.extend(pushes[production])
+        self.trailing(codes, position)
+        return derivation
+
+    def build_tree(self, codes):
+        """
+        建立语法树并返回根结点，ε产生式的结点没有子结点
+        """
+        grammar = self.grammar
+        names = grammar.names
+        table = self.productions
+        pushes = self.pushes
+        end = -1 - self.end
+        root = ParseNode(names[grammar.start])
+        stack = [(end, None), (self.start, root)]
+        position = 0
+        while True:
+            top, node = stack.pop()
+            lookahead = codes[position]
+            if top < 0:
+                if -1 - top != lookahead:
+                    raise self.error(codes, position, top)
+                if top == end:
+                    break
+                node.position = position
+                position += 1
+                continue
+            production = table[top + lookahead]
+            if production < 0:
+                raise self.error(codes, position, top)
+            node.production = production
+            node.children = [ParseNode(names[symbol]) for symbol in grammar.rights[production]]
+            stack.extend(zip(pushes[production], reversed(node.children)))
+        self.trailing(codes, position)
+        return root
+
+    def parse(self, tokens, tree=False, derivation=False):
+        """
+        分析输入，默认只判断是否接受并返回True；tree为True时返回语法树，derivation为True时返回最左推导的产生式编号序列
+        """
+        codes = self.encode(tokens)
+        if tree:
+            return self.build_tree(codes)
+        if derivation:
+            return self.derive(codes)
+        return self.recognize(codes)
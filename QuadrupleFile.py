@@ -0,0 +1,277 @@
+import argparse
+import ast
+import mmap
+import re
+import struct
+import sys
+from array import array
+
+from CQuadrupleGenerator import CSyntaxError, compile_source_file
+from QuadrupleOptimizer import is_jump
+from QuadrupleProducer import QuadrupleWriter, base_address
+from QuadrupleVM import OPCODES
+
+MAGIC = b"QUAD"
+VERSION = 1
+# 文件头：MAGIC、版本号、记录长度、基地址、四元式个数、常量池项数、常量池在文件中的偏移，补齐到32字节
+HEADER = struct.Struct("<4sHHiIIQ4x")
+# 定长记录：操作码、arg1、arg2、result
+RECORD = struct.Struct("<iiii")
+# 记录写出和按块读取时每块的记录数
+BLOCK_RECORDS = 1 << 16
+
+OPERATORS = {code: op for op, code in OPCODES.items()}
+JUMP_CODES = frozenset(code for op, code in OPCODES.items() if is_jump(op))
+
+# 文本格式的一行："100 : ('=', '1', '_', 'n')"，转移四元式的第四项为整数地址
+TEXT_LINE = re.compile(
+    r"(\d+) : \('([^'\\]*)', '([^'\\]*)', '([^'\\]*)', (?:'([^'\\]*)'|(-?\d+))\)"
+)
+
+
+class QuadrupleFileWriter:
+    """
+    二进制四元式文件的写入器，可以作为QuadrupleGenerator/CQuadrupleGenerator的sink，四元式依次写出，内存中只保存常量池和一块记录
+    文件格式(小端序)：
+      文件头(HEADER，32字节)；
+      四元式记录，每条16字节：操作码(与QuadrupleVM.OPCODES相同)和三个4字节操作数引用，
+      操作数引用为常量池下标，"_"为-1，转移四元式的result直接保存转移目标地址；
+      常量池：(项数+1)个4字节的字符串起始偏移，之后是拼接的UTF-8内容。变量名、临时变量名和常量都只保存一次。
+    记录个数和常量池位置在close()时回写到文件头，因此file必须是以"wb"打开的可定位文件。
+    """
+
+    def __init__(self, file, base_address=base_address):
+        self.file = file
+        self.base_address = base_address
+        self.count = 0
+        self.pool = {}
+        self.block = array("i")
+        file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, base_address, 0, 0, 0))
+
+    def intern(self, operand):
+        if operand == "_":
+            return -1
+        index = self.pool.get(operand)
+        if index is None:
+            index = self.pool[operand] = len(self.pool)
+        return index
+
+    def __call__(self, quadruple):
+        op, arg1, arg2, result = quadruple
+        code = OPCODES.get(op)
+        if code is None:
+            raise ValueError(f"Unknown quadruple operator {op!r}")
+        intern = self.intern
+        self.block.extend(
+            (code, intern(arg1), intern(arg2), result if code in JUMP_CODES else intern(result))
+        )
+        self.count += 1
+        if len(self.block) >= 4 * BLOCK_RECORDS:
+            self.flush()
+
+    def flush(self):
+        if sys.byteorder == "big":
+            self.block.byteswap()
+        self.file.write(self.block.tobytes())
+        self.block = array("i")
+
+    def close(self):
+        """
+        写出剩余的记录和常量池，回写文件头；不关闭file
+        """
+        self.flush()
+        pool_offset = self.file.tell()
+        data = [operand.encode("utf-8") for operand in self.pool]
+        offsets = array("I", [0])
+        for item in data:
+            offsets.append(offsets[-1] + len(item))
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        self.file.write(offsets.tobytes())
+        self.file.write(b"".join(data))
+        end = self.file.tell()
+        self.file.seek(0)
+        self.file.write(
+            HEADER.pack(
+                MAGIC, VERSION, RECORD.size, self.base_address, self.count, len(data), pool_offset
+            )
+        )
+        self.file.seek(end)
+
+
+class QuadrupleFile:
+    """
+    以内存映射方式打开二进制四元式文件，四元式在访问时才解码，打开文件只读入文件头，与四元式个数无关
+    支持len()、下标和切片访问以及迭代，得到的四元式与生成器输出的元组相同；常量池中的字符串第一次用到时解码并缓存
+    """
+
+    def __init__(self, file_name):
+        with open(file_name, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self.map) < HEADER.size:
+                raise ValueError("Truncated quadruple file.")
+            magic, version, record_size, self.base_address, self.count, pool_count, self.pool_offset = (
+                HEADER.unpack_from(self.map)
+            )
+            if magic != MAGIC:
+                raise ValueError("Not a quadruple file.")
+            if version != VERSION or record_size != RECORD.size:
+                raise ValueError(f"Unsupported quadruple file version {version}.")
+            self.strings_offset = self.pool_offset + 4 * (pool_count + 1)
+            if (
+                self.pool_offset != HEADER.size + RECORD.size * self.count
+                or self.strings_offset > len(self.map)
+            ):
+                raise ValueError("Truncated quadruple file.")
+        except BaseException:
+            self.map.close()
+            raise
+        self.strings = [None] * pool_count
+
+    def operand(self, index):
+        if index < 0:
+            return "_"
+        string = self.strings[index]
+        if string is None:
+            start, end = struct.unpack_from("<II", self.map, self.pool_offset + 4 * index)
+            string = self.strings[index] = self.map[
+                self.strings_offset + start : self.strings_offset + end
+            ].decode("utf-8")
+        return string
+
+    def decode(self, code, arg1, arg2, result):
+        operand = self.operand
+        if code in JUMP_CODES:
+            return OPERATORS[code], operand(arg1), operand(arg2), result
+        return OPERATORS[code], operand(arg1), operand(arg2), operand(result)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("quadruple index out of range")
+        return self.decode(*RECORD.unpack_from(self.map, HEADER.size + RECORD.size * index))
+
+    def __iter__(self):
+        decode = self.decode
+        end = HEADER.size + RECORD.size * self.count
+        step = RECORD.size * BLOCK_RECORDS
+        for start in range(HEADER.size, end, step):
+            for record in RECORD.iter_unpack(self.map[start : min(start + step, end)]):
+                yield decode(*record)
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_quadruples(file_name, quadruples, base_address=base_address):
+    """
+    将四元式序列写成二进制四元式文件，返回写出的四元式个数
+    """
+    with open(file_name, "wb") as file:
+        writer = QuadrupleFileWriter(file, base_address)
+        for quadruple in quadruples:
+            writer(quadruple)
+        writer.close()
+    return writer.count
+
+
+def read_text(lines):
+    """
+    解析QuadrupleWriter写出的"地址 : 四元式"文本，返回(基地址, 四元式列表)，空行和"#"开头的行被忽略
+    常见的行用正则表达式解析，其余的行按Python字面量解析
+    """
+    first = None
+    quadruples = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = TEXT_LINE.fullmatch(line)
+        if match:
+            address, op, arg1, arg2, result, target = match.groups()
+            quadruple = (op, arg1, arg2, result if target is None else int(target))
+        else:
+            address, _, text = line.partition(" : ")
+            try:
+                quadruple = ast.literal_eval(text)
+            except (ValueError, SyntaxError):
+                quadruple = None
+            if not (isinstance(quadruple, tuple) and len(quadruple) == 4 and address.isdigit()):
+                raise ValueError(f"Line {number}: not a quadruple: {line!r}")
+        if first is None:
+            first = int(address)
+        elif int(address) != first + len(quadruples):
+            raise ValueError(f"Line {number}: expected address {first + len(quadruples)}")
+        quadruples.append(quadruple)
+    return (base_address if first is None else first), quadruples
+
+
+def write_text(quadruples, file, base_address=base_address):
+    write = QuadrupleWriter(file, base_address)
+    for quadruple in quadruples:
+        write(quadruple)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="二进制四元式文件与文本格式的相互转换")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compile_parser = commands.add_parser("compile", help="编译源程序(.c或Python语法)，直接写成二进制四元式文件")
+    compile_parser.add_argument("input", help="源程序文件")
+    compile_parser.add_argument("-o", "--output", required=True, help="二进制四元式文件")
+    encode = commands.add_parser("encode", help="将文本格式的四元式转换为二进制四元式文件")
+    encode.add_argument("input", help="文本格式的四元式文件")
+    encode.add_argument("-o", "--output", required=True, help="二进制四元式文件")
+    decode = commands.add_parser("decode", help="将二进制四元式文件转换为文本格式")
+    decode.add_argument("input", help="二进制四元式文件")
+    decode.add_argument("-o", "--output", help="文本输出文件，默认为标准输出")
+    info = commands.add_parser("info", help="显示二进制四元式文件的基地址、四元式个数和常量池大小")
+    info.add_argument("input", help="二进制四元式文件")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "compile":
+            with open(args.output, "wb") as file:
+                writer = QuadrupleFileWriter(file)
+                generator = compile_source_file(args.input, writer)
+                writer.close()
+            for token in getattr(generator, "errors", ()):
+                print(
+                    f"Error: {args.input}: illegal token {token.value!r} at line {token.line}, "
+                    f"column {token.column}, skipped",
+                    file=sys.stderr,
+                )
+            print(f"{writer.count} quadruples, {len(writer.pool)} pooled operands", file=sys.stderr)
+        elif args.command == "encode":
+            with open(args.input, "r", encoding="utf-8") as f:
+                first, quadruples = read_text(f)
+            write_quadruples(args.output, quadruples, first)
+        elif args.command == "decode":
+            output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+            try:
+                with QuadrupleFile(args.input) as quadruples:
+                    write_text(quadruples, output, quadruples.base_address)
+            finally:
+                if args.output:
+                    output.close()
+        else:
+            with QuadrupleFile(args.input) as quadruples:
+                print(f"base address {quadruples.base_address}")
+                print(f"{len(quadruples)} quadruples")
+                print(f"{len(quadruples.strings)} pooled operands")
+    except CSyntaxError as e:
+        sys.exit(f"Error: {args.input}: {e}")
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error: {e}")
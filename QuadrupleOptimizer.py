@@ -0,0 +1,506 @@
+import argparse
+import heapq
+import itertools
+import re
+import sys
+
+from Instrumentation import NULL_INSTRUMENTATION
+from CQuadrupleGenerator import compile_source_file
+from QuadrupleProducer import QuadrupleWriter, base_address
+
+# 条件转移取反，用于把"条件成立转到下下条、否则无条件转移"合并为一条
+INVERSE_JUMPS = {
+    "j>": "j<=",
+    "j<=": "j>",
+    "j<": "j>=",
+    "j>=": "j<",
+    "j==": "j!=",
+    "j!=": "j==",
+    "jnz": "jz",
+    "jz": "jnz",
+}
+
+ARITHMETIC = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a / b,
+}
+
+COMPARISONS = {
+    "j>": lambda a, b: a > b,
+    "j<": lambda a, b: a < b,
+    "j>=": lambda a, b: a >= b,
+    "j<=": lambda a, b: a <= b,
+    "j==": lambda a, b: a == b,
+    "j!=": lambda a, b: a != b,
+    "jnz": lambda a, b: a != 0,
+    "jz": lambda a, b: a == 0,
+}
+
+COMMUTATIVE = {"+", "*"}
+
+NUMBER = re.compile(r"-?\d+(\.\d*)?([eE][-+]?\d+)?$")
+TEMP = re.compile(r"t\d+$")
+
+
+def is_jump(op):
+    return op.startswith("j")
+
+
+def is_temp(name):
+    """
+    QuadrupleGenerator生成的临时变量(t1, t2, ...)，程序结束后不再需要
+    """
+    return isinstance(name, str) and TEMP.match(name) is not None
+
+
+def is_name(operand):
+    return operand != "_" and NUMBER.match(operand) is None
+
+
+def number(operand):
+    """
+    数值常量的值，不是常量时返回None
+    """
+    if NUMBER.match(operand) is None:
+        return None
+    try:
+        return int(operand)
+    except ValueError:
+        return float(operand)
+
+
+def operands(quadruple):
+    """
+    四元式读取的变量名
+    """
+    op, arg1, arg2, _ = quadruple
+    return [arg for arg in (arg1, arg2) if is_name(arg)]
+
+
+def defined(quadruple):
+    """
+    四元式赋值的变量名，转移四元式为None
+    """
+    return None if is_jump(quadruple[0]) else quadruple[3]
+
+
+class QuadrupleOptimizer:
+    """
+    四元式优化器，输入为QuadrupleGenerator生成的四元式列表(转移目标为地址)，输出从base_address重新编号的四元式列表
+    全局：转移链合并(转到无条件转移的转移直接转到最终目标，"条件转移到下下条+无条件转移"合并为一条取反的条件转移，
+    转到下一条的转移删除)、删除不可达的基本块；
+    基本块内：用DAG(值编号)消除公共子表达式、常量合并与常量传播、复写传播；
+    按全局活跃变量分析删除无用赋值，"临时变量=表达式; 变量=临时变量"合并为"变量=表达式"。
+    各遍反复进行直到四元式不再变化，self.stats记录优化前后的四元式个数
+    """
+
+    def __init__(self, base_address=base_address, instrumentation=None, max_rounds=10):
+        self.base_address = base_address
+        self.max_rounds = max_rounds
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        self.stats = {}
+
+    def load(self, quadruples):
+        """
+        转换为[op, arg1, arg2, result]的列表，转移目标改为从0开始的编号
+        """
+        code = []
+        for op, arg1, arg2, result in quadruples:
+            if is_jump(op):
+                result -= self.base_address
+            code.append([op, arg1, arg2, result])
+        return code
+
+    def compact(self, code):
+        """
+        删除值为None的四元式，转移目标改为原目标处或其后第一条保留的四元式的新编号
+        """
+        new_position = [0] * (len(code) + 1)
+        kept = sum(quadruple is not None for quadruple in code)
+        new_position[len(code)] = kept
+        for position in range(len(code) - 1, -1, -1):
+            if code[position] is not None:
+                kept -= 1
+            new_position[position] = kept
+        compacted = []
+        for quadruple in code:
+            if quadruple is None:
+                continue
+            if is_jump(quadruple[0]):
+                quadruple[3] = new_position[min(quadruple[3], len(code))]
+            compacted.append(quadruple)
+        return compacted
+
+    def basic_blocks(self, code):
+        """
+        划分基本块，返回[(开始编号, 结束编号), ...]和每个基本块的后继基本块列表，程序出口用None表示
+        """
+        leaders = {0}
+        for position, quadruple in enumerate(code):
+            if is_jump(quadruple[0]):
+                leaders.add(quadruple[3])
+                leaders.add(position + 1)
+        starts = sorted(leader for leader in leaders if leader < len(code))
+        blocks = list(zip(starts, starts[1:] + [len(code)]))
+        block_of = {start: index for index, (start, _) in enumerate(blocks)}
+
+        def block_at(position):
+            return block_of.get(position) if position < len(code) else None
+
+        successors = []
+        for start, end in blocks:
+            last = code[end - 1]
+            following = []
+            if is_jump(last[0]):
+                following.append(block_at(last[3]))
+            if last[0] != "j":
+                following.append(block_at(end))
+            successors.append(following)
+        return blocks, successors
+
+    def thread_jumps(self, code):
+        """
+        合并转移链，删除转到下一条的转移
+        """
+        targets = set()
+        for quadruple in code:
+            if is_jump(quadruple[0]):
+                target = quadruple[3]
+                seen = set()
+                while target < len(code) and code[target][0] == "j" and target not in seen:
+                    seen.add(target)
+                    target = code[target][3]
+                quadruple[3] = target
+                targets.add(target)
+        for position, quadruple in enumerate(code):
+            if quadruple is None or not is_jump(quadruple[0]):
+                continue
+            following = code[position + 1] if position + 1 < len(code) else None
+            if (
+                quadruple[0] in INVERSE_JUMPS
+                and quadruple[3] == position + 2
+                and following is not None
+                and following[0] == "j"
+                and position + 1 not in targets
+            ):
+                quadruple[0] = INVERSE_JUMPS[quadruple[0]]
+                quadruple[3] = following[3]
+                code[position + 1] = None
+            elif quadruple[3] == position + 1:
+                code[position] = None
+        return self.compact(code)
+
+    def remove_unreachable(self, code):
+        if not code:
+            return code
+        blocks, successors = self.basic_blocks(code)
+        reachable = {0}
+        worklist = [0]
+        while worklist:
+            for successor in successors[worklist.pop()]:
+                if successor is not None and successor not in reachable:
+                    reachable.add(successor)
+                    worklist.append(successor)
+        for index, (start, end) in enumerate(blocks):
+            if index not in reachable:
+                code[start:end] = [None] * (end - start)
+        return self.compact(code)
+
+    def number_values(self, code, start, end):
+        """
+        基本块内的值编号(即DAG的结点编号)：变量和常量对应值编号，相同运算符与相同运算对象值编号的运算是公共子表达式；
+        运算对象都是常量时合并为常量，读取变量时换成常量或仍持有同一个值的最早的变量
+        """
+        value_of = {}  # 变量名 -> 值编号
+        constant_of = {}  # 值编号 -> 常量
+        value_of_constant = {}  # 常量 -> 值编号
+        holder = {}  # 值编号 -> 最早持有它的变量名
+        expressions = {}  # (运算符, 值编号, 值编号) -> 值编号
+        counter = itertools.count(1)
+
+        def value(operand):
+            constant = number(operand)
+            if constant is not None:
+                operand = str(constant)
+                if operand not in value_of_constant:
+                    vn = -len(value_of_constant) - 1
+                    value_of_constant[operand] = vn
+                    constant_of[vn] = operand
+                return value_of_constant[operand]
+            if operand not in value_of:
+                vn = next(counter)
+                value_of[operand] = vn
+                holder[vn] = operand
+            return value_of[operand]
+
+        def holding(vn):
+            name = holder.get(vn)
+            return name if name is not None and value_of.get(name) == vn else None
+
+        def best(vn, operand):
+            if vn in constant_of:
+                return constant_of[vn]
+            return holding(vn) or operand
+
+        def assign(name, vn):
+            # 优先让非临时变量持有值，使临时变量尽早不再使用
+            value_of[name] = vn
+            current = holding(vn)
+            if vn not in constant_of and (current is None or is_temp(current) and not is_temp(name)):
+                holder[vn] = name
+
+        for position in range(start, end):
+            quadruple = code[position]
+            op, arg1, arg2, result = quadruple
+            if is_jump(op):
+                if op == "j":
+                    continue
+                vn1 = value(arg1)
+                left = best(vn1, arg1)
+                right = arg2
+                if arg2 != "_":
+                    right = best(value(arg2), arg2)
+                quadruple[1:3] = [left, right]
+                a = number(left)
+                b = number(right) if right != "_" else 0
+                if a is not None and b is not None:
+                    if COMPARISONS[op](a, b):
+                        code[position] = ["j", "_", "_", result]
+                    else:
+                        code[position] = None
+                continue
+            if op == "read":
+                # 读入的值每次都不同
+                assign(result, next(counter))
+                continue
+            if op == "=":
+                vn = value(arg1)
+                source = best(vn, arg1)
+                if source == result:
+                    code[position] = None
+                    continue
+                quadruple[1] = source
+                assign(result, vn)
+                continue
+            vn1, vn2 = value(arg1), value(arg2)
+            a, b = number(best(vn1, arg1)), number(best(vn2, arg2))
+            if a is not None and b is not None and not (op == "/" and b == 0):
+                constant = str(ARITHMETIC[op](a, b))
+                code[position] = ["=", constant, "_", result]
+                assign(result, value(constant))
+                continue
+            key = (op, *sorted((vn1, vn2))) if op in COMMUTATIVE else (op, vn1, vn2)
+            vn = expressions.get(key)
+            if vn is not None and holding(vn) is not None:
+                code[position] = ["=", holding(vn), "_", result]
+            else:
+                quadruple[1:3] = [best(vn1, arg1), best(vn2, arg2)]
+                vn = next(counter)
+                expressions[key] = vn
+                holder[vn] = None
+            assign(result, vn)
+
+    def live_out(self, code, blocks, successors):
+        """
+        全局活跃变量分析，返回每个基本块出口处活跃的变量集合；程序出口处所有非临时变量都活跃
+        """
+        exit_live = {
+            name
+            for quadruple in code
+            for name in (*operands(quadruple), defined(quadruple))
+            if name is not None and not is_temp(name)
+        }
+        uses = []
+        definitions = []
+        for start, end in blocks:
+            use, definition = set(), set()
+            for quadruple in code[start:end]:
+                use.update(name for name in operands(quadruple) if name not in definition)
+                if defined(quadruple) is not None:
+                    definition.add(defined(quadruple))
+            uses.append(use)
+            definitions.append(definition)
+        live_in = [set() for _ in blocks]
+        live_out = [set() for _ in blocks]
+        changed = True
+        while changed:
+            changed = False
+            for index in range(len(blocks) - 1, -1, -1):
+                out = set()
+                for successor in successors[index]:
+                    out |= exit_live if successor is None else live_in[successor]
+                inside = uses[index] | (out - definitions[index])
+                if out != live_out[index] or inside != live_in[index]:
+                    live_out[index] = out
+                    live_in[index] = inside
+                    changed = True
+        return live_out
+
+    def eliminate_dead_code(self, code):
+        """
+        删除赋值后不再使用的变量的赋值；"临时变量=表达式; 变量=临时变量"且临时变量之后不再使用时合并为"变量=表达式"
+        """
+        if not code:
+            return code
+        blocks, successors = self.basic_blocks(code)
+        live_out = self.live_out(code, blocks, successors)
+        for index, (start, end) in enumerate(blocks):
+            live = set(live_out[index])
+            for position in range(end - 1, start - 1, -1):
+                quadruple = code[position]
+                if quadruple is None:
+                    continue
+                target = defined(quadruple)
+                if target is not None:
+                    # read有读入输入的副作用，即使变量不再使用也要保留
+                    if target not in live and quadruple[0] != "read":
+                        code[position] = None
+                        continue
+                    previous = code[position - 1] if position > start else None
+                    source = quadruple[1]
+                    if (
+                        quadruple[0] == "="
+                        and is_temp(source)
+                        and source != target
+                        and source not in live
+                        and previous is not None
+                        and defined(previous) == source
+                    ):
+                        previous[3] = target
+                        code[position] = None
+                        continue
+                    live.discard(target)
+                live.update(operands(quadruple))
+        return self.compact(code)
+
+    def reuse_temps(self, quadruples):
+        """
+        临时变量名回收的后处理，输入输出都是转移目标为地址的四元式列表
+        按活跃变量分析求出每个临时变量从第一次定值或活跃到最后一次活跃或使用的区间(跨越循环回边时区间包含整个循环)，
+        按区间开始的顺序分配名字，区间已结束的临时变量的名字回收后优先分配编号最小的，
+        self.stats中temps_total为原有的临时变量个数，temps_peak为分配后的个数(即同时活跃的临时变量的最大个数)
+        """
+        code = self.load(quadruples)
+        first, last = {}, {}
+
+        def extend(temp, position):
+            if temp not in first or position < first[temp]:
+                first[temp] = position
+            if temp not in last or position > last[temp]:
+                last[temp] = position
+
+        if code:
+            blocks, successors = self.basic_blocks(code)
+            live_out = self.live_out(code, blocks, successors)
+            for index, (start, end) in enumerate(blocks):
+                live = {name for name in live_out[index] if is_temp(name)}
+                for position in range(end - 1, start - 1, -1):
+                    quadruple = code[position]
+                    for temp in live:
+                        extend(temp, position)
+                    target = defined(quadruple)
+                    if is_temp(target):
+                        extend(target, position)
+                        live.discard(target)
+                    for name in operands(quadruple):
+                        if is_temp(name):
+                            extend(name, position)
+                            live.add(name)
+
+        # 四元式先读运算对象再写结果，在同一个四元式结束和开始的区间可以共用名字
+        renamed = {}
+        active = []  # (结束位置, 编号)的小顶堆
+        free = []
+        count = 0
+        for temp in sorted(first, key=lambda temp: (first[temp], last[temp])):
+            while active and active[0][0] <= first[temp]:
+                heapq.heappush(free, heapq.heappop(active)[1])
+            if free:
+                number = heapq.heappop(free)
+            else:
+                count += 1
+                number = count
+            renamed[temp] = f"t{number}"
+            heapq.heappush(active, (last[temp], number))
+
+        self.stats["temps_total"] = len(renamed)
+        self.stats["temps_peak"] = count
+        self.instrumentation.count("temps_total", len(renamed))
+        self.instrumentation.count("temps_peak", count)
+        return [
+            (
+                op,
+                renamed.get(arg1, arg1),
+                renamed.get(arg2, arg2),
+                result + self.base_address if is_jump(op) else renamed.get(result, result),
+            )
+            for op, arg1, arg2, result in code
+        ]
+
+    def optimize(self, quadruples):
+        """
+        优化四元式列表，返回从base_address重新编号的新列表
+        """
+        code = self.load(quadruples)
+        before = len(code)
+        with self.instrumentation.phase("optimize"):
+            for _ in range(self.max_rounds):
+                previous = [list(quadruple) for quadruple in code]
+                code = self.thread_jumps(code)
+                code = self.remove_unreachable(code)
+                if code:
+                    blocks, _ = self.basic_blocks(code)
+                    for start, end in blocks:
+                        self.number_values(code, start, end)
+                    code = self.compact(code)
+                code = self.eliminate_dead_code(code)
+                if code == previous:
+                    break
+        self.stats = {"before": before, "after": len(code)}
+        self.instrumentation.count("quads_before_optimize", before)
+        self.instrumentation.count("quads_after_optimize", len(code))
+        return [
+            (op, arg1, arg2, result + self.base_address if is_jump(op) else result)
+            for op, arg1, arg2, result in code
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成并优化四元式")
+    parser.add_argument(
+        "inputs", nargs="*", default=["quad_input.txt"], help="输入文件，每个文件是一个独立的程序"
+    )
+    parser.add_argument("-o", "--output", help="输出文件，默认为标准输出")
+    parser.add_argument(
+        "--reuse-temps", action="store_true", help="优化后回收不再使用的临时变量名，并报告回收前后的临时变量个数"
+    )
+    args = parser.parse_args()
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for file_name in args.inputs:
+            quadruples = []
+            compile_source_file(file_name, quadruples.append)
+            optimizer = QuadrupleOptimizer()
+            optimized = optimizer.optimize(quadruples)
+            if args.reuse_temps:
+                optimized = optimizer.reuse_temps(optimized)
+            if len(args.inputs) > 1:
+                output.write(f"# {file_name}\n")
+            write = QuadrupleWriter(output)
+            for quadruple in optimized:
+                write(quadruple)
+            print(
+                f"{file_name}: {optimizer.stats['before']} -> {optimizer.stats['after']} quadruples",
+                file=sys.stderr,
+            )
+            if args.reuse_temps:
+                print(
+                    f"{file_name}: {optimizer.stats['temps_total']} -> {optimizer.stats['temps_peak']} temps",
+                    file=sys.stderr,
+                )
+    finally:
+        if args.output:
+            output.close()
@@ -1,101 +1,346 @@
+import argparse
 import ast
+import heapq
+import sys
 
-# 读取quad_input.txt中的代码
-with open("quad_input.txt", "r") as file:
-    code = file.read()
-
-# 生成抽象语法树
-tree = ast.parse(code)
+from Instrumentation import NULL_INSTRUMENTATION
 
 op_dict = {
     "Mult": "*",
     "Add": "+",
     "Sub": "-",
+    "Div": "/",
     "Gt": ">",
     "Lt": "<",
+    "GtE": ">=",
+    "LtE": "<=",
+    "Eq": "==",
+    "NotEq": "!=",
 }
 
 base_address = 100
 
+# 继续上一条语句的顶层关键字，以它们开头的行不是新语句的开始
+CONTINUATION_KEYWORDS = ("else", "elif", "except", "finally")
+
 
-class QuadrupleGenerator(ast.NodeVisitor):
-    def __init__(self):
+class QuadrupleEmitter:
+    """
+    四元式的输出与回填，由各前端(Python语法树的QuadrupleGenerator、C单词流的CQuadrupleGenerator)共用
+    采用真出口链/假出口链/后继链(truelist/falselist/nextlist)的回填方法，目标未定的转移四元式的第四项暂存链中下一个转移四元式的编号(链尾为None)，一条链用链首的编号表示，空链为None；
+    转移目标一旦确定就用backpatch()沿链填入，不需要事后再扫描一遍四元式。
+    所有转移目标都已确定的四元式立即按顺序交给sink，sink为接受一个四元式的可调用对象(如list.append、QuadrupleWriter或回调函数)，
+    为None时收集在self.quadruples中。生成器只缓存还有转移目标未确定的控制结构内部的四元式，内存占用与程序长度无关。
+    reuse_temps为True时临时变量在最后一次使用后回收，新的临时变量优先使用编号最小的已回收的名字，
+    临时变量名的个数(temp_var_counter)等于同时活跃的临时变量的最大个数，temps_created为申请临时变量的总次数
+    """
+
+    def __init__(self, sink=None, instrumentation=None, base_address=base_address, reuse_temps=False):
         self.temp_var_counter = 0
+        self.temps_created = 0
+        self.reuse_temps = reuse_temps
+        # 尚未回收的临时变量名和已回收的临时变量编号(小顶堆)
+        self.live_temps = set()
+        self.free_temps = []
         self.quadruples = []
-        self.backpatches = []
+        self.sink = self.quadruples.append if sink is None else sink
+        self.base_address = base_address
+        # 尚未交给sink的四元式([op, arg1, arg2, result]的列表)，buffer[0]的编号为flushed
+        self.buffer = []
+        self.flushed = 0
+        # 转移目标尚未确定的四元式个数
+        self.unresolved = 0
+        # 计时与计数，默认为静默模式
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+
+    @property
+    def next_position(self):
+        """
+        下一个四元式的编号(从0开始，地址为编号加base_address)
+        """
+        return self.flushed + len(self.buffer)
 
     def new_temp_var(self):
-        self.temp_var_counter += 1
-        return f"t{self.temp_var_counter}"
+        self.temps_created += 1
+        if self.free_temps:
+            temp = f"t{heapq.heappop(self.free_temps)}"
+        else:
+            self.temp_var_counter += 1
+            temp = f"t{self.temp_var_counter}"
+        if self.reuse_temps:
+            self.live_temps.add(temp)
+        return temp
+
+    def release(self, operand):
+        """
+        operand是生成器的临时变量且已是最后一次使用时调用，reuse_temps为True时回收其名字
+        临时变量只在生成它的表达式中使用，父结点生成使用它的四元式后即可回收
+        """
+        if operand in self.live_temps:
+            self.live_temps.remove(operand)
+            heapq.heappush(self.free_temps, int(operand[1:]))
+
+    def emit(self, op, arg1, arg2, result):
+        """
+        生成一个四元式并返回其编号
+        """
+        position = self.next_position
+        self.buffer.append([op, arg1, arg2, result])
+        if not self.unresolved:
+            self.flush()
+        return position
+
+    def emit_jump(self, op, arg1="_", arg2="_"):
+        """
+        生成一个目标待回填的转移四元式，返回只含这个四元式的链
+        """
+        self.unresolved += 1
+        return self.emit(op, arg1, arg2, None)
+
+    def merge(self, chain1, chain2):
+        """
+        将两条链连成一条并返回，chain2接在chain1的尾部
+        """
+        if chain1 is None:
+            return chain2
+        if chain2 is None:
+            return chain1
+        quadruple = self.buffer[chain1 - self.flushed]
+        while quadruple[3] is not None:
+            quadruple = self.buffer[quadruple[3] - self.flushed]
+        quadruple[3] = chain2
+        return chain1
+
+    def backpatch(self, chain, target):
+        """
+        将链上每个转移四元式的目标填为编号target，没有目标未定的四元式后把缓存的四元式交给sink
+        """
+        if chain is None:
+            return
+        address = target + self.base_address
+        while chain is not None:
+            quadruple = self.buffer[chain - self.flushed]
+            chain = quadruple[3]
+            quadruple[3] = address
+            self.unresolved -= 1
+        if not self.unresolved:
+            self.flush()
+
+    def flush(self):
+        sink = self.sink
+        for quadruple in self.buffer:
+            sink(tuple(quadruple))
+        self.instrumentation.count("quads_emitted", len(self.buffer))
+        self.flushed += len(self.buffer)
+        self.buffer = []
+
+
+class QuadrupleGenerator(QuadrupleEmitter, ast.NodeVisitor):
+    """
+    四元式生成器，遍历Python语法树一遍生成四元式
+    """
+
+    def statements(self, body):
+        """
+        依次生成语句序列，每条语句的后继链回填为下一条语句的开始；返回最后一条语句的后继链
+        """
+        nextlist = None
+        for stmt in body:
+            self.backpatch(nextlist, self.next_position)
+            nextlist = self.visit(stmt)
+        return nextlist
+
+    def condition(self, node):
+        """
+        为作为条件的表达式生成转移四元式，返回(真出口链, 假出口链)
+        and/or/not按短路求值，a<b<c按a<b and b<c处理，其他表达式的值不为0时为真
+        """
+        if isinstance(node, ast.BoolOp):
+            is_and = isinstance(node.op, ast.And)
+            # and的真出口接下一个操作数，假出口汇总；or相反
+            passed = exits = None
+            for value in node.values:
+                if is_and:
+                    self.backpatch(passed, self.next_position)
+                    passed, falselist = self.condition(value)
+                    exits = self.merge(exits, falselist)
+                else:
+                    self.backpatch(passed, self.next_position)
+                    truelist, passed = self.condition(value)
+                    exits = self.merge(exits, truelist)
+            return (passed, exits) if is_and else (exits, passed)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            truelist, falselist = self.condition(node.operand)
+            return falselist, truelist
+        if isinstance(node, ast.Compare):
+            left = self.visit(node.left)
+            truelist = falselist = None
+            for index, (op, comparator) in enumerate(zip(node.ops, node.comparators)):
+                self.backpatch(truelist, self.next_position)
+                right = self.visit(comparator)
+                truelist = self.emit_jump("j" + op_dict[type(op).__name__], left, right)
+                falselist = self.merge(falselist, self.emit_jump("j"))
+                # a<b<c中的b在下一次比较中还要使用
+                self.release(left)
+                left = right
+            self.release(left)
+            return truelist, falselist
+        value = self.visit(node)
+        truelist = self.emit_jump("jnz", value)
+        self.release(value)
+        return truelist, self.emit_jump("j")
+
+    def visit_Module(self, node):
+        self.backpatch(self.statements(node.body), self.next_position)
 
     def visit_Assign(self, node):
         target = node.targets[0].id
         value = self.visit(node.value)
-        self.quadruples.append(("=", value, "_", target))
+        self.emit("=", value, "_", target)
+        self.release(value)
 
     def visit_BinOp(self, node):
         left = self.visit(node.left)
         right = self.visit(node.right)
+        # 四元式先读运算对象再写结果，结果可以使用刚回收的运算对象的名字
+        self.release(left)
+        self.release(right)
         result = self.new_temp_var()
-        self.quadruples.append((op_dict[type(node.op).__name__], left, right, result))
+        self.emit(op_dict[type(node.op).__name__], left, right, result)
         return result
 
     def visit_Name(self, node):
         return node.id
 
-    def visit_Num(self, node):
-        return str(node.n)
-
-    def visit_Compare(self, node):
-        left = self.visit(node.left)
-        right = self.visit(node.comparators[0])
-        return type(node.ops[0]).__name__, left, right
+    def visit_Constant(self, node):
+        return str(node.value)
 
     def visit_If(self, node):
-        op, left, right = self.visit(node.test)
-        op = op_dict[op]
-        self.quadruples.append(("j" + op, left, right, "_"))
-        jTrue_position = len(self.quadruples) - 1
-        self.quadruples.append(("j", "_", "_", "_"))
-        self.backpatches.append((jTrue_position, len(self.quadruples)))
-        jFalse_position = len(self.quadruples) - 1
-        for stmt in node.body:
-            self.visit(stmt)
-        self.quadruples.append(("j", "_", "_", "_"))
-        jEnd_position = len(self.quadruples) - 1
-        self.backpatches.append((jFalse_position, len(self.quadruples)))
-        for stmt in node.orelse:
-            self.visit(stmt)
-        self.backpatches.append((jEnd_position, len(self.quadruples)))
+        truelist, falselist = self.condition(node.test)
+        self.backpatch(truelist, self.next_position)
+        nextlist = self.statements(node.body)
+        if not node.orelse:
+            return self.merge(nextlist, falselist)
+        nextlist = self.merge(nextlist, self.emit_jump("j"))
+        self.backpatch(falselist, self.next_position)
+        return self.merge(nextlist, self.statements(node.orelse))
 
     def visit_While(self, node):
-        start_position = len(self.quadruples)
-        op, left, right = self.visit(node.test)
-        op = op_dict[op]
-        self.quadruples.append(("j" + op, left, right, "_"))
-        jTrue_position = len(self.quadruples) - 1
-        self.quadruples.append(("j", "_", "_", "_"))
-        self.backpatches.append((jTrue_position, len(self.quadruples)))
-        jFalse_position = len(self.quadruples) - 1
-        for stmt in node.body:
-            self.visit(stmt)
-        self.quadruples.append(("j", "_", "_", start_position + base_address))
-        self.backpatches.append((jFalse_position, len(self.quadruples)))
-
-
-# 使用QuadrupleGenerator生成四元式
-generator = QuadrupleGenerator()
-generator.visit(tree)
-
-# 回填
-for i in range(len(generator.backpatches)):
-    position, target = generator.backpatches[i]
-    op, arg1, arg2, _ = generator.quadruples[position]
-    if "j" in op:
-        generator.quadruples[position] = (op, arg1, arg2, int(target) + base_address)
-    else:
-        generator.quadruples[position] = (op, arg1, target, "_")
-
-# 打印回填后的四元式
-for i, quadruple in enumerate(generator.quadruples):
-    print(i + base_address, ":", quadruple)
+        start_position = self.next_position
+        truelist, falselist = self.condition(node.test)
+        self.backpatch(truelist, self.next_position)
+        self.backpatch(self.statements(node.body), start_position)
+        self.emit("j", "_", "_", start_position + self.base_address)
+        return falselist
+
+    def generate(self, source):
+        """
+        为源程序生成四元式，source可以是源程序文本或已经解析好的语法树，可以多次调用，编号依次延续
+        返回self.quadruples(sink为None时为生成的全部四元式)
+        """
+        tree = ast.parse(source) if isinstance(source, str) else source
+        temps = self.temps_created
+        with self.instrumentation.phase("generate"):
+            self.visit(tree)
+        self.flush()
+        self.instrumentation.count("temps_created", self.temps_created - temps)
+        return self.quadruples
+
+
+def parse_statements(lines, batch_size=1000):
+    """
+    将源程序的行按顶层语句分批解析，每批不超过batch_size条顶层语句(包括其else等后续部分)，生成每批的语法树，不需要整体读入源程序
+    不缩进、且不以else等关键字开头的行是新语句的开始；一批行解析不成功时(如括号跨行)继续与后面的行合并
+    """
+    chunk = []
+    statements = 0
+    for line in lines:
+        stripped = line.lstrip()
+        if (
+            chunk
+            and stripped
+            and not stripped.startswith("#")
+            and len(stripped) == len(line)
+            and not stripped.startswith(CONTINUATION_KEYWORDS)
+        ):
+            statements += 1
+            if statements >= batch_size:
+                try:
+                    tree = ast.parse("".join(chunk))
+                except SyntaxError:
+                    pass
+                else:
+                    yield tree
+                    chunk = []
+                    statements = 0
+        chunk.append(line)
+    if chunk:
+        yield ast.parse("".join(chunk))
+
+
+def iter_quadruples(lines, instrumentation=None, base_address=base_address):
+    """
+    流式生成四元式的函数，lines为源程序的行(如打开的文件)，逐批解析顶层语句并生成，转移目标确定后的四元式依次生成出来
+    """
+    ready = []
+    generator = QuadrupleGenerator(ready.append, instrumentation, base_address)
+    for tree in parse_statements(lines):
+        generator.generate(tree)
+        yield from ready
+        ready.clear()
+
+
+class QuadrupleWriter:
+    """
+    将四元式按"地址 : 四元式"的格式逐行写入已打开的文件的sink
+    """
+
+    def __init__(self, file, base_address=base_address):
+        self.file = file
+        self.address = base_address
+
+    def __call__(self, quadruple):
+        self.file.write(f"{self.address} : {quadruple}\n")
+        self.address += 1
+
+
+def compile_file(file_name, sink, instrumentation=None, base_address=base_address, reuse_temps=False):
+    """
+    按顶层语句流式编译一个源文件，四元式依次交给sink，返回生成器(flushed为生成的四元式个数)
+    """
+    generator = QuadrupleGenerator(sink, instrumentation, base_address, reuse_temps)
+    with open(file_name, "r", encoding="utf-8") as file:
+        for tree in parse_statements(file):
+            generator.generate(tree)
+    return generator
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="四元式生成器")
+    parser.add_argument(
+        "inputs", nargs="*", default=["quad_input.txt"], help="输入文件，每个文件是一个独立的程序"
+    )
+    parser.add_argument("-o", "--output", help="输出文件，默认为标准输出")
+    parser.add_argument(
+        "--reuse-temps", action="store_true", help="回收不再使用的临时变量名，并报告临时变量名个数与申请次数"
+    )
+    args = parser.parse_args()
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for file_name in args.inputs:
+            if len(args.inputs) > 1:
+                output.write(f"# {file_name}\n")
+            # 打印回填后的四元式
+            generator = compile_file(
+                file_name, QuadrupleWriter(output), reuse_temps=args.reuse_temps
+            )
+            if args.reuse_temps:
+                print(
+                    f"{file_name}: {generator.temp_var_counter} temps at peak, "
+                    f"{generator.temps_created} created",
+                    file=sys.stderr,
+                )
+    finally:
+        if args.output:
+            output.close()
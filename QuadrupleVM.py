@@ -0,0 +1,326 @@
+import argparse
+import sys
+import time
+from itertools import repeat
+
+from QuadrupleOptimizer import QuadrupleOptimizer, is_jump, is_temp, number
+from CQuadrupleGenerator import compile_source_file
+from QuadrupleProducer import base_address
+
+# 指令的整数操作码，按执行频率排列，分派时依次比较
+ASSIGN, ADD, SUB, MUL, DIV, J, JGT, JLT, JGE, JLE, JEQ, JNE, JNZ, JZ, READ = range(15)
+
+OPCODES = {
+    "=": ASSIGN,
+    "+": ADD,
+    "-": SUB,
+    "*": MUL,
+    "/": DIV,
+    "j": J,
+    "j>": JGT,
+    "j<": JLT,
+    "j>=": JGE,
+    "j<=": JLE,
+    "j==": JEQ,
+    "j!=": JNE,
+    "jnz": JNZ,
+    "jz": JZ,
+    "read": READ,
+}
+
+
+class VMError(Exception):
+    """
+    执行时的错误(除以0、超过指令数上限)，address为出错指令的地址
+    """
+
+    def __init__(self, address, message):
+        self.address = address
+        super().__init__(f"Runtime error at {address}: {message}")
+
+
+class QuadrupleVM:
+    """
+    四元式虚拟机，把四元式列表预先编码为(操作码, 槽号, 槽号, 槽号或转移目标下标)的指令序列后解释执行
+    变量、临时变量和常量都分配到一个平坦列表中的槽，常量槽在运行前装入常量值，指令中不再出现名字；
+    转移目标为地址减去base_address后的指令下标，转到指令序列末尾即停机。
+    read从run()的inputs中依次取值，取完后读入0。
+    max_steps限制执行的指令数，超过时抛出VMError，除以0也抛出VMError；max_steps为None时不限制。
+    run()不计数，run(profile=True)记录每条指令的执行次数(executed)和每条条件转移的转移次数(taken)
+    """
+
+    def __init__(self, quadruples, base_address=base_address):
+        self.quadruples = list(quadruples)
+        self.base_address = base_address
+        self.names = []
+        self.slot_of = {}
+        self.constants = []  # (槽号, 常量值)
+        self.code = []
+        self.executed = None
+        self.taken = None
+        self.steps = 0
+        for op, arg1, arg2, result in self.quadruples:
+            if op not in OPCODES:
+                raise ValueError(f"Unknown quadruple operator {op!r}")
+            if is_jump(op):
+                target = result - base_address
+                if not 0 <= target <= len(self.quadruples):
+                    raise ValueError(f"Jump target {result} out of range")
+                self.code.append((OPCODES[op], self.slot(arg1), self.slot(arg2), target))
+            else:
+                self.code.append((OPCODES[op], self.slot(arg1), self.slot(arg2), self.slot(result)))
+
+    def slot(self, operand):
+        """
+        返回operand的槽号，"_"为-1
+        """
+        if operand == "_":
+            return -1
+        slot = self.slot_of.get(operand)
+        if slot is None:
+            slot = len(self.names)
+            self.slot_of[operand] = slot
+            self.names.append(operand)
+            value = number(operand)
+            if value is not None:
+                self.constants.append((slot, value))
+        return slot
+
+    def load(self, variables=None):
+        """
+        建立槽列表，变量的初值取自variables(未给出的为0)
+        """
+        slots = [0] * len(self.names)
+        for slot, value in self.constants:
+            slots[slot] = value
+        for name, value in (variables or {}).items():
+            if name in self.slot_of and number(name) is None:
+                slots[self.slot_of[name]] = value
+        return slots
+
+    def run(self, variables=None, profile=False, inputs=(), max_steps=None):
+        """
+        从第一条指令执行到停机，返回{变量名: 值}(不含常量)
+        """
+        slots = self.load(variables)
+        if profile:
+            self.execute_profiled(slots, iter(inputs), max_steps)
+        else:
+            self.execute(slots, iter(inputs), max_steps)
+        return {
+            name: slots[slot] for name, slot in self.slot_of.items() if number(name) is None
+        }
+
+    def execute(self, m, inputs, max_steps=None):
+        code = self.code
+        end = len(code)
+        pc = 0
+        # 用有限次的循环代替while pc < end，限制指令数不需要另外计数
+        try:
+            for _ in repeat(None) if max_steps is None else repeat(None, max_steps):
+                if pc >= end:
+                    return
+                op, a, b, c = code[pc]
+                if op == ASSIGN:
+                    m[c] = m[a]
+                elif op == ADD:
+                    m[c] = m[a] + m[b]
+                elif op == SUB:
+                    m[c] = m[a] - m[b]
+                elif op == MUL:
+                    m[c] = m[a] * m[b]
+                elif op == DIV:
+                    m[c] = m[a] / m[b]
+                elif op == J:
+                    pc = c
+                    continue
+                elif op == JGT:
+                    if m[a] > m[b]:
+                        pc = c
+                        continue
+                elif op == JLT:
+                    if m[a] < m[b]:
+                        pc = c
+                        continue
+                elif op == JGE:
+                    if m[a] >= m[b]:
+                        pc = c
+                        continue
+                elif op == JLE:
+                    if m[a] <= m[b]:
+                        pc = c
+                        continue
+                elif op == JEQ:
+                    if m[a] == m[b]:
+                        pc = c
+                        continue
+                elif op == JNE:
+                    if m[a] != m[b]:
+                        pc = c
+                        continue
+                elif op == JNZ:
+                    if m[a]:
+                        pc = c
+                        continue
+                elif op == JZ:
+                    if not m[a]:
+                        pc = c
+                        continue
+                elif op == READ:
+                    m[c] = next(inputs, 0)
+                pc += 1
+        except ZeroDivisionError:
+            raise VMError(pc + self.base_address, "division by zero") from None
+        if pc < end:
+            raise VMError(pc + self.base_address, f"step limit {max_steps} exceeded")
+
+    def execute_profiled(self, m, inputs, max_steps=None):
+        """
+        与execute()相同，另外累计每条指令的执行次数和条件转移的转移次数，出错时统计到出错的指令为止
+        """
+        code = self.code
+        end = len(code)
+        executed = [0] * end
+        taken = [0] * end
+        self.executed = executed
+        self.taken = taken
+        pc = 0
+        try:
+            for _ in repeat(None) if max_steps is None else repeat(None, max_steps):
+                if pc >= end:
+                    break
+                executed[pc] += 1
+                op, a, b, c = code[pc]
+                if op == ASSIGN:
+                    m[c] = m[a]
+                elif op == ADD:
+                    m[c] = m[a] + m[b]
+                elif op == SUB:
+                    m[c] = m[a] - m[b]
+                elif op == MUL:
+                    m[c] = m[a] * m[b]
+                elif op == DIV:
+                    m[c] = m[a] / m[b]
+                elif op == J:
+                    pc = c
+                    continue
+                elif op == READ:
+                    m[c] = next(inputs, 0)
+                else:
+                    if op == JGT:
+                        jump = m[a] > m[b]
+                    elif op == JLT:
+                        jump = m[a] < m[b]
+                    elif op == JGE:
+                        jump = m[a] >= m[b]
+                    elif op == JLE:
+                        jump = m[a] <= m[b]
+                    elif op == JEQ:
+                        jump = m[a] == m[b]
+                    elif op == JNE:
+                        jump = m[a] != m[b]
+                    elif op == JNZ:
+                        jump = bool(m[a])
+                    else:
+                        jump = not m[a]
+                    if jump:
+                        taken[pc] += 1
+                        pc = c
+                        continue
+                pc += 1
+        except ZeroDivisionError:
+            raise VMError(pc + self.base_address, "division by zero") from None
+        finally:
+            self.steps = sum(executed)
+        if pc < end:
+            raise VMError(pc + self.base_address, f"step limit {max_steps} exceeded")
+
+    def profile_report(self, file, limit=None):
+        """
+        按执行次数从多到少列出指令，条件转移同时列出转移次数
+        """
+        order = sorted(range(len(self.code)), key=lambda index: -self.executed[index])
+        for index in order[:limit]:
+            op = self.quadruples[index][0]
+            line = f"{index + self.base_address:>6} : {str(self.quadruples[index]):<32}{self.executed[index]:>12}"
+            if is_jump(op) and op != "j":
+                line += f"  taken {self.taken[index]}"
+            file.write(line + "\n")
+
+
+def parse_value(text):
+    value = number(text.strip())
+    if value is None:
+        sys.exit(f"Error: invalid value {text!r}")
+    return value
+
+
+def parse_assignments(assignments):
+    """
+    将["x=1", "y=2.5"]转换为{"x": 1, "y": 2.5}
+    """
+    variables = {}
+    for assignment in assignments:
+        name, _, value = assignment.partition("=")
+        variables[name.strip()] = parse_value(value)
+    return variables
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="执行四元式的虚拟机")
+    parser.add_argument(
+        "input",
+        nargs="?",
+        default="quad_input.txt",
+        help="源程序文件，.c文件按C语言子集翻译，.quad文件为QuadrupleFile写出的二进制四元式",
+    )
+    parser.add_argument("-O", "--optimize", action="store_true", help="先优化四元式再执行")
+    parser.add_argument(
+        "-s", "--set", action="append", default=[], metavar="NAME=VALUE", help="变量的初值，可以多次给出"
+    )
+    parser.add_argument("--profile", action="store_true", help="报告每条指令的执行次数和转移次数")
+    parser.add_argument(
+        "-r", "--read", action="append", default=[], metavar="VALUE", help="read依次读入的值，可以多次给出"
+    )
+    parser.add_argument("--top", type=int, default=20, help="--profile时列出执行最多的指令条数")
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=10_000_000,
+        help="执行的指令数上限，超过时报错退出(比如不终止的循环)，0表示不限制",
+    )
+    args = parser.parse_args()
+
+    start_address = base_address
+    if args.input.endswith(".quad"):
+        from QuadrupleFile import QuadrupleFile
+
+        try:
+            with QuadrupleFile(args.input) as quadruple_file:
+                quadruples = list(quadruple_file)
+                start_address = quadruple_file.base_address
+        except (OSError, ValueError) as e:
+            sys.exit(f"Error: {e}")
+    else:
+        quadruples = []
+        compile_source_file(args.input, quadruples.append)
+    if args.optimize:
+        quadruples = QuadrupleOptimizer(start_address).optimize(quadruples)
+    vm = QuadrupleVM(quadruples, start_address)
+    start = time.perf_counter()
+    inputs = [parse_value(value) for value in args.read]
+    try:
+        variables = vm.run(parse_assignments(args.set), args.profile, inputs, args.max_steps or None)
+    except VMError as e:
+        sys.exit(f"Error: {args.input}: {e}")
+    seconds = time.perf_counter() - start
+    for name in sorted(variables):
+        if not is_temp(name):
+            print(f"{name} = {variables[name]}")
+    print(f"{len(quadruples)} quadruples, {seconds:.3f} s", file=sys.stderr)
+    if args.profile:
+        print(
+            f"{vm.steps} executed, {vm.steps / seconds if seconds else 0.0:.0f} quadruples/s",
+            file=sys.stderr,
+        )
+        vm.profile_report(sys.stderr, args.top)
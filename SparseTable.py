@@ -0,0 +1,111 @@
+from array import array
+
+
+class SparseTable:
+    """
+    按行位移(comb)压缩的LL(1)分析表，只保存非空表项
+    每个非终结符的一行整体平移base[nt]后放入共享的value/check数组，各行的非空表项互不重叠，
+    查找M[nt, 列号]时只需检查check[base[nt] + 列号]是否等于nt，时间为O(1)。
+    行按非空表项个数从多到少依次放置，每行取第一个不与已放置表项冲突的位移(first fit)。
+    列号为终结符编号减去非终结符个数，与Grammar.table相同；不认识的单词的列号(终结符个数)总是查不到。
+    """
+
+    def __init__(self, grammar):
+        rows, conflicts = grammar.table_rows()
+        self.grammar = grammar
+        self.conflicts = conflicts
+        self.width = grammar.terminal_count + 1
+        self.base = array("i", [0]) * len(rows)
+        self.check = array("i")
+        self.value = array("i")
+        self.entry_count = sum(len(row) for row in rows)
+
+        check = self.check
+        value = self.value
+        order = sorted(range(len(rows)), key=lambda nt: len(rows[nt]), reverse=True)
+        # 最小的空位，first fit从这里开始尝试
+        first_free = 0
+        for nt in order:
+            row = rows[nt]
+            if not row:
+                continue
+            columns = sorted(row)
+            base = first_free - columns[0]
+            while True:
+                if all(
+                    base + column >= len(check) or check[base + column] == -1
+                    for column in columns
+                ):
+                    break
+                base += 1
+            end = base + columns[-1] + 1
+            if end > len(check):
+                check.extend([-1] * (end - len(check)))
+                value.extend([-1] * (end - len(value)))
+            for column in columns:
+                check[base + column] = nt
+                value[base + column] = row[column]
+            self.base[nt] = base
+            while first_free < len(check) and check[first_free] != -1:
+                first_free += 1
+
+    def lookup(self, nt, column):
+        """
+        返回M[nt, 列号]中的产生式编号，空白时返回-1
+        """
+        index = self.base[nt] + column
+        if 0 <= index < len(self.check) and self.check[index] == nt:
+            return self.value[index]
+        return -1
+
+    def entries(self):
+        """
+        返回按非终结符编号、列号排序的(非终结符编号, 列号, 产生式编号)列表
+        """
+        return sorted(
+            (nt, index - self.base[nt], production)
+            for index, (nt, production) in enumerate(zip(self.check, self.value))
+            if nt != -1
+        )
+
+    def nbytes(self):
+        return sum(
+            column.itemsize * len(column) for column in (self.base, self.check, self.value)
+        )
+
+    def memory_report(self):
+        """
+        比较稠密表(Grammar.table的一维整数数组)与压缩表的大小，单位为字节
+        """
+        grammar = self.grammar
+        cells = grammar.nonterminal_count * self.width
+        dense = cells * array("i").itemsize
+        return {
+            "nonterminals": grammar.nonterminal_count,
+            "terminals": grammar.terminal_count,
+            "entries": self.entry_count,
+            "density": self.entry_count / cells if cells else 0.0,
+            "dense_bytes": dense,
+            "sparse_bytes": self.nbytes(),
+            "ratio": self.nbytes() / dense if dense else 0.0,
+        }
+
+    def dump(self, file):
+        """
+        只列出非空表项和冲突，写入已打开的文件
+        """
+        grammar = self.grammar
+        names = grammar.names
+        nonterminal_count = grammar.nonterminal_count
+        for nt, column, production in self.entries():
+            file.write(
+                f"M[{names[nt]}, {names[column + nonterminal_count]}] = "
+                f"{grammar.production_string(production)}\n"
+            )
+        if self.conflicts:
+            file.write("\nConflicts:\n")
+            for nt, terminal, old, new in self.conflicts:
+                file.write(
+                    f"M[{names[nt]}, {names[terminal]}]: "
+                    f"{grammar.production_string(old)} / {grammar.production_string(new)}\n"
+                )
@@ -0,0 +1,98 @@
+import bisect
+import sys
+
+
+class SymbolTable:
+    """
+    符号表，用于存放用户标识符表idlist、无符号整数常数表uintlist和无符号浮点数常数表ufdlist
+    每个表项是一个字典，包含名字(或数值)、类型、存储长度等字段，类型和存储长度在词法分析阶段为空，由编译过程的后续阶段填入。
+    表项按首次出现的顺序编号，编号即符号的id，查重通过散列表完成，时间为O(1)；
+    若sorted_mode为True，则另外维护一个按ASCII码排序的(名字, id)表，查重使用折半查找，遍历时也按ASCII码顺序输出。
+    为避免每次插入都移动整个有序表，新名字先插入一个较小的有序缓冲区，缓冲区超过4*sqrt(n)项时再与主表归并。
+    """
+
+    def __init__(self, key="name", sorted_mode=False):
+        self.key = key
+        self.sorted_mode = sorted_mode
+        self.entries = []
+        self.ids = {}
+        self.sorted_names = []
+        self.pending_names = []
+
+    @staticmethod
+    def binary_search(names, name):
+        position = bisect.bisect_left(names, (name,))
+        if position < len(names) and names[position][0] == name:
+            return names[position][1]
+        return None
+
+    def lookup(self, name):
+        """
+        查找函数，返回名字对应的符号id，若不在表中则返回None
+        """
+        if not self.sorted_mode:
+            return self.ids.get(name)
+        # 折半查找，先查主表再查缓冲区
+        symbol_id = self.binary_search(self.sorted_names, name)
+        if symbol_id is None:
+            symbol_id = self.binary_search(self.pending_names, name)
+        return symbol_id
+
+    def insert(self, name):
+        """
+        插入函数，名字已在表中时直接返回其符号id，否则新建一项并返回新的符号id
+        名字在插入时被驻留(intern)，同名的单词共享同一个字符串对象
+        """
+        if not self.sorted_mode:
+            symbol_id = self.ids.get(name)
+            if symbol_id is None:
+                symbol_id = self.ids[name] = len(self.entries)
+                self.entries.append(
+                    {self.key: sys.intern(name), "type": None, "storage_length": None}
+                )
+            return symbol_id
+
+        symbol_id = self.lookup(name)
+        if symbol_id is None:
+            name = sys.intern(name)
+            symbol_id = len(self.entries)
+            self.entries.append({self.key: name, "type": None, "storage_length": None})
+            bisect.insort(self.pending_names, (name, symbol_id))
+            if len(self.pending_names) ** 2 > 16 * len(self.sorted_names) + 4096:
+                # 两个有序表拼接后排序，timsort按归并处理，时间为线性
+                self.sorted_names += self.pending_names
+                self.sorted_names.sort()
+                self.pending_names = []
+        return symbol_id
+
+    def fill(self, symbol_id, type=None, storage_length=None):
+        """
+        填写符号的类型和存储长度，供编译过程的后续阶段使用
+        """
+        entry = self.entries[symbol_id]
+        if type is not None:
+            entry["type"] = type
+        if storage_length is not None:
+            entry["storage_length"] = storage_length
+        return entry
+
+    def __contains__(self, name):
+        return self.lookup(name) is not None
+
+    def __getitem__(self, symbol_id):
+        return self.entries[symbol_id]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        """
+        遍历表项，默认按首次出现的顺序，sorted_mode下按ASCII码顺序
+        """
+        if self.sorted_mode:
+            names = sorted(self.sorted_names + self.pending_names)
+            return (self.entries[symbol_id] for _, symbol_id in names)
+        return iter(self.entries)
+
+    def to_list(self):
+        return list(self)
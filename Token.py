@@ -0,0 +1,32 @@
+class Token:
+    """
+    单词类，保存一个单词的种别、值、在符号表中的id以及在源程序中的位置
+    offset为单词首字节在源文件中的字节偏移，line和column从1开始计数。
+    为兼容原先的字典形式的二元式，也可以用token["category"]、token["value"]的方式访问各字段。
+    """
+
+    __slots__ = ("category", "value", "symbol", "offset", "line", "column")
+
+    def __init__(self, category, value, symbol=None, offset=0, line=1, column=1):
+        self.category = category
+        self.value = value
+        self.symbol = symbol
+        self.offset = offset
+        self.line = line
+        self.column = column
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if not isinstance(other, Token):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self) -> str:
+        return (
+            f"Token({self.category!r}, {self.value!r}, symbol={self.symbol!r}, "
+            f"offset={self.offset}, line={self.line}, column={self.column})"
+        )
@@ -0,0 +1,107 @@
+from array import array
+from bisect import bisect_right
+
+from Token import Token
+
+
+class TokenBuffer:
+    """
+    紧凑的单词缓冲区，用四个并列的array('i')分别保存每个单词的种别、首字节偏移、长度和符号表id，代替每个单词一个字典的二元式列表
+    单词的值不另外保存，需要时通过对源程序的memoryview切片取得，不复制源程序。
+    非法单词的种别在数组中记为ERROR(0)，不属于任何符号表的单词的符号表id记为NO_SYMBOL(-1)，通过Token访问时都还原为None。
+    """
+
+    ERROR = 0
+    NO_SYMBOL = -1
+
+    def __init__(self, source):
+        self.source = memoryview(source)
+        self.categories = array("i")
+        self.offsets = array("i")
+        self.lengths = array("i")
+        self.symbols = array("i")
+        self.line_starts = None
+
+    def append(self, category, offset, length, symbol=None):
+        self.categories.append(self.ERROR if category is None else category)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.symbols.append(self.NO_SYMBOL if symbol is None else symbol)
+
+    def lexeme(self, index):
+        """
+        返回第index个单词在源程序中的字节切片(memoryview)，不复制数据
+        """
+        offset = self.offsets[index]
+        return self.source[offset : offset + self.lengths[index]]
+
+    def text(self, index):
+        return str(self.lexeme(index), "utf-8", "replace")
+
+    def position(self, offset):
+        """
+        计算字节偏移offset所在的行号和列号，行首偏移表在第一次调用时建立
+        """
+        if self.line_starts is None:
+            self.line_starts = array("i", [0])
+            source = self.source.obj
+            newline = source.find(b"\n")
+            while newline != -1:
+                self.line_starts.append(newline + 1)
+                newline = source.find(b"\n", newline + 1)
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def pairs(self):
+        """
+        按顺序生成(种别, 值)二元组，非法单词的种别为None，不创建Token对象
+        """
+        source = self.source
+        for category, offset, length in zip(self.categories, self.offsets, self.lengths):
+            yield (
+                None if category == self.ERROR else category,
+                str(source[offset : offset + length], "utf-8", "replace"),
+            )
+
+    def __len__(self):
+        return len(self.categories)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        category = self.categories[index]
+        symbol = self.symbols[index]
+        offset = self.offsets[index]
+        line, column = self.position(offset)
+        return Token(
+            None if category == self.ERROR else category,
+            self.text(index),
+            None if symbol == self.NO_SYMBOL else symbol,
+            offset,
+            line,
+            column,
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def nbytes(self):
+        """
+        返回四个数组占用的字节数，不含源程序本身
+        """
+        return sum(
+            column.itemsize * len(column)
+            for column in (self.categories, self.offsets, self.lengths, self.symbols)
+        )
+
+    def __getstate__(self):
+        # memoryview不能被pickle，传给其他进程时复制一份源程序
+        state = self.__dict__.copy()
+        state["source"] = bytes(self.source)
+        state["line_starts"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.source = memoryview(self.source)
@@ -1,6 +1,16 @@
+import argparse
+import glob
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
 import LexicalAnalyzer
 from enum import Enum
-from tabulate import tabulate
+from Instrumentation import Instrumentation
+from OutputWriter import WRITERS
+from SymbolTable import SymbolTable
+from TokenBuffer import TokenBuffer
 
 
 # 定义单词的种别
@@ -81,80 +91,270 @@ delimiters = ["(", ")", "[", "]", "{", "}", ",", ";", ":"]
 legal_characters = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_+-*/%()[]{}=<>!&|^~,:;.# \n\t'\"\\"
 
 
-def output_lexical_analyzer_results(
-    lexical_tuples, idlist, uintlist, ufdlist, reslist, op_list, delimiters_list
-):
+def open_writer(output, output_format):
+    """
+    按输出格式打开输出文件并创建对应的写入器，二进制格式以"wb"打开，其余格式以文本方式打开
+    """
+    writer_class = WRITERS[output_format]
+    if writer_class.binary:
+        file = open(output, "wb")
+    else:
+        file = open(output, "w", encoding="utf-8", newline="")
+    return writer_class(file, WordCategory)
+
+
+def report_illegal_characters(file_name, errors):
+    """
+    将非法字符的出错信息逐条写到标准错误输出
+    """
+    for error in errors:
+        print(f"Error: {file_name}: {error}", file=sys.stderr)
+
+
+def output_lexical_analyzer_results(la, output="output.txt", output_format="text"):
     """
-    输出结果的函数，将所有单词的二元式按顺序输出到output文件，并将用户标识符表idlist、常数表uintlist和常数表ufdlist输出到相应的文件
+    输出结果的函数，边扫描边将所有单词按顺序写入输出文件，扫描结束后再写入用户标识符表idlist、常数表uintlist和常数表ufdlist等各表
+    单词不在内存中保存，峰值内存与源程序大小无关；扫描前按块检查非法字符并报告位置
     """
     try:
-        with open("output.txt", "w") as file:
-            # 打印WordCategory枚举类的所有成员
-            file.write("Lexical Categories:\n")
-            file.write(
-                "\n".join(f"{member.name}: {member.value}" for member in WordCategory)
-                + "\n\n"
-            )
+        if la.validate_characters:
+            with la.instrumentation.phase("validate"):
+                report_illegal_characters(la.file_name, la.handle_illegal_characters())
+        writer = open_writer(output, output_format)
+        with writer.file:
+            writer.write_categories()
+            with la.instrumentation.phase("analyze"):
+                writer.write_tokens(la.tokens())
+                tables = la.collect_tables()
+            writer.write_tables(*tables)
+            writer.close()
 
-            file.write("Lexical Tuples:\n")
-            file.write(
-                "\n".join(
-                    f"ERROR()" if tuple['category'] is None else f"({WordCategory(tuple['category']).name}, {tuple['value']})"
-                    for tuple in lexical_tuples
-                )
-                + "\n\n"
-            )
+            print("Successfully wrote to output file.")
+    except Exception as e:
+        print(f"Error: {e}")
 
-            file.write("Identifiers:\n")
-            file.write(tabulate([[id['name'], id['type'], id['storage_length']] for id in idlist], tablefmt='plain', headers=["Name", "Type", "Storage Length"]) + "\n\n")
 
-            file.write("Unsigned Integers:\n")
-            file.write(tabulate([[uint['value'], uint['type'], uint['storage_length']] for uint in uintlist], tablefmt='plain', headers=["Value", "Type", "Storage Length"], numalign="left", stralign="left") + "\n\n")
+def output_multi_file_results(
+    file_names, results, output="output.txt", output_format="text"
+):
+    """
+    多文件的输出函数，results为按file_names顺序生成分析结果的迭代器，每个文件的单词流在结果返回后立即写出并释放，
+    符号表、保留字、运算符和分隔符在所有文件写完后输出合并后的结果
+    每个文件的符号表在结果返回时并入全局符号表，单词流中的符号id换算为全局符号id后再写出
+    """
+    try:
+        writer = open_writer(output, output_format)
+        with writer.file:
+            writer.write_categories()
 
-            file.write("Unsigned Floats:\n")
-            header = "Value\tType\tStorage Length\n"
-            rows = [f"{float(ufd['value']):.4f}\t\t" for ufd in ufdlist]
-            table = header + "\n".join(rows)
-            file.write(table + "\n\n")
+            merged = (SymbolTable("name"), SymbolTable("value"), SymbolTable("value"))
+            tables = []
+            for file_name, result in zip(file_names, results):
+                report_illegal_characters(file_name, result[7])
+                file_maps = merge_file_symbols(merged, result)
+                writer.write_tokens(remap_symbols(result[0], file_maps), file_name)
+                # 单词流已经写出，只保留保留字、运算符和分隔符用于合并
+                tables.append((None, None, None, None, *result[4:]))
 
-            file.write("Reserved Words: " + ", ".join(reslist) + "\n\n")
-            file.write("Operators: " + ", ".join(op_list) + "\n\n")
-            file.write("Delimiters: " + ", ".join(delimiters_list) + "\n\n")
+            writer.write_tables(*merged, *merge_word_lists(tables))
+            writer.close()
 
             print("Successfully wrote to output file.")
     except Exception as e:
         print(f"Error: {e}")
 
 
-if __name__ == "__main__":
-
+def expand_inputs(patterns):
     """
-    主函数，用于调用其他函数完成词法分析器的功能
+    展开命令行给出的输入，可以是文件、目录(递归查找其中的.c文件)或通配符
+    结果去重后按路径排序，保证输出与调度顺序无关
     """
-    la = LexicalAnalyzer.LexicalAnalyzer(
+    file_names = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            file_names.update(
+                glob.glob(os.path.join(pattern, "**", "*.c"), recursive=True)
+            )
+        elif glob.has_magic(pattern):
+            file_names.update(
+                name for name in glob.glob(pattern, recursive=True) if os.path.isfile(name)
+            )
+        else:
+            file_names.add(pattern)
+    return sorted(file_names)
+
+
+def new_analyzer(file_name, instrumentation=None):
+    return LexicalAnalyzer.LexicalAnalyzer(
         category=WordCategory,
         reslist=reslist,
         operators=operators,
         delimiters=delimiters,
         legal_characters=legal_characters,
+        file_name=file_name,
+        instrumentation=instrumentation,
     )
 
-    (
-        lexical_tuples,
-        idlist,
-        uintlist,
-        ufdlist,
-        reslist,
-        identified_operators,
-        identified_delimiters,
-    ) = la.analyze()
-
-    output_lexical_analyzer_results(
-        lexical_tuples,
-        idlist,
-        uintlist,
-        ufdlist,
-        reslist,
-        identified_operators,
-        identified_delimiters,
+
+def lex_file(file_name, instrumentation=None):
+    """
+    对单个文件做词法分析，在进程池的工作进程中运行
+    返回analyze()的结果，最后再加上非法字符的出错信息列表
+    """
+    la = new_analyzer(file_name, instrumentation)
+    return (*la.analyze(), la.illegal_characters)
+
+
+def lex_file_with_stats(file_name):
+    """
+    对单个文件做词法分析并记录计时与计数，返回分析结果和report()，供工作进程把统计数据传回主进程
+    """
+    instrumentation = Instrumentation()
+    return lex_file(file_name, instrumentation), instrumentation.report()
+
+
+def iter_lex_files(file_names, workers=None, instrumentation=None):
+    """
+    并行词法分析函数，用进程池同时分析多个文件，workers为工作进程数(默认为CPU核数)
+    按file_names的顺序逐个生成结果，每个文件的单词流各自独立，调用者可以在其余文件分析完之前处理已返回的结果
+    传入instrumentation时记录各文件的计时与计数，工作进程中的统计在返回后合并
+    """
+    if workers == 1 or len(file_names) <= 1:
+        for file_name in file_names:
+            yield lex_file(file_name, instrumentation)
+        return
+    workers = workers or os.cpu_count() or 1
+    # 文件很多时按块分发，减少进程间通信次数
+    chunksize = max(1, len(file_names) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if instrumentation is None:
+            yield from executor.map(lex_file, file_names, chunksize=chunksize)
+            return
+        for result, report in executor.map(
+            lex_file_with_stats, file_names, chunksize=chunksize
+        ):
+            instrumentation.merge(report)
+            yield result
+
+
+def lex_files(file_names, workers=None, instrumentation=None):
+    """
+    与iter_lex_files()相同，但一次返回所有文件的结果列表
+    """
+    return list(iter_lex_files(file_names, workers, instrumentation))
+
+
+def merge_file_symbols(merged, result):
+    """
+    将一个文件的idlist、uintlist和ufdlist依次插入全局符号表merged，文件内部保持首次出现的顺序
+    返回该文件的局部符号id到全局符号id的三个映射；各表的表项按局部符号id的顺序排列(new_analyzer不使用sorted_symbols)
+    """
+    return [
+        array("i", (table.insert(entry[table.key]) for entry in entries))
+        for table, entries in zip(merged, result[1:4])
+    ]
+
+
+def merge_symbol_tables(results):
+    """
+    合并各文件的idlist、uintlist和ufdlist，按文件顺序依次插入全局符号表
+    返回三个全局符号表，以及每个文件的局部符号id到全局符号id的映射
+    """
+    merged = (SymbolTable("name"), SymbolTable("value"), SymbolTable("value"))
+    symbol_maps = [merge_file_symbols(merged, result) for result in results]
+    return (*merged, symbol_maps)
+
+
+def remap_symbols(buffer, file_maps):
+    """
+    将TokenBuffer中的符号id按merge_file_symbols()返回的映射原地换算为全局符号id，返回buffer
+    """
+    maps = dict(
+        zip(
+            (
+                WordCategory.IDENTIFIER.value,
+                WordCategory.UNSIGNED_INTEGER.value,
+                WordCategory.UNSIGNED_FLOAT.value,
+            ),
+            file_maps,
+        )
     )
+    no_symbol = TokenBuffer.NO_SYMBOL
+    buffer.symbols = array(
+        "i",
+        (
+            symbol if symbol == no_symbol else maps[category][symbol]
+            for category, symbol in zip(buffer.categories, buffer.symbols)
+        ),
+    )
+    return buffer
+
+
+def merge_word_lists(results):
+    """
+    合并各文件识别出的保留字、运算符和分隔符，按各自表中的顺序输出
+    """
+    merged = []
+    for words, position in ((reslist, 4), (operators, 5), (delimiters, 6)):
+        found = set()
+        for result in results:
+            found.update(result[position])
+        merged.append([word for word in words if word in found])
+    return merged
+
+
+if __name__ == "__main__":
+
+    """
+    主函数，用于调用其他函数完成词法分析器的功能
+    """
+    parser = argparse.ArgumentParser(description="C语言子集的词法分析器")
+    parser.add_argument(
+        "inputs", nargs="*", default=["test.c"], help="输入文件、目录或通配符"
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="工作进程数，默认为CPU核数"
+    )
+    parser.add_argument(
+        "--stats", metavar="FILE", help="将各阶段的计时与计数以JSON格式写入FILE"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="用cProfile记录词法分析过程并写入FILE(只记录主进程，建议与-j 1一起使用)",
+    )
+    parser.add_argument(
+        "-o", "--output", default="output.txt", help="输出文件，默认为output.txt"
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=sorted(WRITERS),
+        default="text",
+        help="输出格式：text为原先的文本格式，jsonl为JSON Lines，csv为CSV，binary为紧凑的二进制列存格式",
+    )
+    args = parser.parse_args()
+
+    instrumentation = None
+    if args.stats or args.profile:
+        instrumentation = Instrumentation(profile=bool(args.profile))
+
+    file_names = expand_inputs(args.inputs)
+
+    if len(file_names) == 1:
+        # 单个文件时边扫描边输出，不保存单词流
+        output_lexical_analyzer_results(
+            new_analyzer(file_names[0], instrumentation), args.output, args.format
+        )
+    else:
+        output_multi_file_results(
+            file_names,
+            iter_lex_files(file_names, args.workers, instrumentation),
+            args.output,
+            args.format,
+        )
+
+    if args.stats:
+        instrumentation.dump(args.stats)
+    if args.profile:
+        instrumentation.dump_profile(args.profile)
@@ -0,0 +1,29 @@
+import pytest
+
+from CQuadrupleGenerator import CQuadrupleGenerator
+from main import new_analyzer
+from QuadrupleOptimizer import QuadrupleOptimizer
+from QuadrupleVM import QuadrupleVM
+
+
+def run(source, optimize):
+    quadruples = CQuadrupleGenerator().generate(new_analyzer(None).tokens(source))
+    if optimize:
+        quadruples = QuadrupleOptimizer().optimize(quadruples)
+    return QuadrupleVM(quadruples).run()
+
+
+# 关系表达式作为算术或比较的左运算对象时，必须先求值再生成右运算对象的四元式
+@pytest.mark.parametrize("optimize", [False, True])
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ("a=1;b=2;c=5; x=(a<b)+c*2;", {"x": 11}),
+        ("a=1;b=2;c=5; y=(a<b)==(c<a);", {"y": 0}),
+        ("a=1;b=2;c=5; z=c*(a<b); w=(b>a)*(c>a)+3;", {"z": 5, "w": 4}),
+        ("a=1;b=2;c=5; v=(a<b)<(c<a)+1;", {"v": 0}),
+    ],
+)
+def test_left_operand_evaluated_first(source, expected, optimize):
+    variables = run(source, optimize)
+    assert {name: variables.get(name) for name in expected} == expected
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from IncrementalLexer import IncrementalLexer
+from main import new_analyzer
+
+
+def snapshot(tokens):
+    return [(token.category, token.offset, token.value) for token in tokens]
+
+
+def boundaries(characters):
+    """
+    返回每个字符边界的字节偏移，编辑位置只取字符边界，不拆开UTF-8多字节字符
+    """
+    offsets = [0]
+    for character in characters:
+        offsets.append(offsets[-1] + len(character.encode("utf-8")))
+    return offsets
+
+
+@pytest.mark.parametrize(
+    "alphabet",
+    [
+        # 重复的字符出现得更频繁，"2.5E+x"一类的非法单词与后面的单词合并的情况较多
+        "1.5E+x1.5E+x ",
+        "ab1_ +=<>!;",
+        "é1x +",
+    ],
+)
+def test_edit_matches_full_relex(alphabet, rounds=2000, edits=20):
+    """
+    对随机源程序做一串随机编辑，每次编辑后将增量结果与对整个源程序重新做词法分析的结果比较(种别、字节偏移、值)
+    """
+    rng = random.Random(0)
+    for round_number in range(rounds):
+        characters = [rng.choice(alphabet) for _ in range(rng.randint(0, 30))]
+        analyzer = new_analyzer(None)
+        lexer = IncrementalLexer(analyzer, analyzer.tokenize("".join(characters).encode("utf-8")))
+        for _ in range(edits):
+            start = rng.randint(0, len(characters))
+            end = rng.randint(start, min(start + 3, len(characters)))
+            inserted = [rng.choice(alphabet) for _ in range(rng.randint(0, 3))]
+            offsets = boundaries(characters)
+            data = "".join(inserted).encode("utf-8")
+            lexer.edit(offsets[start], offsets[end] - offsets[start], data)
+            characters[start:end] = inserted
+            source = "".join(characters).encode("utf-8")
+            assert snapshot(lexer[i] for i in range(len(lexer))) == snapshot(
+                new_analyzer(None).tokens(source)
+            ), f"round {round_number}: edit({offsets[start]}, {offsets[end] - offsets[start]}, {data!r}) -> {source!r}"